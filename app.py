@@ -1,14 +1,35 @@
-from polygon import RESTClient
-import pandas as pd
-from flask import Flask, jsonify, request
-from flask.templating import render_template_string
+# pandas and the Polygon client are imported on first use, not here, so a cold
+# start can serve the page and a persisted snapshot before a scan needs them
+import numpy as np
+from flask import Flask, Response, g, jsonify, request
+import json
 import time
-from datetime import datetime, timedelta, timezone
-import pytz
+from datetime import timedelta
+from functools import lru_cache
 import logging
 import os
-import requests
-from dotenv import load_dotenv
+import tempfile
+import threading
+from scheduler import ScanScheduler
+from snapshot_store import open_snapshot_store
+from persistence import ScanPersistence, open_backend
+from trading_calendar import SessionResolver, previous_trading_day, trading_days
+from indicators import warmup_calendar_days
+from signals import compute_signals, pair_windows, parse_pairs, signals_from_long
+from result_table import ResultTable, pair_name
+from fetcher import (CircuitBreaker, CircuitOpenError, LazyClient, RateLimitedClient, RetryPolicy, TokenBucket,
+                     fetch_concurrently)
+from universe import GroupedDailyCache, IncompleteHistoryError, pivot_grouped, universe_long_frame
+from bar_store import BarStore, bars_from_aggs
+from ema_state import EmaStateStore
+from result_index import ResultIndex, decode_cursor, encode_cursor, parse_filters
+from scan_events import ScanEvents, format_ndjson, format_sse
+from response_cache import RESPONSE_CACHE, ResponseCache
+from changelog import SCAN_CHANGES, Changelog
+from timeframes import parse_timeframe_names, timeframe_signals, timeframe_warmup_days
+from intraday import IntradayEngine, IntradayFeed, IntradayStream, parse_timeframes, timeframe_name
+import metrics
+from metrics import SCAN_STAGE_SECONDS
 
 # Configure logging
 logging.basicConfig(
@@ -17,8 +38,120 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Global variable to store results
-all_results = []
+# Polygon plan limits: requests per minute (0 = unlimited) and concurrent fetches
+POLYGON_REQUESTS_PER_MINUTE = int(os.environ.get('POLYGON_REQUESTS_PER_MINUTE', 5))
+POLYGON_MAX_CONCURRENCY = int(os.environ.get('POLYGON_MAX_CONCURRENCY', 8))
+
+# Scan cadence in seconds during market hours and outside of them
+SCAN_INTERVAL = int(os.environ.get('SCAN_INTERVAL_SECONDS', 300))
+SCAN_OFF_HOURS_INTERVAL = int(os.environ.get('SCAN_OFF_HOURS_INTERVAL_SECONDS', 3600))
+
+# Tickers scanned in watchlist mode; override with a comma-separated SCAN_WATCHLIST
+DEFAULT_WATCHLIST = [
+    'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'TEM', 'META', 'TSLA', 'TSM', 'AMD', 'INTC',
+    'NFLX', 'ADBE', 'CSCO', 'QCOM', 'AVGO', 'TXN', 'ORCL', 'CRM', 'IBM', 'UBER',
+    'VRT', 'PLTR', 'SNOW', 'NET', 'CRWD', 'DDOG', 'ZS', 'TEAM', 'OKTA', 'DOCN',
+    'RDDT'
+]
+WATCHLIST = [t.strip().upper() for t in os.environ.get('SCAN_WATCHLIST', '').split(',') if t.strip()] or DEFAULT_WATCHLIST
+
+# 'watchlist' fetches WATCHLIST ticker by ticker; 'universe' scans every US ticker from grouped daily bars
+SCAN_MODE = os.environ.get('SCAN_MODE', 'watchlist').lower()
+
+# Calendar days of bars shown per ticker
+DISPLAY_DAYS = 30
+
+# EMA crossover pairs as comma-separated fast/slow windows; the first is the default /scan pair.
+# Every distinct window is computed once locally, however many pairs share it.
+EMA_PAIRS = parse_pairs(os.environ.get('SCAN_EMA_PAIRS', '8/21'))
+EMA_WINDOWS = pair_windows(EMA_PAIRS)
+
+# Higher timeframes resampled locally from the daily bars and reported with each row (watchlist mode);
+# comma-separated from week,month, or empty for none. Needs longer daily history, in the same single call:
+# month multiplies the history stored and replayed per ticker, so it is opt-in.
+SCAN_TIMEFRAMES = parse_timeframe_names(os.environ.get('SCAN_TIMEFRAMES', 'week'))
+
+# Local daily bar store (set BAR_STORE_DIR to an empty string to always fetch full history)
+BAR_STORE_DIR = os.environ.get('BAR_STORE_DIR', os.path.join(tempfile.gettempdir(), 'crossover-bars'))
+BAR_STORE_MAX_MB = int(os.environ.get('BAR_STORE_MAX_MB', 512))
+BAR_STORE_MAX_BARS = int(os.environ.get('BAR_STORE_MAX_BARS', 5040))  # ~20 years of sessions
+
+# Calendar days of history before the displayed bars, so the EMAs have converged in every timeframe. Capped at
+# what the bar store keeps (calendar weekdays bound the sessions), or each sync would trim it and refetch it all.
+HISTORY_DAYS = max([warmup_calendar_days(max(EMA_WINDOWS))] + [
+    timeframe_warmup_days(max(EMA_WINDOWS), timeframe) for timeframe in SCAN_TIMEFRAMES])
+if BAR_STORE_MAX_BARS:
+    HISTORY_DAYS = min(HISTORY_DAYS, (BAR_STORE_MAX_BARS - 5) * 7 // 5 - DISPLAY_DAYS)
+for timeframe in SCAN_TIMEFRAMES:
+    if timeframe_warmup_days(max(EMA_WINDOWS), timeframe) > HISTORY_DAYS:
+        logger.warning(f'{timeframe} EMA{max(EMA_WINDOWS)} needs more history than BAR_STORE_MAX_BARS keeps; '
+                       f'its warm-up is cut to {HISTORY_DAYS} days and the first values lean on the seed')
+
+# Per-ticker EMA state persisted between scans (empty keeps it in memory only)
+EMA_STATE_DIR = os.environ.get('EMA_STATE_DIR', os.path.join(tempfile.gettempdir(), 'crossover-ema-state'))
+
+# Confirm the calendar's last session with one Polygon call per day (set to 0 to trust the calendar)
+TRADING_DAY_VERIFY = os.environ.get('TRADING_DAY_VERIFY', '1') != '0'
+TRADING_DAY_VERIFY_TICKER = os.environ.get('TRADING_DAY_VERIFY_TICKER', 'SPY')
+# Seconds before a failed check (no bar yet, e.g. end-of-day data) is tried again
+TRADING_DAY_VERIFY_RETRY_SECONDS = int(os.environ.get('TRADING_DAY_VERIFY_RETRY_SECONDS', 900))
+
+# Attempts per Polygon call on 429s and server errors, with jittered exponential backoff in seconds
+POLYGON_RETRY_ATTEMPTS = int(os.environ.get('POLYGON_RETRY_ATTEMPTS', 3))
+POLYGON_RETRY_BASE_SECONDS = float(os.environ.get('POLYGON_RETRY_BASE_SECONDS', 1))
+POLYGON_RETRY_MAX_SECONDS = float(os.environ.get('POLYGON_RETRY_MAX_SECONDS', 30))
+
+# Consecutive Polygon failures that open the circuit breaker (0 disables it) and seconds before probing again
+POLYGON_CIRCUIT_FAILURES = int(os.environ.get('POLYGON_CIRCUIT_FAILURES', 5))
+POLYGON_CIRCUIT_RESET_SECONDS = float(os.environ.get('POLYGON_CIRCUIT_RESET_SECONDS', 60))
+
+# /scan/stream and /intraday/stream clients served at once, together; each holds a server thread while
+# connected, so keep this below gunicorn's --threads to leave threads for /scan and /metrics
+STREAM_MAX_CLIENTS = int(os.environ.get('STREAM_MAX_CLIENTS', 4))
+
+# Published snapshots kept for cursor pagination
+SNAPSHOT_HISTORY = int(os.environ.get('SNAPSHOT_HISTORY', 5))
+
+# Where snapshots are shared between gunicorn workers and instances: 'memory' (this process only)
+# or 'sqlite:///path/to/snapshots.db'. With a shared store only the scan lease holder scans.
+SNAPSHOT_STORE = os.environ.get('SNAPSHOT_STORE', 'memory')
+SNAPSHOT_STORE_POLL_SECONDS = float(os.environ.get('SNAPSHOT_STORE_POLL_SECONDS', 5))
+SCAN_LEASE_SECONDS = int(os.environ.get('SCAN_LEASE_SECONDS', 900))
+
+# Durable copies of snapshots and the crossover history: 'firestore', 'memory' (this process only) or 'none'.
+# Collections are named <PERSISTENCE_PREFIX>_snapshots and <PERSISTENCE_PREFIX>_signals.
+PERSISTENCE_BACKEND = os.environ.get('PERSISTENCE_BACKEND', 'none').lower()
+PERSISTENCE_PREFIX = os.environ.get('PERSISTENCE_PREFIX', 'crossover')
+PERSISTENCE_SNAPSHOTS_KEPT = int(os.environ.get('PERSISTENCE_SNAPSHOTS_KEPT', 3))
+
+# Load the latest stored snapshot and render the page at boot, so the first request after a cold start
+# is served without waiting for a scan (set to 0 to skip)
+STARTUP_WARMUP = os.environ.get('STARTUP_WARMUP', '1') != '0'
+
+# Encoded /scan responses kept across snapshots and queries (LRU)
+SCAN_RESPONSE_CACHE_ENTRIES = int(os.environ.get('SCAN_RESPONSE_CACHE_ENTRIES', 256))
+
+# Snapshot versions /scan/changes can compute deltas from; older ones get a full resync
+SCAN_CHANGELOG_VERSIONS = int(os.environ.get('SCAN_CHANGELOG_VERSIONS', 50))
+
+# Intraday crossovers from Polygon's websocket minute aggregates (set to 1 to enable). Run it in a single
+# worker: each process with it enabled opens its own websocket.
+INTRADAY_STREAM = os.environ.get('INTRADAY_STREAM', '0') == '1'
+# Bar sizes the minute aggregates are rolled into, e.g. 5m,15m,1h
+INTRADAY_TIMEFRAMES = parse_timeframes(os.environ.get('INTRADAY_TIMEFRAMES', '5m,15m,1h'))
+# Symbols subscribed to: comma-separated, or * for every US stock (default: the watchlist)
+INTRADAY_SYMBOLS = [t.strip().upper() for t in os.environ.get('INTRADAY_SYMBOLS', '').split(',') if t.strip()]
+# Websocket host (socket.polygon.io real time, delayed.polygon.io) or a ws:// URL such as a local fake
+INTRADAY_FEED = os.environ.get('INTRADAY_FEED', 'socket.polygon.io')
+# A crossover bar only counts as matched above this volume
+INTRADAY_MIN_VOLUME = int(os.environ.get('INTRADAY_MIN_VOLUME', 100000))
+# Crossover events kept for clients resuming with Last-Event-ID
+INTRADAY_EVENT_BUFFER = int(os.environ.get('INTRADAY_EVENT_BUFFER', 1000))
+# Warm up each symbol's EMAs from Polygon's aggregates when it is first streamed (set to 0 to start from the stream)
+INTRADAY_WARMUP = os.environ.get('INTRADAY_WARMUP', '1') != '0'
+
+# Optional token required by the admin refresh endpoint
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
 
 # Polygon.io API key (hardcoded)
 # Get a free API key from https://polygon.io/
@@ -26,274 +159,274 @@ API_KEY = 'Jr2cmNAEts41lLiOIKVx0YgLo494ow67'  # Replace with your actual Polygon
 
 logger.info('API key configured successfully')
 
+def make_rest_client():
+    """Build the Polygon RESTClient; called on the first API call rather than at import."""
+    from polygon import RESTClient
+    return RESTClient(API_KEY)
+
 # Initialize Polygon.io client
 try:
-    client = RESTClient(API_KEY)
-    logger.info('Polygon.io client initialized successfully')
+    # Every API call takes a token from the shared limiter, whichever thread makes it
+    rate_limiter = TokenBucket(POLYGON_REQUESTS_PER_MINUTE)
+    # Failed calls are retried one by one; the breaker fails fast while Polygon is down
+    retry_policy = RetryPolicy(POLYGON_RETRY_ATTEMPTS, POLYGON_RETRY_BASE_SECONDS, POLYGON_RETRY_MAX_SECONDS)
+    circuit_breaker = CircuitBreaker(POLYGON_CIRCUIT_FAILURES, POLYGON_CIRCUIT_RESET_SECONDS)
+    client = RateLimitedClient(LazyClient(make_rest_client), rate_limiter, retry_policy, circuit_breaker)
+    logger.info('Polygon.io client configured')
 except Exception as e:
     logger.error(f'Failed to initialize Polygon.io client: {str(e)}')
     raise
 
 app = Flask(__name__)
 
+SCAN_TICKER_FAILURES = metrics.counter('scan_ticker_failures_total', 'Tickers skipped after all retries')
+SCAN_TICKERS = metrics.gauge('scan_tickers', 'Tickers with data in the latest scan')
+SCAN_MATCHED = metrics.gauge('scan_matched', 'Rows matching the default EMA pair in the latest scan')
+HTTP_REQUEST_SECONDS = metrics.histogram('http_request_seconds', 'HTTP request latency', ('endpoint', 'status'))
+
+bar_store = BarStore(BAR_STORE_DIR, max_bytes=BAR_STORE_MAX_MB * 1024 * 1024,
+                     max_bars=BAR_STORE_MAX_BARS) if BAR_STORE_DIR else None
+
+ema_states = EmaStateStore(EMA_STATE_DIR or None)
+
+# Progress of the running scan, streamed by /scan/stream
+scan_events = ScanEvents()
+
+# Encoded /scan pages per snapshot and query
+scan_responses = ResponseCache(SCAN_RESPONSE_CACHE_ENTRIES)
+
+# Row changes between recent snapshots, for /scan/changes
+scan_changelog = Changelog(SCAN_CHANGELOG_VERSIONS)
+
+# Grouped daily bars reused across universe scans
+grouped_daily_cache = GroupedDailyCache(client, max_workers=POLYGON_MAX_CONCURRENCY)
+
+def use_client(rest_client, requests_per_minute=POLYGON_REQUESTS_PER_MINUTE):
+    """Route all Polygon calls through rest_client (e.g. a fake in benchmarks), rate limited as usual."""
+    global client, rate_limiter
+    rate_limiter = TokenBucket(requests_per_minute)
+    client = RateLimitedClient(rest_client, rate_limiter, retry_policy, circuit_breaker)
+    grouped_daily_cache.client = client
+
+def verify_trading_day(session_date):
+    """Confirm with a single Polygon call that a daily bar exists for session_date."""
+    date_str = session_date.strftime('%Y-%m-%d')
+    return bool(client.get_aggs(TRADING_DAY_VERIFY_TICKER, 1, 'day', date_str, date_str))
+
+# Resolves the last session from the local NYSE calendar, cached per day
+session_resolver = SessionResolver(verify_fn=verify_trading_day if TRADING_DAY_VERIFY else None,
+                                   retry_seconds=TRADING_DAY_VERIFY_RETRY_SECONDS)
+
 def get_most_recent_trading_day():
-    """Get the most recent trading day using Polygon.io API."""
-    today = datetime.now(pytz.timezone('US/Eastern'))
-    
-    # Try up to 5 previous days to find the most recent trading day
-    for i in range(5):
-        test_date = today - timedelta(days=i)
-        # Format date as YYYY-MM-DD
-        date_str = test_date.strftime('%Y-%m-%d')
-        
-        try:
-            # Try to get market status for this date
-            market_data = client.get_aggs('AAPL', date_str, date_str, 1, 'day')
-            if market_data:
-                logger.info(f'Most recent trading day found: {date_str}')
-                return test_date
-        except Exception as e:
-            logger.debug(f'Not a trading day: {date_str}, error: {str(e)}')
-            continue
-    
-    # If no trading day found in last 5 days, use today's date
-    logger.warning('No recent trading day found, using current date')
-    return today
-
-def fetch_stock_data(ticker):
-    """Fetch stock data and EMAs from Polygon.io API."""
-    # Get the most recent trading day
-    end_date = get_most_recent_trading_day()
-    start_date = end_date - timedelta(days=30)  # Fetch 30 days of data for better analysis
-    
-    logging.info(f"Using date range: {start_date.date()} to {end_date.date()}")
-    
-    # Format dates as YYYY-MM-DD
-    start_date_str = start_date.strftime('%Y-%m-%d')
-    end_date_str = end_date.strftime('%Y-%m-%d')
+    """Get the most recent trading day from the NYSE calendar."""
+    return session_resolver.resolve()
+
+def fetch_daily_bars(ticker, from_date, to_date):
+    """Fetch daily OHLCV bars for ticker from Polygon.io as a bar array."""
+    aggs = client.get_aggs(
+        ticker=ticker,
+        from_=from_date.strftime('%Y-%m-%d'),
+        to=to_date.strftime('%Y-%m-%d'),
+        multiplier=1,
+        timespan="day",
+        adjusted=True,
+        limit=50000
+    )
+    return bars_from_aggs(aggs)
+
+def fetch_intraday_history(symbol, minutes, count, until_ms):
+    """Closes of the last `count` bars of `minutes` minutes that ended by until_ms, oldest first."""
+    # Enough regular 390-minute sessions for count bars; extended hours only add bars
+    start = np.datetime64(until_ms, 'ms').astype('datetime64[D]').astype(object)
+    for _ in range(-(-count * minutes // 390) + 1):
+        start = previous_trading_day(start)
+    aggs = client.get_aggs(
+        ticker=symbol,
+        from_=start.strftime('%Y-%m-%d'),
+        to=until_ms - 1,
+        multiplier=minutes,
+        timespan="minute",
+        adjusted=True,
+        limit=50000
+    )
+    return [agg.close for agg in aggs if agg.timestamp < until_ms][-count:]
+
+def fetch_stock_data(ticker, end_date=None):
+    """Fetch daily bars from Polygon.io and compute EMAs locally.
+
+    end_date is the last trading session to include; scans resolve it once
+    and pass it in so it is not recomputed per ticker.
+    """
+    if end_date is None:
+        end_date = get_most_recent_trading_day()
+    start_date = end_date - timedelta(days=DISPLAY_DAYS)
+    # Extra history so the EMAs have converged by the first displayed bar, in every timeframe
+    history_start = start_date - timedelta(days=HISTORY_DAYS)
     
-    logging.info(f"Fetching data for {ticker} from {start_date_str} to {end_date_str}")
+    logger.debug(f"Fetching data for {ticker} from {history_start} to {end_date}")
+    import pandas as pd
     
     try:
-        # Fetch aggregates data first
-        aggs = client.get_aggs(
-            ticker=ticker,
-            from_=start_date_str,
-            to=end_date_str,
-            multiplier=1,
-            timespan="day",
-            adjusted=True
-        )
+        with SCAN_STAGE_SECONDS.time(stage='bar_sync'):
+            if bar_store is not None:
+                # Only bars newer than the stored history are requested from Polygon
+                bars = bar_store.sync(ticker, lambda from_, to: fetch_daily_bars(ticker, from_, to),
+                                      history_start, end_date)
+            else:
+                bars = fetch_daily_bars(ticker, history_start, end_date)
         
-        if not aggs:
+        if bars.size == 0:
             logging.error(f"No aggregate data available for {ticker}")
             return pd.DataFrame()
             
-        # Create base DataFrame with price and volume data
-        df = pd.DataFrame([
-            {
-                'Date': pd.to_datetime(agg.timestamp, unit='ms').tz_localize('UTC').tz_convert('US/Eastern').date(),
-                'Price': agg.close,
-                'Volume': agg.volume,
-                'timestamp': agg.timestamp
-            }
-            for agg in aggs
-        ])
-        
-        # Calculate date range for EMA data
-        ema_start_date = end_date - timedelta(days=60)  # Fetch 60 days for better EMA calculation
-        end_timestamp = int(end_date.timestamp() * 1000)  # Convert to milliseconds
-        # Fetch EMA8 data
-        ema8_response = client.get_ema(
-            ticker=ticker,
-            timespan="day",
-            adjusted=True,
-            window=8,
-            series_type="close",
-            order="desc",
-            limit=120,
-            expand_underlying=True
-        )
-        
-        # Fetch EMA21 data
-        ema21_response = client.get_ema(
-            ticker=ticker,
-            timespan="day",
-            adjusted=True,
-            window=21,
-            series_type="close",
-            order="desc",
-            limit=120,
-            expand_underlying=True
-        )
-        
-        if not ema8_response or not ema21_response:
-            logging.error(f"No EMA data available for {ticker}")
+        display = bars[bars['date'] >= np.datetime64(start_date, 'D')]
+        if display.size == 0:
+            logging.error(f"Failed to process data for {ticker}")
             return pd.DataFrame()
         
-        # Log EMA response details
-        logging.info(f"EMA8 response for {ticker}: {ema8_response}")
-        logging.info(f"EMA21 response for {ticker}: {ema21_response}")
+        # EMAs advance from the previous scan's state; the full history is only
+        # replayed after a gap or a restatement. The bar of a session still trading
+        # is applied on top of the state without being stored in it.
+        with SCAN_STAGE_SECONDS.time(stage='ema_update'):
+            emas, _ = ema_states.update(ticker, bars['date'], bars['close'], EMA_WINDOWS,
+                                        tail=display.size, pairs=EMA_PAIRS,
+                                        provisional=bar_store.provisional_from(ticker) if bar_store else None)
         
-        # Add EMA values to DataFrame with error handling
-        try:
-            # Create dictionaries for EMA values
-            ema8_dict = {}
-            ema21_dict = {}
-            
-            # Extract values from responses
-            if hasattr(ema8_response, 'values') and ema8_response.values:
-                for r in ema8_response.values:
-                    if hasattr(r, 'timestamp') and hasattr(r, 'value'):
-                        ema8_dict[r.timestamp] = r.value
-            
-            if hasattr(ema21_response, 'values') and ema21_response.values:
-                for r in ema21_response.values:
-                    if hasattr(r, 'timestamp') and hasattr(r, 'value'):
-                        ema21_dict[r.timestamp] = r.value
-            
-            # Map values to DataFrame
-            df['EMA8'] = df['timestamp'].map(ema8_dict)
-            df['EMA21'] = df['timestamp'].map(ema21_dict)
-            
-            # Fill NaN values with previous values or 0
-            df['EMA8'] = df['EMA8'].fillna(method='ffill').fillna(0)
-            df['EMA21'] = df['EMA21'].fillna(method='ffill').fillna(0)
-            
-        except Exception as e:
-            logging.error(f"Error mapping EMA values for {ticker}: {str(e)}")
-            return pd.DataFrame()
-        
-        # Drop timestamp column as it's no longer needed
-        df = df.drop('timestamp', axis=1)
+        # Weekly and monthly bars are resampled from the same daily bars; only the open period is
+        # recomputed, completed ones advance from their stored EMA state
+        columns = {}
+        with SCAN_STAGE_SECONDS.time(stage='timeframes'):
+            for timeframe in SCAN_TIMEFRAMES:
+                tf_emas, tf_flags = timeframe_signals(ticker, bars['date'], bars['close'], EMA_WINDOWS, EMA_PAIRS,
+                                                      timeframe, display.size, ema_states)
+                columns.update({f'EMA{window}@{timeframe}': values for window, values in zip(EMA_WINDOWS, tf_emas)})
+                columns.update({f'FLAGS{fast}/{slow}@{timeframe}': values
+                                for (fast, slow), values in zip(EMA_PAIRS, tf_flags)})
         
-        if df.empty:
-            logging.error(f"Failed to process data for {ticker}")
-            return df
+        # Create base DataFrame with price, volume and EMA data, oldest first
+        df = pd.DataFrame({
+            'Date': display['date'].astype(object),
+            'Price': display['close'],
+            'Volume': display['volume'],
+            **{f'EMA{window}': values for window, values in emas.items()},
+            **columns
+        })
         
         # Sort by date descending for display
         df = df.sort_values('Date', ascending=False).reset_index(drop=True)
         
-        logging.info(f"Successfully processed {len(df)} days of data for {ticker}")
+        logger.debug(f"Successfully processed {len(df)} days of data for {ticker}")
         return df
         
     except Exception as e:
         logging.error(f"Error processing {ticker}: {str(e)}")
         return pd.DataFrame()
 
+def ensure_polygon_available(failed=0):
+    """Abort the scan while the circuit breaker is open so the previous snapshot keeps being served.
+
+    Checked before a scan starts and again after fetching, when any failures
+    may be down to Polygon being unavailable rather than a bad ticker.
+    """
+    state = circuit_breaker.state
+    if state == 'open' or (failed and state != 'closed'):
+        raise CircuitOpenError(f'Polygon unavailable (circuit {state}, {failed} fetches failed), '
+                               f'serving the previous snapshot')
+
 def scan_stocks():
-    """Scan ETFs for crossover patterns using 8-day and 21-day EMAs."""
-    # List of stocks to monitor
-    stocks = [
-        'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'TEM', 'META', 'TSLA', 'TSM', 'AMD', 'INTC',
-        'NFLX', 'ADBE', 'CSCO', 'QCOM', 'AVGO', 'TXN', 'ORCL', 'CRM', 'IBM', 'UBER',
-        'VRT', 'PLTR', 'SNOW', 'NET', 'CRWD', 'DDOG', 'ZS', 'TEAM', 'OKTA', 'DOCN'
-        ,'RDDT'
-    ]
+    """Scan ETFs for crossover patterns on every configured EMA pair."""
+    ensure_polygon_available()
+    if SCAN_MODE == 'universe':
+        return scan_universe()
     
+    stocks = WATCHLIST
     logger.info(f"Starting scan for {len(stocks)} stocks")
     
-    # Clear previous results
-    all_results.clear()
+    # Resolve the trading day once and share it across tickers
+    with SCAN_STAGE_SECONDS.time(stage='resolve_session'):
+        end_date = get_most_recent_trading_day()
+    logger.info(f"Using {end_date} as the most recent trading day")
     
-    for i, ticker in enumerate(stocks):
-        print(f"\nProcessing {ticker}...")
-        
-        # Try up to 3 times with exponential backoff
-        for attempt in range(3):
-            if attempt > 0:
-                backoff = 2 ** attempt * 5  # 5, 10, 20 seconds
-                print(f"Retry attempt {attempt + 1}, waiting {backoff} seconds...")
-                time.sleep(backoff)
-            
-            df = fetch_stock_data(ticker)
-            
-            if not df.empty:
-                break
-        
-        if df.empty:
-            print(f"Skipping {ticker} after {attempt + 1} attempts")
-            continue
-        
-        # Process all available data rows
-        ticker_count = 0
-        logger.info(f"Processing {len(df) - 2} possible data points for {ticker}")
-        
-        for i in range(len(df) - 2):  # We need at least 3 consecutive days
-            # Get three consecutive days of data
-            today = df.iloc[i]
-            yesterday = df.iloc[i + 1]
-            day_before = df.iloc[i + 2]
-            
-            # Check conditions
-            volume_condition = bool(today['Volume'] > 1000000)
-            
-            # Check for crossover points (both upward and downward crossings)
-            crossover_points = {
-                'today_up': bool(today['EMA8'] > today['EMA21'] and yesterday['EMA8'] <= yesterday['EMA21']),
-                'today_down': bool(today['EMA8'] < today['EMA21'] and yesterday['EMA8'] >= yesterday['EMA21']),
-                'yesterday_up': bool(yesterday['EMA8'] > yesterday['EMA21'] and day_before['EMA8'] <= day_before['EMA21']),
-                'yesterday_down': bool(yesterday['EMA8'] < yesterday['EMA21'] and day_before['EMA8'] >= day_before['EMA21'])
-            }
-            
-            # Determine if this is a valid crossover pattern
-            ema_crossover_condition = any([
-                crossover_points['today_up'],
-                crossover_points['today_down'],
-                crossover_points['yesterday_up'],
-                crossover_points['yesterday_down']
-            ])
-            
-            def safe_float(value):
-                try:
-                    return float(round(value, 2)) if pd.notna(value) else 0.0
-                except:
-                    return 0.0
-
-            def safe_int(value):
-                try:
-                    return int(value) if pd.notna(value) else 0
-                except:
-                    return 0
-
-            result = {
-                'symbol': str(ticker),
-                'date': today['Date'].strftime('%Y-%m-%d'),
-                'price': safe_float(today['Price']),
-                'volume': safe_int(today['Volume']),
-                'ema8': safe_float(today['EMA8']),
-                'ema21': safe_float(today['EMA21']),
-                'yesterday_date': yesterday['Date'].strftime('%Y-%m-%d'),
-                'yesterday_price': safe_float(yesterday['Price']),
-                'yesterday_volume': safe_int(yesterday['Volume']),
-                'yesterday_ema8': safe_float(yesterday['EMA8']),
-                'yesterday_ema21': safe_float(yesterday['EMA21']),
-                'day_before_date': day_before['Date'].strftime('%Y-%m-%d'),
-                'day_before_price': safe_float(day_before['Price']),
-                'day_before_volume': safe_int(day_before['Volume']),
-                'day_before_ema8': safe_float(day_before['EMA8']),
-                'day_before_ema21': safe_float(day_before['EMA21']),
-                'matched': bool(volume_condition and ema_crossover_condition),
-                'crossover_points': crossover_points,
-                'timestamp': datetime.now()
-            }
-            
-            all_results.append(result)
-            ticker_count += 1
-        
-        logger.info(f"Added {ticker_count} results for {ticker}")
-        logger.info(f"Current total results: {len(all_results)}")
+    def fetch_ticker(ticker):
+        # Failed Polygon calls are retried one at a time inside the client, so a
+        # ticker waiting on a backoff does not hold up the others
+        with SCAN_STAGE_SECONDS.time(stage='fetch_ticker'):
+            return fetch_stock_data(ticker, end_date)
+    
+    # Fetch tickers concurrently; the shared rate limiter paces the actual API calls.
+    # Each ticker's rows are streamed to /scan/stream as soon as it completes.
+    fetched = {}
+    failed = 0
+    scan_events.publish('progress', {'done': 0, 'total': len(stocks), 'failed': 0})
+    for ticker, df in fetch_concurrently(stocks, fetch_ticker, max_workers=POLYGON_MAX_CONCURRENCY):
+        fetched[ticker] = df
+        if df is None or df.empty:
+            failed += 1
+            logger.warning(f"Skipping {ticker}: no data after retries")
+            SCAN_TICKER_FAILURES.inc()
+            scan_events.publish('failed', {'ticker': ticker})
+        elif scan_events.running:
+            rows = compute_signals([(ticker, df)], EMA_PAIRS, timeframes=SCAN_TIMEFRAMES).records()
+            scan_events.publish('rows', {'ticker': ticker, 'results': rows})
+        scan_events.publish('progress', {'done': len(fetched), 'total': len(stocks), 'failed': failed, 'ticker': ticker})
+        # Long scans keep the lease alive, and stop once another worker has taken it
+        scheduler.keep_lease()
+    ensure_polygon_available(failed)
+    if bar_store is not None:
+        with SCAN_STAGE_SECONDS.time(stage='retention'):
+            bar_store.enforce_retention()
+    frames = [(ticker, fetched[ticker]) for ticker in stocks
+              if fetched.get(ticker) is not None and not fetched[ticker].empty]
+    
+    # Evaluate the crossover rule for all rows, tickers and pairs in one pass
+    with SCAN_STAGE_SECONDS.time(stage='signals'):
+        results = compute_signals(frames, EMA_PAIRS, timeframes=SCAN_TIMEFRAMES)
+        # Sort results by date in descending order, keeping ticker order within a date
+        results = results.sorted_by_date()
+    logger.info(f"Computed {len(results)} results for {len(frames)} tickers")
+    SCAN_TICKERS.set(len(frames))
+    SCAN_MATCHED.set(int(results.flag('matched').sum()))
+    return results  # Published as a snapshot by the scheduler
 
-        
-        print(f"Added {len(df) - 2} data points for {ticker}")
+def scan_universe():
+    """Scan the whole US market for crossovers using one grouped daily call per session."""
+    with SCAN_STAGE_SECONDS.time(stage='resolve_session'):
+        end_date = get_most_recent_trading_day()
+    display_start = end_date - timedelta(days=DISPLAY_DAYS)
+    history_start = display_start - timedelta(days=warmup_calendar_days(max(EMA_WINDOWS)))
+    sessions = trading_days(history_start, end_date)
+    logger.info(f"Starting universe scan over {len(sessions)} sessions ending {end_date}")
+    
+    def progress(done, total):
+        scan_events.publish('progress', {'done': done, 'total': total, 'failed': 0, 'unit': 'sessions'})
+        scheduler.keep_lease()
     
-    # Sort results by timestamp in descending order
-    all_results.sort(key=lambda x: x['date'], reverse=True)
-    return all_results  # Return all results for pagination
+    with SCAN_STAGE_SECONDS.time(stage='grouped_load'):
+        grouped = grouped_daily_cache.load(sessions, progress=progress)
+    ensure_polygon_available(len(sessions) - len(grouped))
+    missing = [session for session in sessions if session not in grouped]
+    if missing:
+        # A gap would make the EMAs skip a bar and "yesterday" point further back
+        raise IncompleteHistoryError(f'No grouped daily bars for {len(missing)} of {len(sessions)} sessions '
+                                     f'(first {missing[0]}), serving the previous snapshot')
+    with SCAN_STAGE_SECONDS.time(stage='pivot'):
+        close, volume = pivot_grouped(grouped)
+    if close.empty:
+        logger.error("No grouped daily data available")
+        return ResultTable.empty(EMA_PAIRS)
+    
+    with SCAN_STAGE_SECONDS.time(stage='universe_emas'):
+        data = universe_long_frame(close, volume, EMA_WINDOWS, display_start)
+    with SCAN_STAGE_SECONDS.time(stage='signals'):
+        results = signals_from_long(data, EMA_PAIRS).sorted_by_date()
+    tickers = data['symbol'].nunique() if not data.empty else 0
+    logger.info(f"Computed {len(results)} results for {tickers} tickers")
+    SCAN_TICKERS.set(tickers)
+    SCAN_MATCHED.set(int(results.flag('matched').sum()))
+    return results
 
-@app.route('/')
-def home():
-    html = '''
+# Single-page UI; it takes no template context, so it is compiled and rendered once
+HOME_PAGE = '''
     <!DOCTYPE html>
     <html>
     <head>
@@ -309,6 +442,9 @@ def home():
             .ema { color: #666; }
             .matched { background-color: rgba(144, 238, 144, 0.3); }
             .crossover { background-color: rgba(255, 192, 203, 0.3); }
+            .trend { font-size: 11px; font-weight: normal; margin-left: 4px; padding: 0 3px; border-radius: 3px; }
+            .trend.up { color: #1e7e34; border: 1px solid #1e7e34; }
+            .trend.down { color: #c82333; border: 1px solid #c82333; }
             .data-row:hover { background-color: #f8f9fa; }
             #loading { display: none; margin: 20px 0; color: #666; text-align: center; padding: 20px; }
             #loading:after { content: ''; display: inline-block; width: 20px; height: 20px; border: 2px solid #666; border-radius: 50%; border-top-color: transparent; animation: spin 1s linear infinite; }
@@ -327,7 +463,12 @@ def home():
             <h1>Stock Crossover Scanner</h1>
         <div id="loading" style="display: none;">Loading stock data and calculating crossovers...</div>
         <div id="error" style="display: none; text-align: center; margin: 10px 0; color: #dc3545;"></div>
-        <div id="stats" style="text-align: center; margin: 10px 0; color: #666;">Total Results: <span id="totalResults">0</span></div>
+        <div id="stats" style="text-align: center; margin: 10px 0; color: #666;">Total Results: <span id="totalResults">0</span> <span id="dataAge"></span></div>
+            <div id="filters" style="text-align: center; margin: 10px 0;">
+                <label><input type="checkbox" id="matchedOnly" onchange="applyFilters()"> Matched only</label>
+                <input type="text" id="symbolFilter" placeholder="Symbol(s), e.g. NVDA,AMD" onchange="applyFilters()" style="margin-left: 10px; padding: 4px;">
+                <label style="margin-left: 10px;">EMA pair <select id="pairSelect" onchange="applyFilters()"></select></label>
+            </div>
             <div id="pagination">
                 <button onclick="previousPage()" id="prevButton" disabled>Previous</button>
                 <span id="pageInfo">Page 1</span>
@@ -346,18 +487,18 @@ def home():
                     <th>Date</th>
                     <th>Price</th>
                     <th>Volume</th>
-                    <th>EMA8</th>
-                    <th>EMA21</th>
+                    <th class="emaFast">EMA8</th>
+                    <th class="emaSlow">EMA21</th>
                     <th>Date</th>
                     <th>Price</th>
                     <th>Volume</th>
-                    <th>EMA8</th>
-                    <th>EMA21</th>
+                    <th class="emaFast">EMA8</th>
+                    <th class="emaSlow">EMA21</th>
                     <th>Date</th>
                     <th>Price</th>
                     <th>Volume</th>
-                    <th>EMA8</th>
-                    <th>EMA21</th>
+                    <th class="emaFast">EMA8</th>
+                    <th class="emaSlow">EMA21</th>
                 </tr>
             </thead>
             <tbody></tbody>
@@ -366,6 +507,8 @@ def home():
         <script>
         let currentPage = 1;
         let totalPages = 1;
+        let scanRunning = false;
+        let scanSource = null;
 
         function fetchData() {
             document.getElementById('loading').style.display = 'block';
@@ -380,7 +523,7 @@ def home():
                 document.getElementById('loading').style.display = 'none';
             }, 30000);
 
-            fetch(`/scan?page=${currentPage}`, {
+            fetch(`/scan?page=${currentPage}${filterQuery()}`, {
                 headers: {
                     'Accept': 'application/json',
                     'Cache-Control': 'no-cache'
@@ -390,12 +533,26 @@ def home():
                     if (!response.ok) {
                         throw new Error(`HTTP error! status: ${response.status}`);
                     }
+                    // Cached pages leave the scanner state to a header, fresh even on a 304
+                    scanRunning = response.headers.get('X-Scan-Running') === '1';
                     return response.json();
                 })
                 .then(data => {
                     const tbody = document.querySelector('#results tbody');
+                    const scanning = data.scanning !== undefined ? data.scanning : scanRunning;
+                    showPairs(data.pairs);
+                    document.getElementById('dataAge').textContent = data.as_of
+                        ? `(as of ${new Date(data.as_of).toLocaleString()}, ${Math.round((Date.now() - new Date(data.as_of)) / 1000)}s old${scanning ? ', refreshing' : ''})`
+                        : '';
+                    if (data.snapshot_version === null && scanning) {
+                        // First scan still running: show rows as each ticker completes
+                        clearTimeout(fetchTimeout);
+                        streamScan();
+                        return;
+                    }
                     if (data.total === 0) {
                         tbody.innerHTML = '<tr><td colspan="16" class="no-data">No data available. Please wait while we fetch the stock data...</td></tr>';
+                        clearTimeout(fetchTimeout);
                         document.getElementById('loading').style.display = 'none';
                         document.getElementById('stats').style.display = 'block';
                         document.getElementById('pagination').style.display = 'block';
@@ -409,42 +566,7 @@ def home():
                     document.getElementById('nextButton').disabled = currentPage >= totalPages;
                     document.getElementById('totalResults').textContent = data.total;
                     
-                    data.results.forEach(item => {
-                        const row = document.createElement('tr');
-                        row.className = 'data-row' + (item.matched ? ' matched' : '');
-                        
-                        // Add symbol
-                        row.innerHTML = `<td>${item.symbol}</td>`;
-                        
-                        // Add today's data
-                        row.innerHTML += `
-                            <td>${item.date}</td>
-                            <td class="${item.crossover_points.today_up || item.crossover_points.today_down ? 'crossover' : ''}">${Number(item.price || 0).toFixed(2)}</td>
-                            <td>${(item.volume || 0).toLocaleString()}</td>
-                            <td class="ema">${Number(item.ema8 || 0).toFixed(2)}</td>
-                            <td class="ema">${Number(item.ema21 || 0).toFixed(2)}</td>
-                        `;
-                        
-                        // Add yesterday's data
-                        row.innerHTML += `
-                            <td>${item.yesterday_date}</td>
-                            <td class="${item.crossover_points.yesterday_up || item.crossover_points.yesterday_down ? 'crossover' : ''}">${Number(item.yesterday_price || 0).toFixed(2)}</td>
-                            <td>${(item.yesterday_volume || 0).toLocaleString()}</td>
-                            <td class="ema">${Number(item.yesterday_ema8 || 0).toFixed(2)}</td>
-                            <td class="ema">${Number(item.yesterday_ema21 || 0).toFixed(2)}</td>
-                        `;
-                        
-                        // Add day before's data
-                        row.innerHTML += `
-                            <td>${item.day_before_date}</td>
-                            <td>${Number(item.day_before_price || 0).toFixed(2)}</td>
-                            <td>${(item.day_before_volume || 0).toLocaleString()}</td>
-                            <td class="ema">${Number(item.day_before_ema8 || 0).toFixed(2)}</td>
-                            <td class="ema">${Number(item.day_before_ema21 || 0).toFixed(2)}</td>
-                        `;
-                        
-                        tbody.appendChild(row);
-                    });
+                    data.results.forEach(item => tbody.appendChild(renderRow(item)));
                     clearTimeout(fetchTimeout);
                     document.getElementById('loading').style.display = 'none';
                     document.getElementById('stats').style.display = 'block';
@@ -469,6 +591,123 @@ def home():
                 });
         }
 
+        function showPairs(pairs) {
+            const select = document.getElementById('pairSelect');
+            if (select.options.length !== pairs.length) {
+                select.innerHTML = pairs.map(pair => `<option value="${pair}">${pair}</option>`).join('');
+            }
+            const [fast, slow] = (select.value || pairs[0]).split('/');
+            document.querySelectorAll('.emaFast').forEach(th => th.textContent = `EMA${fast}`);
+            document.querySelectorAll('.emaSlow').forEach(th => th.textContent = `EMA${slow}`);
+        }
+
+        function renderRow(item) {
+            const [fast, slow] = item.pair.split('/');
+            const row = document.createElement('tr');
+            row.className = 'data-row' + (item.matched ? ' matched' : '');
+            
+            // Add symbol, with the weekly/monthly trend when those timeframes are scanned
+            const trends = Object.entries(item.timeframes || {})
+                .filter(([, tf]) => tf.trend)
+                .map(([name, tf]) => `<span class="trend ${tf.trend}" title="${name}ly trend ${tf.trend}">${name[0].toUpperCase()}</span>`)
+                .join('');
+            row.innerHTML = `<td>${item.symbol}${trends}</td>`;
+            
+            // Add today's data
+            row.innerHTML += `
+                <td>${item.date}</td>
+                <td class="${item.crossover_points.today_up || item.crossover_points.today_down ? 'crossover' : ''}">${Number(item.price || 0).toFixed(2)}</td>
+                <td>${(item.volume || 0).toLocaleString()}</td>
+                <td class="ema">${Number(item[`ema${fast}`] || 0).toFixed(2)}</td>
+                <td class="ema">${Number(item[`ema${slow}`] || 0).toFixed(2)}</td>
+            `;
+            
+            // Add yesterday's data
+            row.innerHTML += `
+                <td>${item.yesterday_date}</td>
+                <td class="${item.crossover_points.yesterday_up || item.crossover_points.yesterday_down ? 'crossover' : ''}">${Number(item.yesterday_price || 0).toFixed(2)}</td>
+                <td>${(item.yesterday_volume || 0).toLocaleString()}</td>
+                <td class="ema">${Number(item[`yesterday_ema${fast}`] || 0).toFixed(2)}</td>
+                <td class="ema">${Number(item[`yesterday_ema${slow}`] || 0).toFixed(2)}</td>
+            `;
+            
+            // Add day before's data
+            row.innerHTML += `
+                <td>${item.day_before_date}</td>
+                <td>${Number(item.day_before_price || 0).toFixed(2)}</td>
+                <td>${(item.day_before_volume || 0).toLocaleString()}</td>
+                <td class="ema">${Number(item[`day_before_ema${fast}`] || 0).toFixed(2)}</td>
+                <td class="ema">${Number(item[`day_before_ema${slow}`] || 0).toFixed(2)}</td>
+            `;
+            
+            return row;
+        }
+
+        function streamScan() {
+            const tbody = document.querySelector('#results tbody');
+            const matchedOnly = document.getElementById('matchedOnly').checked;
+            const symbols = document.getElementById('symbolFilter').value.toUpperCase().split(',').map(s => s.trim()).filter(s => s);
+            let shown = 0;
+            tbody.innerHTML = '';
+            document.getElementById('loading').style.display = 'block';
+            document.getElementById('stats').style.display = 'block';
+            document.getElementById('dataAge').textContent = '(first scan in progress)';
+
+            if (scanSource) {
+                scanSource.close();
+            }
+            const source = scanSource = new EventSource('/scan/stream');
+            source.addEventListener('progress', event => {
+                const progress = JSON.parse(event.data);
+                const unit = progress.unit || 'tickers';
+                document.getElementById('loading').textContent =
+                    `Scanning ${progress.done}/${progress.total} ${unit}` + (progress.failed ? `, ${progress.failed} failed` : '') + '...';
+            });
+            source.addEventListener('rows', event => {
+                const data = JSON.parse(event.data);
+                if (symbols.length && !symbols.includes(data.ticker)) {
+                    return;
+                }
+                data.results.forEach(item => {
+                    if (!matchedOnly || item.matched) {
+                        tbody.appendChild(renderRow(item));
+                        shown++;
+                    }
+                });
+                document.getElementById('totalResults').textContent = shown;
+            });
+            const finish = delay => {
+                source.close();
+                scanSource = null;
+                document.getElementById('loading').textContent = 'Loading stock data and calculating crossovers...';
+                setTimeout(fetchData, delay);
+            };
+            source.addEventListener('done', () => finish(0));
+            source.addEventListener('snapshot', () => finish(0));
+            source.onerror = () => finish(5000);
+        }
+
+        function filterQuery() {
+            let query = '';
+            if (document.getElementById('matchedOnly').checked) {
+                query += '&matched=1';
+            }
+            const symbols = document.getElementById('symbolFilter').value.trim();
+            if (symbols) {
+                query += `&symbol=${encodeURIComponent(symbols)}`;
+            }
+            const pair = document.getElementById('pairSelect').value;
+            if (pair) {
+                query += `&pair=${encodeURIComponent(pair)}`;
+            }
+            return query;
+        }
+
+        function applyFilters() {
+            currentPage = 1;
+            fetchData();
+        }
+
         function previousPage() {
             if (currentPage > 1) {
                 currentPage--;
@@ -491,7 +730,29 @@ def home():
     </body>
     </html>
     '''
-    return render_template_string(html)
+
+@lru_cache(maxsize=1)
+def home_page():
+    return app.jinja_env.from_string(HOME_PAGE).render()
+
+@app.route('/')
+def home():
+    return home_page()
+
+def snapshot_metadata(snapshot):
+    """Describe the snapshot a response was served from."""
+    pairs = [pair_name(p) for p in (snapshot.results.pairs if snapshot else EMA_PAIRS)]
+    if snapshot is None:
+        return {'snapshot_version': None, 'as_of': None, 'age_seconds': None, 'scanning': scheduler.scanning,
+                'pairs': pairs, 'polygon_circuit': circuit_breaker.state}
+    return {
+        'snapshot_version': snapshot.version,
+        'as_of': snapshot.completed_at.isoformat(),
+        'age_seconds': round(snapshot.age_seconds(), 1),
+        'scanning': scheduler.scanning,
+        'pairs': pairs,
+        'polygon_circuit': circuit_breaker.state
+    }
 
 @app.route('/scan')
 def scan():
@@ -501,48 +762,316 @@ def scan():
         
         if page < 1:
             return jsonify({'error': 'Invalid page number'}), 400
-            
-        results = scan_stocks()
+        if per_page < 1:
+            return jsonify({'error': 'Invalid per_page value'}), 400
         
-        # Calculate pagination
-        total_results = len(results)
-        logger.info(f"Total results before pagination: {total_results}")
-        
-        if total_results == 0:
-            logger.info("No results available")
-            return jsonify({
-                'results': [],
-                'total': 0,
-                'page': page,
-                'per_page': per_page,
-                'total_pages': 0
-            })
-        
-        # Ensure page number is valid
-        total_pages = (total_results + per_page - 1) // per_page
-        page = min(max(1, page), total_pages)
+        try:
+            filters = parse_filters(request.args)
+        except ValueError as e:
+            return jsonify({'error': 'Invalid filter', 'message': str(e)}), 400
         
-        # Calculate slice indices
-        start_idx = (page - 1) * per_page
-        end_idx = min(start_idx + per_page, total_results)
+        # A cursor pins pagination to the snapshot it was issued from
+        cursor = request.args.get('cursor')
+        offset = None
+        if cursor:
+            try:
+                version, offset = decode_cursor(cursor, filters)
+            except ValueError as e:
+                return jsonify({'error': 'Invalid cursor', 'message': str(e)}), 400
+            snapshot = scheduler.get(version)
+            if snapshot is None:
+                return jsonify({'error': 'Cursor expired', 'message': f'Snapshot v{version} is no longer available'}), 410
+        else:
+            # Serve the latest published snapshot; scans run in the background
+            snapshot = scheduler.snapshot
         
-        logger.info(f"Pagination details: page={page}, per_page={per_page}, total_pages={total_pages}")
-        logger.info(f"Returning results from index {start_idx} to {end_idx} (total: {total_results})")
+        if snapshot is None:
+            # First scan still running: nothing to cache yet
+            return jsonify({'results': [], 'total': 0, 'page': page, 'per_page': per_page, 'total_pages': 0,
+                            'next_cursor': None, **snapshot_metadata(None)})
         
-        paginated_results = results[start_idx:end_idx]
-        logger.info(f"Number of results in current page: {len(paginated_results)}")
+        try:
+            snapshot.results.pair_index(filters.get('pair'))
+            for timeframe in filters.get('confirm', ()):
+                snapshot.results.timeframe_index(timeframe)
+        except ValueError as e:
+            return jsonify({'error': 'Invalid filter', 'message': str(e)}), 400
         
-        return jsonify({
-            'results': paginated_results,
-            'total': total_results,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': total_pages
-        })
+        # A published snapshot never changes, so each page of it is encoded once
+        key = (snapshot.version, tuple(sorted(request.args.items(multi=True))))
+        entry = scan_responses.get(key)
+        if entry is None:
+            payload = scan_page(snapshot, filters, page, per_page, offset)
+            with SCAN_STAGE_SECONDS.time(stage='compress'):
+                entry = scan_responses.put(key, json_body(payload), snapshot.version)
+        return encoded_response(entry, snapshot)
     except Exception as e:
         logger.error(f"Error in scan endpoint: {str(e)}")
         return jsonify({'error': 'Internal server error', 'message': str(e)}), 500
 
+def scan_page(snapshot, filters, page, per_page, offset=None):
+    """The /scan payload for one page of snapshot.
+
+    Only the snapshot's fixed metadata is included so the body can be cached;
+    its age and the scanner state are sent as headers by encoded_response.
+    """
+    # The pair selects which flags the matched/crossover filters and the records use
+    select_filters = dict(filters)
+    pair = snapshot.results.pair_index(select_filters.pop('pair', None))
+    with SCAN_STAGE_SECONDS.time(stage='select'):
+        rows = snapshot.index.select(pair=pair, **select_filters)
+    total_results = len(rows)
+    metadata = {'snapshot_version': snapshot.version, 'as_of': snapshot.completed_at.isoformat(),
+                'pairs': [pair_name(p) for p in snapshot.results.pairs]}
+    
+    if total_results == 0:
+        return {'results': [], 'total': 0, 'page': page, 'per_page': per_page, 'total_pages': 0,
+                'next_cursor': None, **metadata}
+    
+    total_pages = (total_results + per_page - 1) // per_page
+    if offset is None:
+        # Ensure page number is valid
+        page = min(max(1, page), total_pages)
+        offset = (page - 1) * per_page
+    else:
+        page = offset // per_page + 1
+    
+    page_rows = rows[offset:offset + per_page]
+    next_offset = offset + per_page
+    next_cursor = encode_cursor(snapshot.version, next_offset, filters) if next_offset < total_results else None
+    
+    with SCAN_STAGE_SECONDS.time(stage='encode'):
+        records = snapshot.results.records_json(page_rows, timestamp=snapshot.started_at, pair=pair,
+                                                default=app.json.default)
+    return {
+        'results': EncodedJSON(records),
+        'total': total_results,
+        'page': page,
+        'per_page': per_page,
+        'total_pages': total_pages,
+        'next_cursor': next_cursor,
+        **metadata
+    }
+
+class EncodedJSON(str):
+    """A payload value that is already JSON text, such as rows from ResultTable.records_json."""
+
+
+def json_body(payload):
+    """Encode a cacheable payload as app.json.response does outside debug mode: compact, sorted keys,
+    trailing newline. EncodedJSON values are inserted as they are."""
+    def encode(value):
+        if isinstance(value, EncodedJSON):
+            return value
+        return json.dumps(value, default=app.json.default, sort_keys=True, separators=(',', ':'))
+    fields = ','.join(f'{encode(key)}:{encode(value)}' for key, value in sorted(payload.items()))
+    return ('{' + fields + '}\n').encode()
+
+def encoded_response(entry, snapshot):
+    """Serve a cached body compressed as the client accepts, or 304 when its ETag still matches."""
+    encoding = entry.negotiate(request.headers.get('Accept-Encoding', ''))
+    headers = {
+        'ETag': entry.tag(encoding),
+        # Cache, but revalidate every time: the ETag changes with each snapshot
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept-Encoding',
+        'X-Snapshot-Age-Seconds': f'{snapshot.age_seconds():.1f}',
+        'X-Scan-Running': '1' if scheduler.scanning else '0',
+        'X-Polygon-Circuit': circuit_breaker.state,
+    }
+    if entry.matches(request.headers.get('If-None-Match')):
+        RESPONSE_CACHE.inc(outcome='not_modified')
+        return Response(status=304, headers=headers)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(entry.encoded(encoding) if encoding else entry.body, mimetype='application/json',
+                    headers=headers)
+
+@app.route('/scan/changes')
+def scan_changes():
+    """Rows added, changed and removed since snapshot version `since`, and the newly matched ones.
+
+    Rows are identified by symbol and date. When `since` is older than the
+    changelog reaches (or unknown), the response asks for a full resync
+    from /scan instead.
+    """
+    try:
+        since = request.args.get('since', type=int)
+        if since is None or since < 0:
+            return jsonify({'error': 'Invalid filter', 'message': 'since must be a snapshot version'}), 400
+        snapshot = scheduler.snapshot
+        if snapshot is None:
+            return jsonify({'since': since, 'full_resync': True, **snapshot_metadata(None)})
+        try:
+            pair = snapshot.results.pair_index(request.args.get('pair'))
+        except ValueError as e:
+            return jsonify({'error': 'Invalid filter', 'message': str(e)}), 400
+        
+        key = ('changes', snapshot.version, since, pair)
+        entry = scan_responses.get(key)
+        if entry is None:
+            payload = changes_payload(snapshot, since, pair)
+            with SCAN_STAGE_SECONDS.time(stage='compress'):
+                entry = scan_responses.put(key, json_body(payload), snapshot.version)
+        return encoded_response(entry, snapshot)
+    except Exception as e:
+        logger.error(f"Error in scan changes endpoint: {str(e)}")
+        return jsonify({'error': 'Internal server error', 'message': str(e)}), 500
+
+def changes_payload(snapshot, since, pair):
+    """The /scan/changes payload for snapshot relative to version since."""
+    metadata = {'since': since, 'snapshot_version': snapshot.version, 'as_of': snapshot.completed_at.isoformat(),
+                'pair': pair_name(snapshot.results.pairs[pair])}
+    changes = scan_changelog.changes(since, snapshot, pair)
+    if changes is None:
+        SCAN_CHANGES.inc(outcome='resync')
+        return {'full_resync': True, 'added': [], 'changed': [], 'removed': [], 'newly_matched': [], **metadata}
+    SCAN_CHANGES.inc(outcome='delta')
+    with SCAN_STAGE_SECONDS.time(stage='encode'):
+        records = {name: EncodedJSON(snapshot.results.records_json(changes[name], timestamp=snapshot.started_at,
+                                                                   pair=pair, default=app.json.default))
+                   for name in ('added', 'changed', 'newly_matched')}
+    return {'full_resync': False, **records, 'removed': changes['removed'], **metadata}
+
+def stream_response(generate, ndjson):
+    """SSE or NDJSON response holding one of the STREAM_MAX_CLIENTS slots, or a 503 when all are taken."""
+    if not stream_clients.acquire(blocking=False):
+        return jsonify({'error': 'Too many stream clients',
+                        'message': f'At most {STREAM_MAX_CLIENTS} clients can stream at once; '
+                                   f'poll /scan or /intraday instead or retry later'}), 503, {'Retry-After': '30'}
+    response = Response(generate(), mimetype='application/x-ndjson' if ndjson else 'text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs when the server closes the response (client gone), even if the stream never started
+    response.call_on_close(stream_clients.release)
+    return response
+
+@app.route('/scan/stream')
+def scan_stream():
+    """Stream the running scan: progress events and each ticker's rows as soon as it is fetched.
+
+    Server-Sent Events by default, NDJSON with ?format=ndjson or an
+    application/x-ndjson Accept header. Clients that connect mid-scan first
+    receive the events so far. When no scan is running the stream carries a
+    single 'snapshot' event describing the published snapshot.
+    """
+    ndjson = (request.args.get('format') == 'ndjson'
+              or 'application/x-ndjson' in request.headers.get('Accept', ''))
+    encode = format_ndjson if ndjson else format_sse
+    
+    def generate():
+        followed = False
+        for item in scan_events.follow():
+            followed = True
+            yield encode(*item) if item else encode(None, None)
+        if not followed:
+            yield encode('snapshot', snapshot_metadata(scheduler.snapshot))
+    
+    return stream_response(generate, ndjson)
+
+@app.route('/intraday')
+def intraday():
+    """Last closed intraday bar of each streamed symbol in one timeframe, with its EMAs and crossover flags."""
+    if intraday_engine is None:
+        return jsonify({'error': 'Intraday streaming is not enabled', 'message': 'Set INTRADAY_STREAM=1'}), 503
+    try:
+        timeframe = intraday_engine.timeframe(request.args.get('timeframe'))
+        pair = intraday_engine.pair_index(request.args.get('pair'))
+    except ValueError as e:
+        return jsonify({'error': 'Invalid filter', 'message': str(e)}), 400
+    symbols = [s.strip().upper() for s in request.args.get('symbol', '').split(',') if s.strip()] or None
+    matched = request.args['matched'].lower() in ('1', 'true', 'yes') if request.args.get('matched') else None
+    results = intraday_engine.latest(timeframe, pair, symbols, matched)
+    return jsonify({
+        'results': results,
+        'total': len(results),
+        'timeframe': timeframe_name(timeframe),
+        'timeframes': [timeframe_name(tf) for tf in intraday_engine.timeframes],
+        'pair': pair_name(intraday_engine.pairs[pair]),
+        'symbols_tracked': len(intraday_engine)
+    })
+
+@app.route('/intraday/stream')
+def intraday_stream():
+    """Push intraday crossovers as their bars close, as Server-Sent Events (NDJSON with ?format=ndjson).
+
+    timeframe, symbol and pair filter the events. Each event has an id;
+    reconnecting with Last-Event-ID (or ?since=<id>) resumes after it while
+    the events are still buffered.
+    """
+    if intraday_engine is None:
+        return jsonify({'error': 'Intraday streaming is not enabled', 'message': 'Set INTRADAY_STREAM=1'}), 503
+    try:
+        timeframes = {timeframe_name(intraday_engine.timeframe(tf))
+                      for tf in request.args.get('timeframe', '').split(',') if tf.strip()}
+        pair = pair_name(intraday_engine.pairs[intraday_engine.pair_index(request.args.get('pair'))])
+        last_id = request.headers.get('Last-Event-ID')
+        since = int(last_id) + 1 if last_id else request.args.get('since', type=int)
+    except ValueError as e:
+        return jsonify({'error': 'Invalid filter', 'message': str(e)}), 400
+    symbols = {s.strip().upper() for s in request.args.get('symbol', '').split(',') if s.strip()}
+    ndjson = (request.args.get('format') == 'ndjson'
+              or 'application/x-ndjson' in request.headers.get('Accept', ''))
+    encode = format_ndjson if ndjson else format_sse
+    
+    def wanted(data):
+        return (data['pair'] == pair and (not timeframes or data['timeframe'] in timeframes)
+                and (not symbols or data['symbol'] in symbols))
+    
+    def generate():
+        for item in intraday_feed.follow(since):
+            if item is None:
+                yield encode(None, None)
+            elif item[1] != 'crossover' or wanted(item[2]):
+                yield encode(item[1], item[2], item[0])
+    
+    return stream_response(generate, ndjson)
+
+@app.route('/scan/refresh', methods=['POST'])
+def refresh_scan():
+    """Trigger a background scan without waiting for it to finish."""
+    if ADMIN_TOKEN and request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({'error': 'Forbidden'}), 403
+    queued = scheduler.refresh()
+    return jsonify({'queued': queued, **snapshot_metadata(scheduler.snapshot)}), 202
+
+@app.route('/signals/history')
+def signal_history():
+    """Persisted crossovers of one or more symbols, optionally within a date range and for one pair."""
+    if persistence is None:
+        return jsonify({'error': 'Signal history is not enabled', 'message': 'Set PERSISTENCE_BACKEND'}), 503
+    symbols = [s.strip().upper() for s in request.args.get('symbol', '').split(',') if s.strip()]
+    if not symbols:
+        return jsonify({'error': 'Invalid filter', 'message': 'symbol is required'}), 400
+    try:
+        start, end = (str(np.datetime64(request.args[name].strip(), 'D')) if request.args.get(name) else None
+                      for name in ('start', 'end'))
+        pair = pair_name(parse_pairs(request.args['pair'])[0]) if request.args.get('pair') else None
+    except ValueError as e:
+        return jsonify({'error': 'Invalid filter', 'message': str(e)}), 400
+    try:
+        results = [doc for symbol in symbols for doc in persistence.signal_history(symbol, start, end, pair)]
+    except Exception as e:
+        logger.error(f"Error reading signal history: {str(e)}")
+        return jsonify({'error': 'Signal history unavailable', 'message': str(e)}), 503
+    return jsonify({'results': results, 'total': len(results), 'symbols': symbols, 'start': start, 'end': end,
+                    'pair': pair})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Scan, Polygon and HTTP metrics in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    if 'request_started' in g:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_started,
+                                     endpoint=request.endpoint or 'unknown', status=response.status_code)
+    return response
+
 @app.errorhandler(500)
 def handle_500_error(error):
     logger.error(f'Internal Server Error: {error}')
@@ -553,6 +1082,48 @@ def handle_exception(error):
     logger.error(f'Unhandled Exception: {error}')
     return jsonify({'error': 'Server Error', 'message': str(error)}), 500
 
+# Slots for /scan/stream and /intraday/stream clients
+stream_clients = threading.BoundedSemaphore(STREAM_MAX_CLIENTS)
+
+# Intraday bars and crossovers from the websocket feed, pushed to /intraday/stream clients
+intraday_feed = IntradayFeed(INTRADAY_EVENT_BUFFER)
+intraday_engine = IntradayEngine(INTRADAY_TIMEFRAMES, EMA_PAIRS, INTRADAY_MIN_VOLUME, intraday_feed,
+                                 history_fn=fetch_intraday_history if INTRADAY_WARMUP else None,
+                                 history_workers=POLYGON_MAX_CONCURRENCY) if INTRADAY_STREAM else None
+
+# Published snapshots are written in the background by the worker that scanned them
+persistence_backend = open_backend(PERSISTENCE_BACKEND, PERSISTENCE_PREFIX, PERSISTENCE_SNAPSHOTS_KEPT)
+persistence = ScanPersistence(persistence_backend) if persistence_backend else None
+
+# Background scanner publishing snapshots for /scan
+scheduler = ScanScheduler(scan_stocks, interval=SCAN_INTERVAL, off_hours_interval=SCAN_OFF_HOURS_INTERVAL,
+                          index_fn=ResultIndex, history=SNAPSHOT_HISTORY, events=scan_events,
+                          store=open_snapshot_store(SNAPSHOT_STORE, SNAPSHOT_HISTORY),
+                          lease_seconds=SCAN_LEASE_SECONDS, poll_interval=SNAPSHOT_STORE_POLL_SECONDS,
+                          on_publish=persistence.submit if persistence else None,
+                          on_snapshot=scan_changelog.observe)
+metrics.gauge('scan_snapshot_age_seconds', 'Seconds since the latest snapshot was published').set_function(
+    lambda: scheduler.snapshot.age_seconds() if scheduler.snapshot else None)
+if STARTUP_WARMUP:
+    with SCAN_STAGE_SECONDS.time(stage='warmup'):
+        home_page()
+        scheduler.sync(force=True)
+        if persistence:
+            try:
+                restored = persistence.load_latest()
+                if restored:
+                    persistence.mark_written(restored[0])
+                    scheduler.restore(*restored)
+            except Exception as e:
+                logger.error(f'Could not restore the persisted snapshot: {str(e)}')
+    if scheduler.snapshot:
+        logger.info(f'Warm start from stored snapshot v{scheduler.snapshot.version}')
+if os.environ.get('SCAN_SCHEDULER_ENABLED', '1') != '0':
+    scheduler.start()
+if intraday_engine is not None:
+    intraday_stream_client = IntradayStream(intraday_engine, API_KEY, INTRADAY_SYMBOLS or WATCHLIST, INTRADAY_FEED)
+    intraday_stream_client.start()
+
 if __name__ == '__main__':
     try:
         port = int(os.environ.get('PORT', 8080))
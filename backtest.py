@@ -0,0 +1,262 @@
+"""Backtest the scanner's crossover signals over local daily bar history.
+
+Signals come from signals.signals_from_long, the same code the live scan
+uses, so the rule tested is exactly the rule served by /scan. Tickers are
+split into chunks that run in a process pool; each chunk is evaluated
+with whole-array operations and only the per-signal trade outcomes travel
+back to the parent.
+
+    python backtest.py --bars /tmp/crossover-bars --years 10
+    python backtest.py --synthetic 500 --years 10
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from bar_store import BAR_DTYPE, BarStore
+from indicators import ema, warmup_bars
+from result_table import FLAG_BITS, pair_name
+from signals import DEFAULT_PAIRS, MIN_VOLUME, pair_windows, parse_pairs, signals_from_long
+from trading_calendar import trading_days
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HORIZONS = (1, 5, 10, 20)
+
+# Signal types reported, as (name, required flags, any-of flags, expected direction).
+# Up signals count as a hit when the forward return is positive, down signals
+# when it is negative, and drawdown is the worst close against that direction
+# while holding. 'all' is every evaluated bar, the baseline to beat.
+SIGNAL_TYPES = (
+    ('all', 0, 0, 1),
+    ('matched', FLAG_BITS['matched'], 0, 1),
+    ('matched_up', FLAG_BITS['matched'], FLAG_BITS['today_up'] | FLAG_BITS['yesterday_up'], 1),
+    ('matched_down', FLAG_BITS['matched'], FLAG_BITS['today_down'] | FLAG_BITS['yesterday_down'], -1),
+    ('today_up', FLAG_BITS['today_up'], 0, 1),
+    ('today_down', FLAG_BITS['today_down'], 0, -1),
+    ('yesterday_up', FLAG_BITS['yesterday_up'], 0, 1),
+    ('yesterday_down', FLAG_BITS['yesterday_down'], 0, -1),
+)
+
+
+def read_local_bars(root, ticker):
+    """Bars for ticker from a <ticker>.npy fixture under root, or from a BarStore rooted there."""
+    fixture = os.path.join(root, ticker + '.npy')
+    if os.path.exists(fixture):
+        bars = np.load(fixture).astype(BAR_DTYPE)
+        return bars[np.argsort(bars['date'], kind='stable')]
+    return BarStore(root).read(ticker)
+
+
+def local_tickers(root):
+    """Tickers available under root, either as fixtures or bar store directories."""
+    names = set()
+    for entry in os.scandir(root):
+        if entry.is_file() and entry.name.endswith('.npy'):
+            names.add(entry.name[:-4])
+        elif entry.is_dir():
+            names.add(entry.name)
+    return sorted(names)
+
+
+@lru_cache(maxsize=4)
+def _sessions(start, end):
+    return np.array(trading_days(start, end), dtype='datetime64[D]')
+
+
+def synthetic_bars(ticker, start, end, seed=0):
+    """Random-walk daily bars on NYSE sessions, for benchmarking without data."""
+    sessions = _sessions(start, end)
+    rng = np.random.default_rng([seed, sum(map(ord, ticker))])
+    bars = np.zeros(sessions.size, dtype=BAR_DTYPE)
+    bars['date'] = sessions
+    bars['close'] = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, sessions.size)))
+    bars['volume'] = rng.lognormal(13.8, 0.8, sessions.size)
+    return bars
+
+
+def _load(source, ticker, start, end):
+    if source['kind'] == 'synthetic':
+        return synthetic_bars(ticker, start, end, source['seed'])
+    bars = read_local_bars(source['root'], ticker)
+    return bars[(bars['date'] >= np.datetime64(start, 'D')) & (bars['date'] <= np.datetime64(end, 'D'))]
+
+
+def _long_frame(tickers, source, start, end, windows, warmup):
+    """Newest-first ticker blocks with locally computed EMAs, as the live scan builds them.
+
+    Also returns each bar's count of older bars in its ticker, so signals
+    inside the EMA warm-up can be skipped.
+    """
+    parts = []
+    ages = []
+    for ticker in tickers:
+        bars = _load(source, ticker, start, end)
+        if bars.size <= warmup + 2:
+            continue
+        closes = bars['close']
+        frame = {
+            'symbol': np.full(bars.size, ticker, dtype=object),
+            'Date': bars['date'][::-1],
+            'Price': closes[::-1],
+            'Volume': bars['volume'][::-1],
+        }
+        for w in windows:
+            frame[f'EMA{w}'] = ema(closes, w)[::-1]
+        parts.append(pd.DataFrame(frame))
+        ages.append(np.arange(bars.size - 1, -1, -1))
+    if not parts:
+        return pd.DataFrame(), np.empty(0, dtype=np.int64)
+    return pd.concat(parts, ignore_index=True), np.concatenate(ages)
+
+
+def _run_chunk(tickers, source, start, end, pairs, horizons, min_volume):
+    """Trade outcomes of one ticker chunk: {(pair, signal, horizon): (returns, drawdowns)}."""
+    windows = pair_windows(pairs)
+    warmup = warmup_bars(max(windows))
+    data, ages = _long_frame(tickers, source, start, end, windows, warmup)
+    outcomes = {}
+    if data.empty:
+        return outcomes
+
+    results = signals_from_long(data, pairs, min_volume)
+    keep = ages[results.row_bar] >= warmup  # EMAs have not converged before this
+    bars = results.row_bar[keep].astype(np.int64)
+    flags = results.row_flags[:, keep]
+    prices = results.price
+    codes = results.bar_symbol
+
+    for horizon in horizons:
+        # Newest-first blocks: the bar `horizon` sessions later sits `horizon` positions earlier
+        exit_bars = bars - horizon
+        valid = exit_bars >= 0
+        valid[valid] = codes[exit_bars[valid]] == codes[bars[valid]]
+        entry, exit_ = bars[valid], exit_bars[valid]
+        returns = prices[exit_] / prices[entry] - 1
+        # Lowest and highest close over the holding period, relative to the entry close
+        window = np.lib.stride_tricks.sliding_window_view(prices, horizon)
+        drawdowns = {
+            1: np.minimum(window.min(axis=1)[exit_] / prices[entry] - 1, 0),
+            -1: np.minimum(1 - window.max(axis=1)[exit_] / prices[entry], 0),
+        }
+        horizon_flags = flags[:, valid]
+        for p, pair in enumerate(pairs):
+            for name, required, any_of, direction in SIGNAL_TYPES:
+                mask = (horizon_flags[p] & required) == required
+                if any_of:
+                    mask &= (horizon_flags[p] & any_of) != 0
+                outcomes[(pair, name, horizon)] = (returns[mask].astype(np.float32),
+                                                   drawdowns[direction][mask].astype(np.float32))
+    return outcomes
+
+
+def summarize(outcomes, pairs, horizons):
+    """Per pair, signal type and horizon: trades, returns, hit rate and drawdown."""
+    directions = {name: direction for name, _, _, direction in SIGNAL_TYPES}
+    rows = []
+    for pair in pairs:
+        for name, _, _, _ in SIGNAL_TYPES:
+            for horizon in horizons:
+                returns, drawdowns = outcomes.get((pair, name, horizon), (np.empty(0), np.empty(0)))
+                row = {'pair': pair_name(pair), 'signal': name, 'horizon': horizon, 'trades': int(returns.size)}
+                if returns.size:
+                    row.update({
+                        'mean_return': float(returns.mean()),
+                        'median_return': float(np.median(returns)),
+                        'hit_rate': float((np.sign(returns) == directions[name]).mean()),
+                        'mean_drawdown': float(drawdowns.mean()),
+                        'max_drawdown': float(drawdowns.min()),
+                    })
+                rows.append(row)
+    return rows
+
+
+def run_backtest(tickers, source, start, end, pairs=DEFAULT_PAIRS, horizons=DEFAULT_HORIZONS,
+                 min_volume=MIN_VOLUME, workers=None, chunk_size=25):
+    """Backtest every signal type over tickers and return summarize() rows.
+
+    source is {'kind': 'local', 'root': path} for bar store directories or
+    .npy fixtures, or {'kind': 'synthetic', 'seed': n}. Bars from start to
+    end are used; the first warm-up bars of each ticker only seed the EMAs.
+    """
+    chunks = [tickers[i:i + chunk_size] for i in range(0, len(tickers), chunk_size)]
+    args = (source, start, end, tuple(pairs), tuple(horizons), min_volume)
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    collected = {}
+
+    def collect(part):
+        for key, (returns, drawdowns) in part.items():
+            collected.setdefault(key, ([], []))
+            collected[key][0].append(returns)
+            collected[key][1].append(drawdowns)
+
+    if workers <= 1:
+        for chunk in chunks:
+            collect(_run_chunk(chunk, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for part in pool.map(_run_chunk, chunks, *[[arg] * len(chunks) for arg in args]):
+                collect(part)
+    outcomes = {key: (np.concatenate(r), np.concatenate(d)) for key, (r, d) in collected.items()}
+    return summarize(outcomes, pairs, horizons)
+
+
+def format_report(rows):
+    lines = [f"{'pair':>7} {'signal':<15} {'h':>3} {'trades':>8} {'mean':>8} {'median':>8} "
+             f"{'hit':>6} {'avg dd':>8} {'max dd':>8}"]
+    for row in rows:
+        if not row['trades']:
+            lines.append(f"{row['pair']:>7} {row['signal']:<15} {row['horizon']:>3} {0:>8}")
+            continue
+        lines.append(f"{row['pair']:>7} {row['signal']:<15} {row['horizon']:>3} {row['trades']:>8} "
+                     f"{row['mean_return']:>8.2%} {row['median_return']:>8.2%} {row['hit_rate']:>6.1%} "
+                     f"{row['mean_drawdown']:>8.2%} {row['max_drawdown']:>8.2%}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    data = parser.add_mutually_exclusive_group(required=True)
+    data.add_argument('--bars', help='directory of bar store tickers or <TICKER>.npy fixtures')
+    data.add_argument('--synthetic', type=int, metavar='N', help='generate N random-walk tickers')
+    parser.add_argument('--tickers', help='comma-separated tickers (default: all under --bars)')
+    parser.add_argument('--years', type=float, default=10, help='history length ending today (default 10)')
+    parser.add_argument('--pairs', default=os.environ.get('SCAN_EMA_PAIRS', '8/21'), help='EMA pairs, e.g. 8/21,50/200')
+    parser.add_argument('--horizons', default=','.join(map(str, DEFAULT_HORIZONS)), help='forward sessions')
+    parser.add_argument('--min-volume', type=float, default=MIN_VOLUME)
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=25, help='tickers per process task')
+    parser.add_argument('--json', help='also write the report rows to this file')
+    args = parser.parse_args()
+
+    end = date.today()
+    start = end - timedelta(days=int(args.years * 365.25))
+    if args.synthetic:
+        source = {'kind': 'synthetic', 'seed': 0}
+        tickers = [f'SYN{i:05d}' for i in range(args.synthetic)]
+    else:
+        source = {'kind': 'local', 'root': args.bars}
+        tickers = args.tickers.upper().split(',') if args.tickers else local_tickers(args.bars)
+    pairs = parse_pairs(args.pairs)
+    horizons = tuple(int(h) for h in args.horizons.split(','))
+
+    started = time.perf_counter()
+    rows = run_backtest(tickers, source, start, end, pairs, horizons, args.min_volume,
+                        args.workers, args.chunk_size)
+    print(format_report(rows))
+    print(f'\n{len(tickers)} tickers, {start} to {end}, {time.perf_counter() - started:.2f}s')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+import logging
+import os
+import shutil
+import threading
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+
+from trading_calendar import session_bounds
+
+logger = logging.getLogger(__name__)
+
+BAR_DTYPE = np.dtype([
+    ('date', 'datetime64[D]'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'f8'),
+])
+
+# Relative close difference on the overlapping bar that signals a split/dividend restatement
+RESTATEMENT_TOLERANCE = 1e-6
+
+
+def empty_bars():
+    return np.empty(0, dtype=BAR_DTYPE)
+
+
+def bars_from_aggs(aggs):
+    """Convert Polygon daily aggregates (ms timestamps) into a sorted bar array."""
+    import pandas as pd
+    if not aggs:
+        return empty_bars()
+    bars = np.empty(len(aggs), dtype=BAR_DTYPE)
+    timestamps = pd.to_datetime([agg.timestamp for agg in aggs], unit='ms', utc=True)
+    bars['date'] = timestamps.tz_convert('US/Eastern').tz_localize(None).normalize().values.astype('datetime64[D]')
+    for field in ('open', 'high', 'low', 'close', 'volume'):
+        bars[field] = np.array([getattr(agg, field) for agg in aggs], dtype=float)
+    return _dedupe(bars)
+
+
+def _dedupe(bars):
+    """Sort by date, keeping the last occurrence of each date."""
+    if bars.size == 0:
+        return bars
+    order = np.argsort(bars['date'], kind='stable')
+    bars = bars[order]
+    last = np.ones(bars.size, dtype=bool)
+    last[:-1] = bars['date'][1:] != bars['date'][:-1]
+    return bars[last]
+
+
+class BarStore:
+    """Daily OHLCV bars on disk, one directory of memory-mapped .npy segments per ticker.
+
+    Appends add a small segment; once a ticker has more than max_segments
+    they are compacted into one, keeping at most max_bars of the newest bars.
+    When the store grows past max_bytes the least recently used tickers are
+    evicted.
+    """
+
+    def __init__(self, root, max_bytes=None, max_bars=None, max_segments=8):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_bars = max_bars
+        self.max_segments = max_segments
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _lock(self, ticker):
+        with self._locks_lock:
+            return self._locks.setdefault(ticker, threading.Lock())
+
+    def _dir(self, ticker):
+        return os.path.join(self.root, ticker.replace('/', '_').replace('.', '_'))
+
+    def _segments(self, ticker):
+        path = self._dir(ticker)
+        if not os.path.isdir(path):
+            return []
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.npy'))
+
+    def _write_segment(self, ticker, bars, sequence):
+        path = self._dir(ticker)
+        os.makedirs(path, exist_ok=True)
+        final = os.path.join(path, f'{sequence:08d}.npy')
+        tmp = os.path.join(path, f'.{uuid.uuid4().hex}.tmp')
+        with open(tmp, 'wb') as f:
+            np.save(f, bars)
+        os.replace(tmp, final)
+
+    def _read(self, ticker):
+        segments = self._segments(ticker)
+        if not segments:
+            return empty_bars(), segments
+        parts = [np.load(segment, mmap_mode='r') for segment in segments]
+        # Later segments win on overlapping dates
+        return _dedupe(np.concatenate(parts)), segments
+
+    def read(self, ticker):
+        """All stored bars for ticker, oldest first."""
+        with self._lock(ticker):
+            bars, segments = self._read(ticker)
+        if segments:
+            os.utime(self._dir(ticker))  # mark as recently used for retention
+        return bars
+
+    def replace(self, ticker, bars, covered_from=None):
+        """Discard stored history and store bars as the only segment.
+
+        covered_from is the start date that was requested from the data
+        source; it is remembered so tickers listed after it are not
+        refetched on every sync.
+        """
+        with self._lock(ticker):
+            bars = self._trim(_dedupe(bars))
+            old = self._segments(ticker)
+            sequence = int(os.path.basename(old[-1])[:-4]) + 1 if old else 0
+            self._write_segment(ticker, bars, sequence)
+            for segment in old:
+                os.remove(segment)
+            if covered_from is not None:
+                if bars.size and bars.size == self.max_bars:
+                    covered_from = bars['date'][0]
+                with open(os.path.join(self._dir(ticker), 'coverage'), 'w') as f:
+                    f.write(str(np.datetime64(covered_from, 'D')))
+
+    def covered_from(self, ticker):
+        """Earliest date the stored history is known to be complete from, or None."""
+        try:
+            with open(os.path.join(self._dir(ticker), 'coverage')) as f:
+                return np.datetime64(f.read().strip(), 'D')
+        except (OSError, ValueError):
+            return None
+
+    def provisional_from(self, ticker):
+        """Date of the stored bar fetched while its session was still trading, or None."""
+        try:
+            with open(os.path.join(self._dir(ticker), 'provisional')) as f:
+                return np.datetime64(f.read().strip(), 'D')
+        except (OSError, ValueError):
+            return None
+
+    def _mark_provisional(self, ticker, bars, now):
+        """Remember whether the newest bar was fetched before its session closed."""
+        path = os.path.join(self._dir(ticker), 'provisional')
+        if bars.size and now < session_bounds(bars['date'][-1].astype(object))[1]:
+            with open(path, 'w') as f:
+                f.write(str(bars['date'][-1]))
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def append(self, ticker, bars):
+        """Add bars as a new segment, compacting when the ticker has too many segments."""
+        if bars.size == 0:
+            return
+        with self._lock(ticker):
+            segments = self._segments(ticker)
+            sequence = int(os.path.basename(segments[-1])[:-4]) + 1 if segments else 0
+            self._write_segment(ticker, _dedupe(bars), sequence)
+            if len(segments) + 1 > self.max_segments:
+                self._compact(ticker)
+
+    def compact(self, ticker):
+        with self._lock(ticker):
+            self._compact(ticker)
+
+    def _compact(self, ticker):
+        bars, segments = self._read(ticker)
+        if len(segments) <= 1:
+            return
+        sequence = int(os.path.basename(segments[-1])[:-4]) + 1
+        trimmed = self._trim(bars)
+        self._write_segment(ticker, trimmed, sequence)
+        for segment in segments:
+            os.remove(segment)
+        if trimmed.size < bars.size:
+            with open(os.path.join(self._dir(ticker), 'coverage'), 'w') as f:
+                f.write(str(trimmed['date'][0]))
+
+    def _trim(self, bars):
+        if self.max_bars and bars.size > self.max_bars:
+            return bars[-self.max_bars:]
+        return bars
+
+    def remove(self, ticker):
+        with self._lock(ticker):
+            shutil.rmtree(self._dir(ticker), ignore_errors=True)
+
+    def size_bytes(self):
+        total = 0
+        for entry in os.scandir(self.root):
+            if entry.is_dir():
+                total += sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+        return total
+
+    def enforce_retention(self):
+        """Evict least recently used tickers until the store fits in max_bytes."""
+        if not self.max_bytes:
+            return
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.is_dir():
+                size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                entries.append((entry.stat().st_mtime, size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            logger.info(f'Evicted {os.path.basename(path)} from bar store ({size} bytes)')
+
+    def sync(self, ticker, fetch_fn, history_start, end_date, now=None):
+        """Bring ticker up to end_date, fetching only what the store does not have.
+
+        fetch_fn(from_date, to_date) returns a bar array from the data source.
+        The last final stored bar is fetched again; if its close changed the
+        history was restated (split, dividend adjustment) and is refetched
+        in full. A bar fetched before its session closed is not final: it is
+        fetched again on every sync until a fetch after the close replaces
+        it. Returns the bars from history_start to end_date.
+        """
+        now = now or datetime.now(timezone.utc)
+        stored = self.read(ticker)
+        start = np.datetime64(history_start, 'D')
+        end = np.datetime64(end_date, 'D')
+
+        covered = self.covered_from(ticker)
+        provisional = self.provisional_from(ticker)
+        final = stored[stored['date'] < provisional] if provisional is not None else stored
+        # A store holding max_bars was trimmed to them; older history is dropped on purpose, not missing
+        full = bool(self.max_bars) and stored.size >= self.max_bars
+        if final.size == 0 or covered is None or (covered > start and not full):
+            logger.info(f'Bar store miss for {ticker}, fetching full history')
+            bars = fetch_fn(history_start, end_date)
+            self.replace(ticker, bars, covered_from=history_start)
+            stored = self.read(ticker)
+            self._mark_provisional(ticker, stored, now)
+        elif stored['date'][-1] < end or provisional is not None:
+            last = final[-1]
+            fresh = fetch_fn(last['date'].astype(object), end_date)
+            overlap = fresh[fresh['date'] == last['date']]
+            if overlap.size and abs(overlap['close'][0] - last['close']) > RESTATEMENT_TOLERANCE * abs(last['close']):
+                logger.info(f'History restated for {ticker}, refetching')
+                refetch_start = min(history_start, covered.astype(object))
+                bars = fetch_fn(refetch_start, end_date)
+                self.replace(ticker, bars, covered_from=refetch_start)
+            else:
+                self.append(ticker, fresh[fresh['date'] > last['date']])
+            stored = self.read(ticker)
+            self._mark_provisional(ticker, stored, now)
+
+        return stored[(stored['date'] >= start) & (stored['date'] <= end)]
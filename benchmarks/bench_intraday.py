@@ -0,0 +1,124 @@
+"""Intraday streaming benchmark against a local fake Polygon websocket, fully offline.
+
+A fake server replays a session of minute aggregates for a synthetic
+watchlist to an IntradayStream; a client follows the IntradayFeed as the
+/intraday/stream endpoint does. Reported: minutes processed per second,
+bars closed, crossovers pushed and the push latency from the server
+sending a bar's last minute to the client receiving the crossover.
+
+Memory is measured separately with tracemalloc by feeding the engine
+directly: the per-symbol footprint after one session and after three
+sessions should be the same.
+
+    python benchmarks/bench_intraday.py
+    python benchmarks/bench_intraday.py --symbols 5000 --minutes 390 --minute-interval 0.02
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_polygon_ws import MINUTE_MS, FakePolygonWebSocket
+from intraday import IntradayEngine, IntradayFeed, IntradayStream, parse_timeframes
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float('nan')
+
+
+def stream_run(symbols, args):
+    server = FakePolygonWebSocket(symbols, minutes=args.minutes, minute_interval=args.minute_interval)
+    url = server.start()
+    feed = IntradayFeed(maxlen=100000)
+    engine = IntradayEngine(parse_timeframes(args.timeframes), min_volume=args.min_volume, feed=feed)
+    latencies = []
+    stop = threading.Event()
+
+    def follow():
+        for item in feed.follow(heartbeat=0.2):
+            received = time.perf_counter()
+            if stop.is_set():
+                return
+            if item is None or item[1] != 'crossover':
+                continue
+            record = item[2]
+            # A bar closes with its last minute, which starts one minute before the bar ends
+            end = int(datetime.fromisoformat(record['end']).timestamp() * 1000)
+            sent = server.sent.get((end - MINUTE_MS, server.batch_of(record['symbol'])))
+            if sent is not None:
+                latencies.append((received - sent) * 1000)
+
+    follower = threading.Thread(target=follow, daemon=True)
+    follower.start()
+    stream = IntradayStream(engine, 'fake-key', ['*'], feed=url)
+    started = time.perf_counter()
+    stream.start()
+    server.done.wait()
+    # Wait for the client to drain the last minute
+    while len(engine) < len(symbols) or feed.next_id and time.perf_counter() - started < 1:
+        time.sleep(0.01)
+    time.sleep(0.2)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    stream.stop(5)
+    server.stop()
+    return {
+        'minutes_per_s': len(symbols) * args.minutes / elapsed,
+        'crossovers': feed.next_id,
+        'latency_ms': latencies,
+        'elapsed_s': elapsed,
+    }
+
+
+def memory_per_symbol(symbols, args, sessions):
+    """Bytes allocated per symbol by the engine after replaying `sessions` sessions."""
+    server = FakePolygonWebSocket(symbols, minutes=args.minutes)
+    tracemalloc.start()
+    engine = IntradayEngine(parse_timeframes(args.timeframes), min_volume=args.min_volume)
+    before = tracemalloc.get_traced_memory()[0]
+    for session in range(sessions):
+        offset = session * 24 * 60 * MINUTE_MS
+        for start, opens, highs, lows, closes, volumes in server.bars(symbols):
+            for s, o, h, l, c, v in zip(symbols, opens.tolist(), highs.tolist(), lows.tolist(), closes.tolist(),
+                                        volumes.tolist()):
+                engine.add_minute(s, start + offset, o, h, l, c, v)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(symbols)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Intraday streaming benchmark')
+    parser.add_argument('--symbols', type=int, default=2000)
+    parser.add_argument('--minutes', type=int, default=120, help='minutes per replayed session')
+    parser.add_argument('--minute-interval', type=float, default=0.05, help='seconds between replayed minutes')
+    parser.add_argument('--timeframes', default='5m,15m,1h')
+    parser.add_argument('--min-volume', type=int, default=100000)
+    parser.add_argument('--memory-symbols', type=int, default=500, help='symbols for the memory measurement')
+    args = parser.parse_args()
+
+    symbols = [f'SYN{i:05d}' for i in range(args.symbols)]
+    run = stream_run(symbols, args)
+    latency = run['latency_ms']
+    print(f"{'symbols':>8} {'minutes/s':>10} {'crossovers':>11} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    print(f"{args.symbols:>8} {run['minutes_per_s']:>10.0f} {run['crossovers']:>11} "
+          f"{statistics.median(latency) if latency else float('nan'):>8.2f} {percentile(latency, 0.99):>8.2f} "
+          f"{max(latency) if latency else float('nan'):>8.2f}")
+
+    memory_symbols = symbols[:args.memory_symbols]
+    one, three = (memory_per_symbol(memory_symbols, args, sessions) for sessions in (1, 3))
+    print(f'engine memory per symbol: {one:.0f} B after 1 session, {three:.0f} B after 3 sessions')
+
+
+if __name__ == '__main__':
+    main()
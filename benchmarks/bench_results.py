@@ -0,0 +1,90 @@
+"""Memory and JSON encode cost of scan results: per-row dicts vs ResultTable.
+
+The dicts are what /scan used to keep in memory for every row; the
+ResultTable is what snapshots hold now and serializes on request, with
+records_json as /scan does or through records() and json.dumps.
+
+Run from the repository root:
+
+    python benchmarks/bench_results.py
+"""
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from signals import signals_from_long  # noqa: E402
+
+ROWS = 10_000
+TICKERS = 100
+PAGE = 100
+
+
+def make_long_frame(rows, tickers, seed=0):
+    """Newest-first ticker blocks, sized so signals_from_long yields `rows` result rows."""
+    rng = np.random.default_rng(seed)
+    per_ticker = rows // tickers + 2
+    dates = np.arange(np.datetime64('2000-01-03'), np.datetime64('2000-01-03') + per_ticker)[::-1]
+    size = per_ticker * tickers
+    return pd.DataFrame({
+        'symbol': np.repeat([f'T{i:04d}' for i in range(tickers)], per_ticker),
+        'Date': np.tile(dates, tickers),
+        'Price': 100 * np.exp(rng.normal(0, 0.02, size)),
+        'Volume': rng.integers(200000, 5000000, size).astype(float),
+        'EMA8': 100 + rng.normal(0, 1, size),
+        'EMA21': 100 + rng.normal(0, 1, size),
+    })
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, size
+
+
+def best_of(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    data = make_long_frame(ROWS, TICKERS)
+    table, table_bytes = measure(lambda: signals_from_long(data))
+    assert len(table) == ROWS, len(table)
+    # Legacy layout: every row a dict with three copies of the bar data and a datetime stamp
+    now = datetime.now()
+    dicts, dict_bytes = measure(lambda: [dict(r, timestamp=now) for r in table.records()])
+    timestamp = now.isoformat()
+
+    def encode_dicts(rows):
+        return json.dumps(rows, default=str)
+
+    print(f'{ROWS:,} rows')
+    print(f"{'':<12} {'memory (MB)':>12} {'encode all (ms)':>16} {f'encode {PAGE} (ms)':>16}")
+    print(f"{'dicts':<12} {dict_bytes / 1e6:>12.2f} "
+          f'{best_of(lambda: encode_dicts(dicts)) * 1000:>16.1f} '
+          f'{best_of(lambda: encode_dicts(dicts[:PAGE]), 50) * 1000:>16.2f}')
+    print(f"{'ResultTable':<12} {table_bytes / 1e6:>12.2f} "
+          f'{best_of(lambda: table.records_json(timestamp=timestamp)) * 1000:>16.1f} '
+          f'{best_of(lambda: table.records_json(np.arange(PAGE), timestamp), 50) * 1000:>16.2f}')
+    print(f"{'  records()':<12} {'':>12} "
+          f'{best_of(lambda: json.dumps(table.records(timestamp=timestamp))) * 1000:>16.1f} '
+          f'{best_of(lambda: json.dumps(table.records(np.arange(PAGE), timestamp)), 50) * 1000:>16.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""End-to-end scan benchmark against a fake Polygon client, fully offline.
+
+Each watchlist size runs in a fresh process with an empty bar store:
+a cold scan, a warm scan (incremental fetch and EMA update), then a burst
+of /scan requests. Wall time, CPU time, API calls, injected failures and
+peak RSS are reported, saved under benchmarks/results/ and compared with
+the previous saved run, or with the committed benchmarks/baseline.json
+when there is none (e.g. on a fresh checkout or in CI).
+
+Run from the repository root:
+
+    python benchmarks/bench_scan.py
+    python benchmarks/bench_scan.py --sizes 30,500 --latency 0.05 --error-rate 0.01 --rate-limit-rate 0.02
+    python benchmarks/bench_scan.py --compare benchmarks/results/<file>.json --fail-on-regression
+    python benchmarks/bench_scan.py --save-baseline
+    POLYGON_API_KEY=... python benchmarks/bench_scan.py --record AAPL,MSFT,NVDA
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_SIZES = (30, 500, 5000)
+SCAN_QUERIES = (
+    '/scan',
+    '/scan?page=3',
+    '/scan?matched=1',
+    '/scan?symbol=SYN00001,SYN00002',
+    '/scan?date=latest&per_page=100',
+    '/scan?direction=up&crossover=today&sessions=5',
+)
+# Metrics where growth beyond the tolerance counts as a regression
+COMPARED = (('cold', 'wall_s'), ('cold', 'cpu_s'), ('warm', 'wall_s'), ('warm', 'cpu_s'),
+            ('scan_endpoint', 'p95_ms'), ('memory', 'peak_rss_mb'))
+
+
+def _rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def run_size(config):
+    """Benchmark one watchlist size in this process; returns a result dict."""
+    import app  # imported here so the environment set by the parent applies
+    from fake_polygon import FakeRESTClient
+
+    size = config['size']
+    fake = FakeRESTClient(FIXTURES_DIR, latency=config['latency'], jitter=config['latency'] / 2,
+                          error_rate=config['error_rate'], rate_limit_rate=config['rate_limit_rate'])
+    tickers = (fake.recorded_tickers + [f'SYN{i:05d}' for i in range(size)])[:size]
+    fake.universe = tickers
+    app.use_client(fake, requests_per_minute=0)
+    app.WATCHLIST = tickers
+    baseline_rss = _rss_mb()
+
+    result = {'symbols': size}
+    for phase in ('cold', 'warm'):
+        calls, failures = sum(fake.calls.values()), sum(fake.failures.values())
+        wall, cpu = time.perf_counter(), time.process_time()
+        snapshot = app.scheduler.run_once()
+        result[phase] = {
+            'wall_s': round(time.perf_counter() - wall, 3),
+            'cpu_s': round(time.process_time() - cpu, 3),
+            'api_calls': sum(fake.calls.values()) - calls,
+            'failures_injected': sum(fake.failures.values()) - failures,
+            'results': len(snapshot.results) if snapshot else None,
+        }
+
+    client = app.app.test_client()
+    latencies = []
+    for _ in range(config['requests']):
+        for query in SCAN_QUERIES:
+            start = time.perf_counter()
+            response = client.get(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, (query, response.status_code)
+    latencies.sort()
+    result['scan_endpoint'] = {
+        'requests': len(latencies),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 3),
+    }
+    result['memory'] = {'baseline_rss_mb': round(baseline_rss, 1), 'peak_rss_mb': round(_rss_mb(), 1)}
+    return result
+
+
+def _spawn(config):
+    workdir = tempfile.mkdtemp(prefix='bench-scan-')
+    env = dict(
+        os.environ,
+        SCAN_SCHEDULER_ENABLED='0',
+        SCAN_MODE=config['mode'],
+        BAR_STORE_DIR=os.path.join(workdir, 'bars'),
+        EMA_STATE_DIR=os.path.join(workdir, 'ema'),
+        POLYGON_MAX_CONCURRENCY=str(config['concurrency']),
+        POLYGON_RETRY_BASE_SECONDS=str(config['retry_base']),
+    )
+    child = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', json.dumps(config)],
+                           env=env, cwd=ROOT, capture_output=True, text=True)
+    if child.returncode != 0:
+        sys.exit(f"Benchmark for {config['size']} symbols failed:\n{child.stderr[-4000:]}")
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous, tolerance):
+    """Lines describing metric changes against a previous run, and whether any regressed."""
+    lines, regressed = [], False
+    before = {r['symbols']: r for r in previous['results']}
+    for result in current['results']:
+        old = before.get(result['symbols'])
+        if not old:
+            continue
+        for group, metric in COMPARED:
+            new_value, old_value = result[group][metric], old.get(group, {}).get(metric)
+            if not old_value:
+                continue
+            change = new_value / old_value - 1
+            flag = ''
+            if change > tolerance:
+                flag, regressed = '  REGRESSION', True
+            lines.append(f"{result['symbols']:>6} {group + '.' + metric:<26} {old_value:>10} -> {new_value:<10} "
+                         f'{change:+.0%}{flag}')
+    return lines, regressed
+
+
+def report(results):
+    lines = [f"{'symbols':>7} {'cold s':>8} {'cold cpu':>9} {'calls':>7} {'fail':>5} {'warm s':>8} "
+             f"{'warm cpu':>9} {'calls':>7} {'/scan p95 ms':>13} {'peak MB':>8}"]
+    for r in results:
+        lines.append(f"{r['symbols']:>7} {r['cold']['wall_s']:>8.2f} {r['cold']['cpu_s']:>9.2f} "
+                     f"{r['cold']['api_calls']:>7} {r['cold']['failures_injected']:>5} {r['warm']['wall_s']:>8.2f} "
+                     f"{r['warm']['cpu_s']:>9.2f} {r['warm']['api_calls']:>7} "
+                     f"{r['scan_endpoint']['p95_ms']:>13.2f} {r['memory']['peak_rss_mb']:>8.1f}")
+    return '\n'.join(lines)
+
+
+def record(tickers, years):
+    from polygon import RESTClient
+    from fake_polygon import record_fixtures
+
+    api_key = os.environ.get('POLYGON_API_KEY')
+    if not api_key:
+        sys.exit('Set POLYGON_API_KEY to record fixtures')
+    end = date.today()
+    record_fixtures(RESTClient(api_key), tickers, end - timedelta(days=int(365 * years)), end, FIXTURES_DIR)
+    print(f'Recorded {len(tickers)} tickers to {FIXTURES_DIR}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline scan benchmark')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)))
+    parser.add_argument('--mode', default='watchlist', choices=('watchlist', 'universe'))
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds per fake API call')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of calls answered with 429')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--retry-base', type=float, default=0.05, help='POLYGON_RETRY_BASE_SECONDS for the run')
+    parser.add_argument('--requests', type=int, default=20, help='rounds of /scan queries')
+    parser.add_argument('--label', default='')
+    parser.add_argument('--no-save', action='store_true')
+    parser.add_argument('--compare', help='saved result file (default: latest in benchmarks/results, '
+                                          'else benchmarks/baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='also write the run to benchmarks/baseline.json')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed growth before flagging')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--record', help='comma-separated tickers to record from the live API')
+    parser.add_argument('--record-years', type=float, default=3)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_size(json.loads(args.child))))
+        return
+    if args.record:
+        record(args.record.upper().split(','), args.record_years)
+        return
+
+    config = {k: getattr(args, k) for k in ('mode', 'latency', 'error_rate', 'rate_limit_rate', 'concurrency',
+                                            'retry_base', 'requests')}
+    results = []
+    for size in (int(s) for s in args.sizes.split(',')):
+        print(f'Running {size} symbols...', file=sys.stderr)
+        results.append(_spawn(dict(config, size=size)))
+    run = {'created': datetime.now().isoformat(timespec='seconds'), 'commit': _git_commit(), 'label': args.label,
+           'config': config, 'results': results}
+    print(report(results))
+
+    previous_path = args.compare
+    if not previous_path:
+        saved = sorted(glob.glob(os.path.join(RESULTS_DIR, '*.json')))
+        previous_path = saved[-1] if saved else BASELINE_PATH if os.path.exists(BASELINE_PATH) else None
+    regressed = False
+    if previous_path:
+        with open(previous_path) as f:
+            previous = json.load(f)
+        if previous.get('config') != config:
+            print(f'\nNote: {previous_path} used a different configuration')
+        lines, regressed = compare(run, previous, args.tolerance)
+        print(f'\nCompared with {os.path.basename(previous_path)} (commit {previous.get("commit")}):')
+        print('\n'.join(lines) or 'no overlapping sizes')
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        name = datetime.now().strftime('%Y%m%d-%H%M%S') + (f'-{args.label}' if args.label else '') + '.json'
+        with open(os.path.join(RESULTS_DIR, name), 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f'\nSaved {os.path.join("benchmarks", "results", name)}')
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f'Saved {os.path.relpath(BASELINE_PATH, ROOT)}')
+    if regressed and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
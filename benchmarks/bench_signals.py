@@ -0,0 +1,74 @@
+"""Per-ticker cost of crossover detection: legacy iloc loop vs signals.compute_signals.
+
+Run from the repository root:
+
+    python benchmarks/bench_signals.py
+"""
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indicators import add_emas  # noqa: E402
+from signals import compute_signals  # noqa: E402
+
+ROW_COUNTS = (30, 250, 5000)
+
+
+def make_frame(rows, seed=0):
+    """Synthetic newest-first frame shaped like fetch_stock_data output."""
+    rng = np.random.default_rng(seed)
+    start = date(2000, 1, 3)
+    df = pd.DataFrame({
+        'Date': [start + timedelta(days=i) for i in range(rows)],
+        'Price': 100 * np.exp(np.cumsum(rng.normal(0, 0.02, rows))),
+        'Volume': rng.integers(200000, 5000000, rows).astype(float),
+    })
+    add_emas(df, (8, 21))
+    return df.sort_values('Date', ascending=False).reset_index(drop=True)
+
+
+def legacy_matches(df):
+    """The row-by-row loop scan_stocks used before vectorization (flags only)."""
+    matched = []
+    for i in range(len(df) - 2):
+        today, yesterday, day_before = df.iloc[i], df.iloc[i + 1], df.iloc[i + 2]
+        crossover = (
+            (today['EMA8'] > today['EMA21'] and yesterday['EMA8'] <= yesterday['EMA21'])
+            or (today['EMA8'] < today['EMA21'] and yesterday['EMA8'] >= yesterday['EMA21'])
+            or (yesterday['EMA8'] > yesterday['EMA21'] and day_before['EMA8'] <= day_before['EMA21'])
+            or (yesterday['EMA8'] < yesterday['EMA21'] and day_before['EMA8'] >= day_before['EMA21'])
+        )
+        matched.append(bool(today['Volume'] > 1000000 and crossover))
+    return matched
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f"{'rows':>6} {'legacy (ms)':>12} {'vectorized (ms)':>16} {'speedup':>8}")
+    for rows in ROW_COUNTS:
+        df = make_frame(rows)
+        vectorized = compute_signals([('BENCH', df)])
+        assert vectorized.column('matched').tolist() == legacy_matches(df), 'signal mismatch'
+
+        repeat = 3 if rows > 1000 else 10
+        legacy = best_of(lambda: legacy_matches(df), repeat)
+        fast = best_of(lambda: compute_signals([('BENCH', df)]), repeat * 10)
+        print(f'{rows:>6} {legacy * 1000:>12.2f} {fast * 1000:>16.3f} {legacy / fast:>7.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Cold-start budget: time to import app and to answer the first requests.
+
+Each run is a fresh interpreter with the scheduler disabled, as on a Cloud
+Run instance scaling from zero. The first GET / and GET /scan are timed,
+and the heavy modules that importing app pulled in are listed. With
+--warm, a snapshot is first scanned into a SQLite snapshot store (using the
+fake Polygon client), so the runs measure a warm start from it.
+
+Medians over the runs are checked against the budgets; the script exits
+with status 1 when one is exceeded.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --warm --runs 10 --import-budget-ms 500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+# Modules that should only load once a scan needs them
+HEAVY_MODULES = ('pandas', 'polygon', 'firebase_admin', 'google.cloud.firestore', 'requests')
+
+
+def child():
+    """One cold start, run in a fresh process; prints a JSON result."""
+    started = time.perf_counter()
+    import app
+    imported = time.perf_counter()
+    heavy = [m for m in HEAVY_MODULES if m in sys.modules]
+    client = app.app.test_client()
+    page = client.get('/')
+    page_done = time.perf_counter()
+    scan = client.get('/scan')
+    scan_done = time.perf_counter()
+    assert page.status_code == 200 and scan.status_code == 200, (page.status_code, scan.status_code)
+    print(json.dumps({
+        'import_ms': (imported - started) * 1000,
+        'first_page_ms': (page_done - imported) * 1000,
+        'first_scan_ms': (scan_done - page_done) * 1000,
+        'scan_results': scan.get_json()['total'],
+        'heavy_modules': heavy,
+    }))
+
+
+def seed_store(env, size):
+    """Scan a synthetic watchlist into the snapshot store named in env."""
+    code = ('import sys; sys.path.insert(0, "benchmarks"); import app; from fake_polygon import FakeRESTClient; '
+            f'fake = FakeRESTClient(); app.use_client(fake, 0); app.WATCHLIST = [f"SYN{{i:05d}}" for i in range({size})]; '
+            'assert app.scheduler.run_once()')
+    subprocess.run([sys.executable, '-c', code], env=env, cwd=ROOT, check=True, capture_output=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold-start time budget')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--warm', action='store_true', help='start from a stored snapshot')
+    parser.add_argument('--symbols', type=int, default=500, help='watchlist size of the stored snapshot')
+    parser.add_argument('--import-budget-ms', type=float, default=400)
+    parser.add_argument('--first-response-budget-ms', type=float, default=100,
+                        help='budget for the first / and the first /scan together')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    workdir = tempfile.mkdtemp(prefix='bench-startup-')
+    env = dict(os.environ, SCAN_SCHEDULER_ENABLED='0', BAR_STORE_DIR=os.path.join(workdir, 'bars'),
+               EMA_STATE_DIR=os.path.join(workdir, 'ema'), TRADING_DAY_VERIFY='0')
+    if args.warm:
+        env['SNAPSHOT_STORE'] = 'sqlite:///' + os.path.join(workdir, 'snapshots.db')
+        seed_store(env, args.symbols)
+
+    runs = []
+    for _ in range(args.runs):
+        wall = time.perf_counter()
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'], env=env, cwd=ROOT,
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            sys.exit(f'Startup run failed:\n{out.stderr[-4000:]}')
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        result['process_ms'] = (time.perf_counter() - wall) * 1000
+        runs.append(result)
+
+    median = {key: statistics.median(r[key] for r in runs)
+              for key in ('import_ms', 'first_page_ms', 'first_scan_ms', 'process_ms')}
+    first_response = median['first_page_ms'] + median['first_scan_ms']
+    print(f"{'start':<6} {'import ms':>10} {'first / ms':>11} {'first /scan ms':>15} {'process ms':>11} {'results':>8}")
+    print(f"{'warm' if args.warm else 'cold':<6} {median['import_ms']:>10.1f} {median['first_page_ms']:>11.1f} "
+          f"{median['first_scan_ms']:>15.1f} {median['process_ms']:>11.1f} {runs[0]['scan_results']:>8}")
+    print(f"heavy modules loaded at import: {', '.join(runs[0]['heavy_modules']) or 'none'}")
+
+    over = []
+    if median['import_ms'] > args.import_budget_ms:
+        over.append(f"import {median['import_ms']:.0f} ms > {args.import_budget_ms:.0f} ms")
+    if first_response > args.first_response_budget_ms:
+        over.append(f'first responses {first_response:.0f} ms > {args.first_response_budget_ms:.0f} ms')
+    if over:
+        print('Over budget: ' + '; '.join(over))
+        sys.exit(1)
+    print(f'Within budget (import {args.import_budget_ms:.0f} ms, first responses '
+          f'{args.first_response_budget_ms:.0f} ms)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""Offline stand-in for polygon.RESTClient used by the benchmarks.
+
+Serves daily aggregates and get_ema values recorded from the live API (see
+record_fixtures) and generates deterministic bars for any other ticker, so
+watchlists of thousands of symbols can be benchmarked without network
+access. Latency, server errors and 429 rate-limit responses are injected
+at configurable rates.
+"""
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+import pytz
+from polygon.exceptions import BadResponse
+from polygon.rest.models import Agg, GroupedDailyAgg
+from polygon.rest.models.indicators import IndicatorValue, SingleIndicatorResults
+
+from indicators import ema
+from trading_calendar import trading_days
+
+EASTERN = pytz.timezone('US/Eastern')
+MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+@lru_cache(maxsize=64)
+def _sessions(start, end):
+    days = trading_days(start, end)
+    # Polygon stamps daily bars at midnight Eastern, in milliseconds
+    stamps = np.array([EASTERN.localize(datetime(d.year, d.month, d.day)).timestamp() * 1000 for d in days],
+                      dtype=np.int64)
+    return days, stamps
+
+
+def _uniform(keys):
+    """Deterministic uniform [0, 1) values from uint64 keys (splitmix64)."""
+    with np.errstate(over='ignore'):
+        z = keys.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def synthetic_series(ticker, days):
+    """Close and volume for ticker on the given dates; the same date always gets the same bar."""
+    seed = zlib.crc32(ticker.encode())
+    params = _uniform(np.arange(6, dtype=np.uint64) + np.uint64(seed) * np.uint64(1000003))
+    ordinals = np.array([d.toordinal() for d in days], dtype=np.int64)
+    slow_period, fast_period = 40 + 80 * params[0], 10 + 20 * params[1]
+    keys = np.uint64(seed) << np.uint64(32) | ordinals.astype(np.uint64)
+    noise = _uniform(keys) - 0.5
+    close = (10 + 490 * params[2]) * np.exp(
+        0.15 * np.sin(2 * np.pi * ordinals / slow_period + 6.3 * params[3])
+        + 0.05 * np.sin(2 * np.pi * ordinals / fast_period + 6.3 * params[4])
+        + 0.02 * noise
+    )
+    volume = np.floor(2e5 + 8e6 * params[5] * _uniform(keys ^ MASK64))
+    return close, volume
+
+
+class FakeRESTClient:
+    """Duck-typed polygon.RESTClient for get_aggs, get_ema and get_grouped_daily_aggs.
+
+    fixtures_dir holds recorded aggregates as aggs/<TICKER>.json and
+    Polygon's EMA values as ema/<TICKER>.json ({window: values}), which
+    get_ema replays; other tickers and windows are generated, their EMAs
+    computed locally. Each call sleeps latency (+/- jitter) seconds,
+    then fails with a 500-style BadResponse at error_rate or a 429 at
+    rate_limit_rate; 429s carry retry_after seconds when it is set, like a
+    Retry-After header. universe lists the tickers returned by grouped daily
+    calls. Calls and injected failures are counted per method.
+    """
+
+    def __init__(self, fixtures_dir=None, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=None, universe=(), seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.universe = list(universe)
+        self.calls = Counter()
+        self.failures = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recorded = _load_fixtures(fixtures_dir, 'aggs')
+        self._recorded_ema = _load_fixtures(fixtures_dir, 'ema')
+
+    @property
+    def recorded_tickers(self):
+        return sorted(self._recorded)
+
+    def _call(self, method):
+        with self._lock:
+            self.calls[method] += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            roll = self._random.random()
+        if delay:
+            time.sleep(delay)
+        if roll < self.rate_limit_rate:
+            with self._lock:
+                self.failures['429'] += 1
+            error = BadResponse('{"status":"ERROR","error":"You\'ve exceeded the maximum requests per minute."}')
+            if self.retry_after is not None:
+                error.retry_after = self.retry_after
+            raise error
+        if roll < self.rate_limit_rate + self.error_rate:
+            with self._lock:
+                self.failures['error'] += 1
+            raise BadResponse('{"status":"ERROR","error":"Internal server error"}')
+
+    def _bars(self, ticker, start, end):
+        """(timestamps, open, high, low, close, volume) arrays for ticker between start and end."""
+        if ticker in self._recorded:
+            rows = [r for r in self._recorded[ticker]
+                    if start <= _as_date(datetime.fromtimestamp(r['timestamp'] / 1000, EASTERN)) <= end]
+            columns = {k: np.array([r[k] for r in rows], dtype=float)
+                       for k in ('timestamp', 'open', 'high', 'low', 'close', 'volume')}
+            return (columns['timestamp'].astype(np.int64), columns['open'], columns['high'], columns['low'],
+                    columns['close'], columns['volume'])
+        days, stamps = _sessions(start, end)
+        close, volume = synthetic_series(ticker, days)
+        return stamps, close, close * 1.01, close * 0.99, close, volume
+
+    def get_aggs(self, ticker, multiplier, timespan, from_, to, adjusted=None, sort=None, limit=None, **kwargs):
+        self._call('get_aggs')
+        stamps, opens, highs, lows, closes, volumes = self._bars(ticker, _as_date(from_), _as_date(to))
+        return [Agg(open=o, high=h, low=l, close=c, volume=v, timestamp=t)
+                for t, o, h, l, c, v in zip(stamps.tolist(), opens.tolist(), highs.tolist(), lows.tolist(),
+                                            closes.tolist(), volumes.tolist())]
+
+    def get_ema(self, ticker, timestamp=None, timespan='day', adjusted=None, window=None, series_type=None,
+                order='desc', limit=10, **kwargs):
+        self._call('get_ema')
+        timestamp = timestamp or kwargs.get('timestamp_lte')
+        end = _as_date(timestamp) if timestamp else date.today()
+        recorded = self._recorded_ema.get(ticker, {}).get(str(window))
+        if recorded is not None:
+            recorded = sorted(recorded, key=lambda v: v['timestamp'])
+            values = [IndicatorValue(timestamp=v['timestamp'], value=v['value']) for v in recorded
+                      if _as_date(datetime.fromtimestamp(v['timestamp'] / 1000, EASTERN)) <= end]
+            if order == 'desc':
+                values.reverse()
+            return SingleIndicatorResults(values=values[:limit])
+        # Enough history for the EMA to converge, like the server-side indicator
+        stamps, _, _, _, closes, _ = self._bars(ticker, end - timedelta(days=20 * window + 30), end)
+        values = [IndicatorValue(timestamp=t, value=v) for t, v in zip(stamps.tolist(), ema(closes, window).tolist())]
+        if order == 'desc':
+            values.reverse()
+        return SingleIndicatorResults(values=values[:limit])
+
+    def get_grouped_daily_aggs(self, date, adjusted=None, **kwargs):
+        self._call('get_grouped_daily_aggs')
+        day = _as_date(date)
+        _, stamps = _sessions(day, day)
+        if not stamps.size:
+            return []
+        out = []
+        for ticker in self.universe:
+            _, opens, highs, lows, closes, volumes = self._bars(ticker, day, day)
+            if closes.size:
+                out.append(GroupedDailyAgg(ticker=ticker, open=opens[0], high=highs[0], low=lows[0],
+                                           close=closes[0], volume=volumes[0], timestamp=int(stamps[0])))
+        return out
+
+
+def _load_fixtures(fixtures_dir, kind):
+    """{ticker: contents} of the <kind>/<TICKER>.json files under fixtures_dir."""
+    path = os.path.join(fixtures_dir, kind) if fixtures_dir else None
+    fixtures = {}
+    if path and os.path.isdir(path):
+        for name in os.listdir(path):
+            if name.endswith('.json'):
+                with open(os.path.join(path, name)) as f:
+                    fixtures[name[:-5]] = json.load(f)
+    return fixtures
+
+
+def record_fixtures(client, tickers, from_, to, fixtures_dir, ema_windows=(8, 21)):
+    """Save live daily aggregates and get_ema values for tickers so FakeRESTClient can replay them."""
+    for kind in ('aggs', 'ema'):
+        os.makedirs(os.path.join(fixtures_dir, kind), exist_ok=True)
+    for ticker in tickers:
+        aggs = client.get_aggs(ticker, 1, 'day', from_.strftime('%Y-%m-%d'), to.strftime('%Y-%m-%d'),
+                               adjusted=True, limit=50000)
+        rows = [{'timestamp': a.timestamp, 'open': a.open, 'high': a.high, 'low': a.low,
+                 'close': a.close, 'volume': a.volume} for a in aggs]
+        with open(os.path.join(fixtures_dir, 'aggs', f'{ticker}.json'), 'w') as f:
+            json.dump(rows, f)
+        emas = {}
+        for window in ema_windows:
+            result = client.get_ema(ticker=ticker, timespan='day', adjusted=True, window=window, series_type='close',
+                                    order='desc', limit=5000, timestamp_gte=from_.strftime('%Y-%m-%d'),
+                                    timestamp_lte=to.strftime('%Y-%m-%d'))
+            emas[str(window)] = [{'timestamp': v.timestamp, 'value': v.value} for v in result.values]
+        with open(os.path.join(fixtures_dir, 'ema', f'{ticker}.json'), 'w') as f:
+            json.dump(emas, f)
@@ -0,0 +1,107 @@
+"""Offline stand-in for Polygon's stocks websocket used by the intraday benchmark.
+
+Speaks the protocol of socket.polygon.io: a 'connected' status on connect,
+'auth_success' after the auth action, then AM minute aggregates for the
+symbols of the subscribe action ('AM.*' means all of symbols). Minutes are
+replayed back to back, minute_interval seconds apart, with their session
+timestamps; each symbol's closes follow a deterministic random walk.
+"""
+import asyncio
+import json
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+import pytz
+
+EASTERN = pytz.timezone('US/Eastern')
+MINUTE_MS = 60 * 1000
+
+
+class FakePolygonWebSocket:
+    """Serve minutes minute aggregates per subscribed symbol to each client, on a background thread."""
+
+    def __init__(self, symbols, minutes=390, minute_interval=0.01, batch_size=500, session=None, seed=0):
+        self.symbols = list(symbols)
+        self.minutes = minutes
+        self.minute_interval = minute_interval
+        self.batch_size = batch_size
+        session = session or datetime(2024, 5, 1)
+        self.open_ms = int(EASTERN.localize(session.replace(hour=9, minute=30)).timestamp() * 1000)
+        self.seed = seed
+        self.sent = {}  # (minute start, batch) -> perf_counter when that batch was sent
+        self.done = threading.Event()
+        self.port = None
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    def batch_of(self, symbol, subscribed=None):
+        return (subscribed or self.symbols).index(symbol) // self.batch_size
+
+    def bars(self, symbols):
+        """Yield (minute start ms, opens, highs, lows, closes, volumes) arrays aligned with symbols."""
+        keys = np.array([zlib.crc32(s.encode()) for s in symbols], dtype=np.uint64)
+        rng = np.random.default_rng([self.seed, len(symbols)])
+        close = 20 + (keys % 480).astype(float)
+        for minute in range(self.minutes):
+            opens = close
+            close = opens * np.exp(rng.normal(0, 0.002, len(symbols)))
+            spread = np.abs(rng.normal(0, 0.001, len(symbols))) * opens
+            volumes = rng.integers(1000, 200000, len(symbols))
+            yield (self.open_ms + minute * MINUTE_MS, opens, np.maximum(opens, close) + spread,
+                   np.minimum(opens, close) - spread, close, volumes)
+
+    async def _handle(self, ws, path=None):
+        await ws.send(json.dumps([{'ev': 'status', 'status': 'connected', 'message': 'Connected Successfully'}]))
+        json.loads(await ws.recv())
+        await ws.send(json.dumps([{'ev': 'status', 'status': 'auth_success', 'message': 'authenticated'}]))
+        topics = json.loads(await ws.recv())['params'].split(',')
+        if 'AM.*' in topics:
+            symbols = self.symbols
+        else:
+            wanted = {topic[3:] for topic in topics if topic.startswith('AM.')}
+            symbols = [s for s in self.symbols if s in wanted]
+        await ws.send(json.dumps([{'ev': 'status', 'status': 'success', 'message': f'subscribed to: {t}'}
+                                  for t in topics]))
+        for start, opens, highs, lows, closes, volumes in self.bars(symbols):
+            messages = [{'ev': 'AM', 'sym': s, 'v': int(v), 'o': round(o, 4), 'h': round(h, 4), 'l': round(l, 4),
+                         'c': round(c, 4), 's': start, 'e': start + MINUTE_MS}
+                        for s, o, h, l, c, v in zip(symbols, opens.tolist(), highs.tolist(), lows.tolist(),
+                                                    closes.tolist(), volumes.tolist())]
+            for batch, first in enumerate(range(0, len(messages), self.batch_size)):
+                self.sent[(start, batch)] = time.perf_counter()
+                await ws.send(json.dumps(messages[first:first + self.batch_size]))
+            await asyncio.sleep(self.minute_interval)
+        self.done.set()
+        await ws.close()
+
+    def start(self):
+        """Start serving on a free local port; returns the ws:// URL."""
+        import websockets
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(websockets.serve(self._handle, '127.0.0.1', 0))
+            self.port = self._server.sockets[0].getsockname()[1]
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='fake-polygon-ws', daemon=True)
+        self._thread.start()
+        started.wait()
+        return f'ws://127.0.0.1:{self.port}'
+
+    async def _shutdown(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def stop(self):
+        if self._loop:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5)
@@ -0,0 +1,151 @@
+"""Row-level changes between published snapshots, for /scan/changes.
+
+Rows are identified by (symbol, date). Each time a new snapshot becomes
+current, the changelog diffs it against the previous one and keeps only
+the keys that were added, changed or removed, with the flags the changed
+and removed rows had before. That is enough to answer "what changed since
+version N" for the last max_versions snapshots without keeping their
+tables: the first time a key shows up after N tells whether (and with
+which flags) it existed at N, and the current table supplies the rest.
+"""
+import threading
+from collections import deque
+
+import numpy as np
+
+import metrics
+from metrics import SCAN_STAGE_SECONDS
+from result_table import FLAG_BITS, round_cents
+
+SCAN_CHANGES = metrics.counter('scan_changes_total', '/scan/changes responses by outcome', ('outcome',))
+
+# Keys pack a symbol code above a day number (days since 1970 fit easily in 32 bits)
+DAY_BITS = 32
+
+
+class Delta:
+    """Keys touched going from one version to the next, with the prior flags of changed/removed rows."""
+
+    __slots__ = ('from_version', 'to_version', 'added', 'touched', 'touched_flags')
+
+    def __init__(self, from_version, to_version, added, touched, touched_flags):
+        self.from_version = from_version
+        self.to_version = to_version
+        self.added = added
+        self.touched = touched
+        self.touched_flags = touched_flags
+
+
+class Changelog:
+    """Bounded history of per-version deltas; see the module docstring."""
+
+    def __init__(self, max_versions=50):
+        self.max_versions = max_versions
+        self._deltas = deque(maxlen=max_versions)
+        self._codes = {}
+        self._symbols = []
+        self._last = None  # (version, results, sorted keys, order, content)
+        self._lock = threading.Lock()
+
+    def _keys(self, table):
+        codes = np.array([self._codes.setdefault(s, len(self._codes)) for s in table.symbols.tolist()],
+                         dtype=np.int64)
+        self._symbols.extend(list(self._codes)[len(self._symbols):])
+        bars = table.row_bar
+        if not len(bars):
+            return np.empty(0, dtype=np.int64)
+        return (codes[table.bar_symbol[bars]] << DAY_BITS) | table.date[bars].astype(np.int64)
+
+    @staticmethod
+    def _content(table):
+        """Per-row values a client would see change: the row's three bars and its flags for every pair,
+        in every timeframe. Prices and EMAs are compared in cents and volumes in shares, as records()
+        serves them, so float noise (e.g. a universe scan's EMA seed moving forward a session) is not
+        reported as a change."""
+        bars = table.row_bar.astype(np.int64)
+        columns = []
+        for offset in (0, 1, 2):
+            at = bars + offset
+            columns += [round_cents(table.price[at]), np.nan_to_num(table.volume[at]).astype(np.int64)]
+            columns += [round_cents(emas[at]) for emas in table.emas]
+        columns += [flags.astype(float) for flags in table.row_flags]
+        for tf_emas, tf_flags in zip(table.tf_emas, table.tf_flags):
+            columns += [round_cents(emas[bars]) for emas in tf_emas] + [flags.astype(float) for flags in tf_flags]
+        return np.column_stack(columns) if len(bars) else np.empty((0, len(columns)))
+
+    def observe(self, snapshot):
+        """Record the delta from the previously observed snapshot to snapshot, if it is newer."""
+        with self._lock, SCAN_STAGE_SECONDS.time(stage='diff'):
+            if self._last is not None and snapshot.version <= self._last[0]:
+                return
+            table = snapshot.results
+            keys = self._keys(table)
+            order = np.argsort(keys, kind='stable')
+            content = self._content(table)
+            last = self._last
+            self._last = (snapshot.version, table, keys[order], order, content)
+            if last is None:
+                return
+            version, old, old_sorted, old_order, old_content = last
+            if old.pairs != table.pairs or old.windows != table.windows or old.timeframes != table.timeframes:
+                # Flags and EMAs are not comparable across configurations
+                self._deltas.clear()
+                return
+            old_keys = old_sorted[np.argsort(old_order)]
+            common, old_rows, new_rows = np.intersect1d(old_keys, keys, assume_unique=True, return_indices=True)
+            a, b = old_content[old_rows], content[new_rows]
+            same = ((a == b) | (np.isnan(a) & np.isnan(b))).all(axis=1)
+            removed_rows = np.flatnonzero(~np.isin(old_keys, keys))
+            touched_rows = np.concatenate([old_rows[~same], removed_rows])
+            self._deltas.append(Delta(
+                version, snapshot.version,
+                added=np.setdiff1d(keys, old_keys, assume_unique=True),
+                touched=old_keys[touched_rows],
+                touched_flags=old.row_flags[:, touched_rows],
+            ))
+
+    def changes(self, since, snapshot, pair=0):
+        """Rows of snapshot added or changed since version `since`, removed keys and newly matched rows.
+
+        Returns None when `since` is not covered by the changelog, meaning
+        the client must resync from /scan.
+        """
+        self.observe(snapshot)
+        with self._lock:
+            version, table, sorted_keys, order, _ = self._last
+            if since == version:
+                empty = np.empty(0, dtype=np.int64)
+                return {'added': empty, 'changed': empty, 'removed': [], 'newly_matched': empty}
+            starts = [i for i, delta in enumerate(self._deltas) if delta.from_version == since]
+            if version != snapshot.version or not starts:
+                return None
+            chain = list(self._deltas)[starts[0]:]
+            pairs = len(table.pairs)
+            keys = np.concatenate([np.concatenate([d.added, d.touched]) for d in chain])
+            existed = np.concatenate([np.r_[np.zeros(len(d.added), bool), np.ones(len(d.touched), bool)]
+                                      for d in chain])
+            flags = np.concatenate([np.concatenate([np.zeros((pairs, len(d.added)), np.uint8), d.touched_flags],
+                                                   axis=1) for d in chain], axis=1)
+            symbols = list(self._symbols)
+
+        # The first event after `since` tells whether a key existed then, and with which flags
+        keys, first = np.unique(keys, return_index=True)
+        existed, old_flags = existed[first], flags[pair, first]
+        position = np.searchsorted(sorted_keys, keys)
+        present = position < len(sorted_keys)
+        present[present] = sorted_keys[position[present]] == keys[present]
+        rows = np.where(present, order[np.minimum(position, len(order) - 1)], -1)
+
+        matched_bit = FLAG_BITS['matched']
+        now_matched = np.zeros(len(keys), bool)
+        now_matched[present] = (table.row_flags[pair, rows[present]] & matched_bit) != 0
+        was_matched = existed & ((old_flags & matched_bit) != 0)
+        removed = keys[existed & ~present]
+        return {
+            'added': np.sort(rows[~existed & present]),
+            'changed': np.sort(rows[existed & present]),
+            'removed': [{'symbol': symbols[key >> DAY_BITS],
+                         'date': str(np.datetime64(int(key & ((1 << DAY_BITS) - 1)), 'D'))}
+                        for key in removed.tolist()],
+            'newly_matched': np.sort(rows[present & now_matched & ~was_matched]),
+        }
@@ -0,0 +1,157 @@
+import copy
+import json
+import logging
+import os
+import threading
+import uuid
+
+import numpy as np
+
+from indicators import ema
+
+logger = logging.getLogger(__name__)
+
+# Relative close difference at the state's last bar that means history was restated
+RESTATEMENT_TOLERANCE = 1e-6
+
+
+def _alpha(window):
+    return 2.0 / (window + 1)
+
+
+class EmaStateStore:
+    """Per-ticker EMA state carried across scans so each new bar costs O(1).
+
+    A state holds the EMA values of the last `keep` bars for every window,
+    the date and close of the last bar it has seen, and the last crossover
+    of each (fast, slow) pair. New bars extend it with the EMA recurrence;
+    anything that breaks continuity (unknown or evicted last bar, restated
+    close, different windows or pairs, shorter tail) triggers a full recompute.
+    States are kept in memory and written as JSON under root when given.
+    """
+
+    def __init__(self, root=None, keep=32):
+        self.root = root
+        self.keep = keep
+        self._states = {}
+        self._lock = threading.Lock()
+        if root:
+            os.makedirs(root, exist_ok=True)
+
+    def _path(self, ticker):
+        return os.path.join(self.root, ticker.replace('/', '_').replace('.', '_') + '.json')
+
+    def get(self, ticker):
+        with self._lock:
+            if ticker in self._states:
+                return self._states[ticker]
+        if not self.root:
+            return None
+        try:
+            with open(self._path(ticker)) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._states[ticker] = state
+        return state
+
+    def _put(self, ticker, state):
+        with self._lock:
+            self._states[ticker] = state
+        if self.root:
+            tmp = os.path.join(self.root, f'.{uuid.uuid4().hex}.tmp')
+            with open(tmp, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp, self._path(ticker))
+
+    def update(self, ticker, dates, closes, windows, tail, pairs=(), provisional=None):
+        """EMA values for the last `tail` bars of an oldest-first series.
+
+        dates are datetime64[D] and closes floats, covering at least the
+        warm-up history. Bars dated `provisional` or later belong to a
+        session still trading: they are applied on top of the stored state
+        but never saved into it, so their close moving by the next scan is
+        not taken for a restatement. Returns ({window: array}, recomputed)
+        where each array aligns with dates[-tail:].
+        """
+        windows = [int(w) for w in windows]
+        pairs = [[int(fast), int(slow)] for fast, slow in pairs]
+        tail = min(int(tail), len(dates))
+        final = len(dates) if provisional is None else int(np.searchsorted(dates, np.datetime64(provisional, 'D')))
+        # Extra headroom so small changes in the requested tail do not force a recompute
+        keep = min(max(tail, self.keep, 2), len(dates))
+        state = self.get(ticker)
+        new_bars = self._new_bars(state, dates[:final], closes[:final], windows, pairs, min(tail, final))
+
+        if new_bars is None:
+            state = self._recompute(dates[:final], closes[:final], windows, keep, pairs) if final else None
+            recomputed = True
+        else:
+            for i in new_bars:
+                self._advance(state, str(dates[i]), float(closes[i]), windows, keep, pairs)
+            recomputed = False
+
+        if state is not None and (recomputed or len(new_bars)):
+            self._put(ticker, state)
+        if final < len(dates):
+            if state is None:
+                state = self._recompute(dates, closes, windows, keep, pairs)
+            else:
+                state = copy.deepcopy(state)
+                for i in range(final, len(dates)):
+                    self._advance(state, str(dates[i]), float(closes[i]), windows, keep, pairs)
+        values = {w: np.asarray(state['ema'][str(w)][len(state['dates']) - tail:], dtype=float) for w in windows}
+        return values, recomputed
+
+    def _new_bars(self, state, dates, closes, windows, pairs, tail):
+        """Indices of bars after the state's last bar, or None when a full recompute is needed."""
+        if not state or state['windows'] != windows or state.get('pairs') != pairs or len(state['dates']) < tail:
+            return None
+        last = np.datetime64(state['last_date'], 'D')
+        position = np.searchsorted(dates, last)
+        if position >= len(dates) or dates[position] != last:
+            return None  # gap: the last bar we saw is no longer in the history
+        if abs(closes[position] - state['last_close']) > RESTATEMENT_TOLERANCE * abs(state['last_close']):
+            return None  # restatement: adjusted history changed under us
+        return range(position + 1, len(dates))
+
+    def _recompute(self, dates, closes, windows, keep, pairs):
+        series = {w: ema(closes, w) for w in windows}
+        state = {
+            'windows': windows,
+            'pairs': pairs,
+            'last_date': str(dates[-1]),
+            'last_close': float(closes[-1]),
+            'dates': [str(d) for d in dates[-keep:]],
+            'ema': {str(w): values[-keep:].tolist() for w, values in series.items()},
+            'last_cross': {},
+        }
+        for fast, slow in pairs:
+            diff = series[fast] - series[slow]
+            up = (diff[1:] > 0) & (diff[:-1] <= 0)
+            down = (diff[1:] < 0) & (diff[:-1] >= 0)
+            crosses = np.flatnonzero(up | down)
+            if crosses.size:
+                i = crosses[-1] + 1
+                state['last_cross'][f'{fast}/{slow}'] = {'date': str(dates[i]),
+                                                         'direction': 'up' if diff[i] > 0 else 'down'}
+        return state
+
+    def _advance(self, state, date, close, windows, keep, pairs):
+        for w in windows:
+            values = state['ema'][str(w)]
+            previous = values[-1]
+            values.append(previous + _alpha(w) * (close - previous))
+            del values[:-keep]
+        state['dates'].append(date)
+        del state['dates'][:-keep]
+        state['last_date'] = date
+        state['last_close'] = close
+        for fast, slow in pairs:
+            fast_values, slow_values = state['ema'][str(fast)], state['ema'][str(slow)]
+            before, after = fast_values[-2] - slow_values[-2], fast_values[-1] - slow_values[-1]
+            if after > 0 >= before:
+                state['last_cross'][f'{fast}/{slow}'] = {'date': date, 'direction': 'up'}
+            elif after < 0 <= before:
+                state['last_cross'][f'{fast}/{slow}'] = {'date': date, 'direction': 'down'}
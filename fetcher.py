@@ -0,0 +1,332 @@
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+POLYGON_REQUESTS = metrics.counter('polygon_requests_total', 'Polygon API calls by endpoint and outcome',
+                                   ('endpoint', 'status'))
+POLYGON_REQUEST_SECONDS = metrics.histogram('polygon_request_seconds', 'Polygon API call latency', ('endpoint',))
+RATE_LIMIT_WAIT_SECONDS = metrics.histogram('polygon_rate_limit_wait_seconds',
+                                            'Time spent waiting for a rate limiter token')
+POLYGON_RETRIES = metrics.counter('polygon_retries_total', 'Polygon API calls retried, by endpoint and failure',
+                                  ('endpoint', 'status'))
+CIRCUIT_STATE = metrics.gauge('polygon_circuit_state', 'Polygon circuit breaker state (0 closed, 1 half-open, 2 open)')
+CIRCUIT_OPENED = metrics.counter('polygon_circuit_opened_total', 'Times the Polygon circuit breaker opened')
+
+# Failures worth another attempt; auth and other 4xx errors will not fix themselves
+RETRYABLE = ('429', 'error')
+
+# HTTP codes behind the status field of Polygon's JSON error bodies
+POLYGON_ERROR_STATUSES = {'NOT_FOUND': 404, 'NOT_AUTHORIZED': 403, 'BAD_REQUEST': 400}
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at a fixed requests-per-minute rate.
+
+    A rate of 0 disables limiting. burst caps how many requests may go out
+    back to back after an idle period (defaults to one minute's worth).
+    """
+
+    def __init__(self, requests_per_minute, burst=None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst or max(1, requests_per_minute))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Polygon while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Stop calling Polygon after consecutive server failures, then probe again.
+
+    After failure_threshold failures in a row the circuit opens and calls
+    fail immediately. Once reset_timeout seconds have passed a single probe
+    call is let through (half-open) while other callers wait for its
+    outcome: success closes the circuit, failure opens it for another
+    reset_timeout. Rate limiting, auth and other 4xx errors show the server
+    is reachable, so they count as successes here.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Condition()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def retry_in(self):
+        """Seconds until the next probe is allowed (0 unless open)."""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self):
+        """Whether a call may go out now; in half-open only one probe is in flight at a time."""
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            while self._probing:
+                self._lock.wait()
+            state = self._state()
+            if state == 'half_open':
+                self._probing = True
+                self._publish('half_open')
+            return state != 'open'
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info('Polygon circuit closed')
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+            self._publish('closed')
+            self._lock.notify_all()
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and 0 < self.failure_threshold <= self._failures):
+                if self._opened_at is None:
+                    CIRCUIT_OPENED.inc()
+                logger.warning(f'Polygon circuit open after {self._failures} consecutive failures, '
+                               f'probing again in {self.reset_timeout}s')
+                self._opened_at = time.monotonic()
+                self._probing = False
+                self._publish('open')
+                self._lock.notify_all()
+
+    def _publish(self, state):
+        CIRCUIT_STATE.set({'closed': 0, 'half_open': 1, 'open': 2}[state])
+
+
+class RetryPolicy:
+    """How often and how long to wait before retrying one failed Polygon call.
+
+    Delays use exponential backoff with full jitter (uniform between 0 and
+    base * 2**attempt, capped at cap) so concurrent workers do not retry in
+    lockstep. A Retry-After value on a 429 takes precedence.
+    """
+
+    def __init__(self, attempts=3, base=1.0, cap=30.0, rng=None):
+        self.attempts = max(1, attempts)
+        self.base = base
+        self.cap = cap
+        self._random = rng or random.Random()
+
+    def delay(self, attempt, error=None, floor=0.0):
+        """Seconds to wait after failed attempt number attempt (0-based)."""
+        wait = retry_after(error) if error is not None else None
+        if wait is not None:
+            return min(wait, self.cap) + self._random.uniform(0, self.base)
+        return max(floor, self._random.uniform(0, min(self.cap, self.base * 2 ** attempt)))
+
+
+class LazyClient:
+    """Proxy that builds its client with factory() on first attribute access."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return getattr(self._client, name)
+
+
+class RateLimitedClient:
+    """Proxy for a Polygon RESTClient that takes a limiter token before every API call.
+
+    With a retry policy, a call that fails with a 429 or server error is
+    retried on its own in the calling thread, so other fetches keep going.
+    With a circuit breaker, calls fail fast with CircuitOpenError while
+    Polygon is down.
+    """
+
+    def __init__(self, client, limiter, retry=None, breaker=None):
+        self._client = client
+        self._limiter = limiter
+        self._retry = retry
+        self._breaker = breaker
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or not name.startswith(('get_', 'list_')):
+            return attr
+
+        def call(*args, **kwargs):
+            attempts = self._retry.attempts if self._retry else 1
+            for attempt in range(attempts):
+                if self._breaker and not self._breaker.allow():
+                    POLYGON_REQUESTS.inc(endpoint=name, status='circuit_open')
+                    raise CircuitOpenError(f'Polygon circuit open, retrying in {self._breaker.retry_in():.0f}s')
+                try:
+                    result = self._call_once(name, attr, args, kwargs)
+                except Exception as e:
+                    status = error_status(e)
+                    if self._breaker:
+                        if status == 'error':
+                            self._breaker.record_failure()
+                        else:
+                            self._breaker.record_success()
+                    if status not in RETRYABLE or attempt == attempts - 1:
+                        raise
+                    # Without a Retry-After, wait at least for the limiter's next token on a 429
+                    floor = 1 / self._limiter.rate if status == '429' and self._limiter.rate > 0 else 0.0
+                    wait = self._retry.delay(attempt, e, floor)
+                    logger.info(f'Retrying {name} {args[:1]} in {wait:.1f}s after {status}: {str(e)[:200]}')
+                    POLYGON_RETRIES.inc(endpoint=name, status=status)
+                    with metrics.SCAN_STAGE_SECONDS.time(stage='retry_backoff'):
+                        time.sleep(wait)
+                    continue
+                if self._breaker:
+                    self._breaker.record_success()
+                return result
+        return call
+
+    def _call_once(self, name, attr, args, kwargs):
+        start = time.perf_counter()
+        self._limiter.acquire()
+        acquired = time.perf_counter()
+        RATE_LIMIT_WAIT_SECONDS.observe(acquired - start)
+        status = 'ok'
+        try:
+            return attr(*args, **kwargs)
+        except Exception as e:
+            status = error_status(e)
+            raise
+        finally:
+            POLYGON_REQUEST_SECONDS.observe(time.perf_counter() - acquired, endpoint=name)
+            POLYGON_REQUESTS.inc(endpoint=name, status=status)
+
+
+def retry_after(error):
+    """Seconds from a Retry-After value carried by error, or None.
+
+    polygon.RESTClient's BadResponse only carries the response body, so this
+    looks for a retry_after attribute or a response with headers, as raised
+    by other HTTP clients and by the benchmark fake.
+    """
+    value = getattr(error, 'retry_after', None)
+    if value is None:
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or getattr(error, 'headers', None)
+        value = headers.get('Retry-After') if headers else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(str(value)) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def http_status(error):
+    """HTTP status of a failed call, or None when it cannot be told.
+
+    polygon.RESTClient's BadResponse carries only the response body, so
+    Polygon's own status in a JSON body is mapped back to its HTTP code;
+    other HTTP clients and the benchmark fake carry the code itself.
+    """
+    response = getattr(error, 'response', None)
+    for value in (getattr(error, 'status', None), getattr(error, 'status_code', None),
+                  getattr(response, 'status', None), getattr(response, 'status_code', None)):
+        if isinstance(value, int):
+            return value
+    try:
+        body = json.loads(str(error))
+    except ValueError:
+        return None
+    return POLYGON_ERROR_STATUSES.get(body.get('status')) if isinstance(body, dict) else None
+
+
+def error_status(error):
+    """Classify a failed Polygon call: '429', 'auth', 'client_error', 'circuit_open' or 'error'.
+
+    The client raises BadResponse with the response body only, so rate
+    limiting is recognised from Polygon's error message. 'client_error'
+    is any other 4xx, such as a 404 for an unknown or delisted ticker.
+    """
+    if type(error).__name__ == 'AuthError':
+        return 'auth'
+    if isinstance(error, CircuitOpenError):
+        return 'circuit_open'
+    message = str(error).lower()
+    if '429' in message or 'exceeded the maximum requests' in message or 'too many requests' in message:
+        return '429'
+    status = http_status(error)
+    if status == 429:
+        return '429'
+    if status is not None and 400 <= status < 500:
+        return 'client_error'
+    return 'error'
+
+
+def fetch_concurrently(tickers, fetch_fn, max_workers=8):
+    """Run fetch_fn(ticker) on a thread pool, yielding (ticker, result) as each completes."""
+    if not tickers:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers))),
+                            thread_name_prefix='polygon-fetch') as pool:
+        futures = {pool.submit(fetch_fn, ticker): ticker for ticker in tickers}
+        try:
+            for future in as_completed(futures):
+                ticker = futures[future]
+                try:
+                    yield ticker, future.result()
+                except Exception as e:
+                    logger.error(f'Fetch failed for {ticker}: {str(e)}')
+                    yield ticker, None
+        finally:
+            # A caller that stops early (e.g. an aborted scan) does not wait for the queued fetches
+            for future in futures:
+                future.cancel()
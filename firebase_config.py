@@ -1,8 +1,24 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
+import os
+import threading
+
+_db = None
+_lock = threading.Lock()
+
 
 def initialize_firebase():
-    """Initialize Firebase Admin SDK and return Firestore client."""
+    """Initialize Firebase Admin SDK and return Firestore client.
+
+    With FIRESTORE_EMULATOR_HOST set, the client talks to the local
+    emulator instead and needs no credentials.
+    """
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    project_id = os.environ.get('GOOGLE_CLOUD_PROJECT', 'YOUR_PROJECT_ID')  # Replace with your GCP project ID
+    if os.environ.get('FIRESTORE_EMULATOR_HOST'):
+        from google.cloud import firestore as cloud_firestore
+        return cloud_firestore.Client(project=project_id)
+
     try:
         # Check if already initialized
         app = firebase_admin.get_app()
@@ -10,11 +26,24 @@ def initialize_firebase():
         # Initialize with service account
         cred = credentials.ApplicationDefault()
         firebase_admin.initialize_app(cred, {
-            'projectId': 'YOUR_PROJECT_ID',  # Replace with your GCP project ID
+            'projectId': project_id,
         })
-    
+
     # Return Firestore client
     return firestore.client()
 
-# Initialize Firestore client
-db = initialize_firebase()
\ No newline at end of file
+
+def get_db():
+    """Firestore client, initialized on first use rather than at import."""
+    global _db
+    with _lock:
+        if _db is None:
+            _db = initialize_firebase()
+        return _db
+
+
+def __getattr__(name):
+    # Keeps `from firebase_config import db` working without initializing at import
+    if name == 'db':
+        return get_db()
+    raise AttributeError(name)
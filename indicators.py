@@ -0,0 +1,34 @@
+import numpy as np
+
+# Bars of history consumed per window before EMA values are reported.
+# The seed's weight decays as (1 - 2/(n+1))**bars, so after 10 windows it
+# is below 1e-4 and the EMA no longer depends on where the history starts.
+WARMUP_FACTOR = 10
+
+
+def warmup_bars(window):
+    """Number of leading bars needed for an EMA of this window to converge."""
+    return WARMUP_FACTOR * window
+
+
+def warmup_calendar_days(window):
+    """Calendar days of history that cover warmup_bars(window) trading sessions."""
+    # ~252 sessions per 365 days, plus a small pad for holidays
+    return int(warmup_bars(window) * 365 / 252) + 10
+
+
+def ema(values, window):
+    """Exponential moving average of an oldest-first series (alpha = 2 / (window + 1))."""
+    import pandas as pd
+    values = np.asarray(values, dtype=float)
+    if values.size == 0:
+        return values
+    return pd.Series(values).ewm(span=window, adjust=False).mean().to_numpy()
+
+
+def add_emas(df, windows, column='Price'):
+    """Add an EMA<window> column per window to an oldest-first DataFrame."""
+    closes = df[column].to_numpy(dtype=float)
+    for window in windows:
+        df[f'EMA{window}'] = ema(closes, window)
+    return df
@@ -0,0 +1,420 @@
+"""Intraday crossovers from Polygon's streaming minute aggregates.
+
+IntradayEngine rolls each symbol's minute bars (the AM websocket feed) into
+the configured timeframes. When a bar closes, that timeframe's EMAs advance
+by one step of the recurrence and the crossover rule of the daily scan is
+evaluated on the last three bars. Per symbol and timeframe only the bar
+being built, the last closed bar, the EMA values and three EMA differences
+per pair are kept, so memory is fixed per symbol however long the stream
+runs. With a history_fn, each symbol's EMAs are warmed up from Polygon's
+own aggregates of the bars before it was first streamed, fetched in the
+background; bars that close meanwhile are replayed on top of that history
+once it arrives. Crossovers are published to an IntradayFeed that clients
+follow over Server-Sent Events, and IntradayStream keeps the websocket
+connected from a background thread.
+"""
+import asyncio
+import json
+import logging
+import math
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import islice
+
+import metrics
+from indicators import warmup_bars
+from result_table import CROSSOVER_FLAGS, FLAG_BITS, pair_name
+from scan_events import HEARTBEAT_SECONDS
+from signals import pair_windows, parse_pairs
+
+logger = logging.getLogger(__name__)
+
+MINUTE_MS = 60 * 1000
+
+# A bar whose last minute never arrives (no trades) closes once the feed is this far past its end
+CLOSE_GRACE_MS = MINUTE_MS
+
+INTRADAY_MINUTES = metrics.counter('intraday_minutes_total', 'Minute aggregates received from the stream')
+INTRADAY_LATE = metrics.counter('intraday_late_minutes_total', 'Minute aggregates dropped because their bar had closed')
+INTRADAY_BARS = metrics.counter('intraday_bars_total', 'Intraday bars closed', ('timeframe',))
+INTRADAY_CROSSOVERS = metrics.counter('intraday_crossovers_total', 'Intraday crossovers published', ('timeframe',))
+INTRADAY_SYMBOLS = metrics.gauge('intraday_symbols', 'Symbols tracked by the intraday engine')
+INTRADAY_CONNECTED = metrics.gauge('intraday_stream_connected', 'Whether the intraday websocket is receiving data')
+
+
+def parse_timeframes(spec):
+    """Parse '5m,15m,1h' into minutes, ascending; raises ValueError on bad input."""
+    minutes = set()
+    for item in spec.split(','):
+        item = item.strip().lower()
+        if not item:
+            continue
+        unit = 60 if item.endswith('h') else 1
+        value = int(item.rstrip('mh'))
+        if value <= 0:
+            raise ValueError(f'Timeframe {item!r} must be positive')
+        minutes.add(value * unit)
+    if not minutes:
+        raise ValueError('At least one timeframe is required')
+    return tuple(sorted(minutes))
+
+
+def timeframe_name(minutes):
+    return f'{minutes // 60}h' if minutes % 60 == 0 else f'{minutes}m'
+
+
+def _iso(ms):
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat()
+
+
+class _Series:
+    """One symbol's state in one timeframe: the bar being built, the last closed bar and the EMA state."""
+
+    __slots__ = ('start', 'open', 'high', 'low', 'close', 'volume', 'bars', 'last', 'emas', 'diffs', 'flags',
+                 'pending')
+
+    def __init__(self, windows, pairs, warming=False):
+        self.start = None
+        self.open = self.high = self.low = self.close = self.volume = 0.0
+        self.bars = 0
+        self.last = None  # (start, open, high, low, close, volume) of the last closed bar
+        self.emas = [math.nan] * windows
+        # fast - slow at the day-before, yesterday and today bars, per pair
+        self.diffs = [[math.nan] * 3 for _ in range(pairs)]
+        self.flags = [0] * pairs
+        # Closes of the bars closed while the warm-up history is being fetched, or None once warm
+        self.pending = [] if warming else None
+
+
+class IntradayEngine:
+    """Incremental intraday bars, EMAs and crossover flags for many symbols; see the module docstring."""
+
+    def __init__(self, timeframes=(5, 15, 60), pairs=((8, 21),), min_volume=100000, feed=None,
+                 close_grace_ms=CLOSE_GRACE_MS, history_fn=None, history_workers=4):
+        """history_fn(symbol, minutes, count, until_ms) returns the closes of up to `count` bars of
+        that many minutes ending by until_ms, oldest first; it runs on history_workers threads, or
+        in the calling thread when history_workers is 0."""
+        self.timeframes = tuple(timeframes)
+        self.pairs = tuple(pairs)
+        self.windows = pair_windows(pairs)
+        self.min_volume = min_volume
+        self.feed = feed
+        self.close_grace_ms = close_grace_ms
+        self._alphas = [2.0 / (w + 1) for w in self.windows]
+        self._pair_windows = [(self.windows.index(fast), self.windows.index(slow), slow) for fast, slow in pairs]
+        self._names = [timeframe_name(tf) for tf in self.timeframes]
+        self.history_fn = history_fn
+        self.history_bars = warmup_bars(max(self.windows))
+        self._history_pool = ThreadPoolExecutor(history_workers, thread_name_prefix='intraday-history') \
+            if history_fn and history_workers else None
+        self._symbols = {}
+        self._clock = 0  # end of the newest minute seen, in ms
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def timeframe(self, spec=None):
+        """Minutes of a streamed timeframe given as '5m' or '1h'; None is the shortest."""
+        if spec is None:
+            return self.timeframes[0]
+        minutes = parse_timeframes(spec)[0]
+        if minutes not in self.timeframes:
+            raise ValueError(f"Timeframe {spec!r} is not streamed (available: {', '.join(self._names)})")
+        return minutes
+
+    def pair_index(self, pair=None):
+        """Position of a 'fast/slow' pair; None is the first pair."""
+        if pair is None:
+            return 0
+        pair = parse_pairs(pair)[0]
+        if pair not in self.pairs:
+            raise ValueError(f"EMA pair {pair_name(pair)} is not streamed "
+                             f"(available: {', '.join(pair_name(p) for p in self.pairs)})")
+        return self.pairs.index(pair)
+
+    def handle(self, messages):
+        """Process a batch of websocket messages (dicts with Polygon's short keys); other events are ignored."""
+        events, warmups = [], []
+        minutes = 0
+        with self._lock:
+            clock = self._clock
+            for m in messages:
+                if m.get('ev') == 'AM':
+                    self._add_minute(m['sym'], m['s'], m['o'], m['h'], m['l'], m['c'], m['v'], events, warmups)
+                    minutes += 1
+            if self._clock // MINUTE_MS > clock // MINUTE_MS:
+                self._sweep(self._clock - self.close_grace_ms, events)
+        INTRADAY_MINUTES.inc(minutes)
+        self._publish(events)
+        self._warm_up(warmups)
+
+    def add_minute(self, symbol, start, open, high, low, close, volume):
+        """Add one minute bar (start in epoch ms); returns the crossover records of the bars it closed."""
+        events, warmups = [], []
+        with self._lock:
+            self._add_minute(symbol, start, open, high, low, close, volume, events, warmups)
+        INTRADAY_MINUTES.inc()
+        self._publish(events)
+        self._warm_up(warmups)
+        return events
+
+    def _add_minute(self, symbol, start, open, high, low, close, volume, events, warmups):
+        states = self._symbols.get(symbol)
+        new = states is None
+        if new:
+            warming = self.history_fn is not None
+            states = self._symbols[symbol] = [_Series(len(self.windows), len(self.pairs), warming)
+                                              for _ in self.timeframes]
+            INTRADAY_SYMBOLS.set(len(self._symbols))
+        self._clock = max(self._clock, start + MINUTE_MS)
+        for t, series in enumerate(states):
+            span = self.timeframes[t] * MINUTE_MS
+            bucket = start - start % span
+            if new and self.history_fn:
+                # History up to the first streamed bar, which may have started before we connected
+                warmups.append((symbol, t, bucket))
+            if series.start is not None and bucket != series.start:
+                if bucket < series.start:
+                    INTRADAY_LATE.inc()
+                    continue
+                self._close(symbol, t, series, events)
+            if series.start is None:
+                if series.last is not None and bucket <= series.last[0]:
+                    # Its bar was already closed by the sweep
+                    INTRADAY_LATE.inc()
+                    continue
+                series.start = bucket
+                series.open, series.high, series.low, series.close, series.volume = open, high, low, close, volume
+            else:
+                series.high = max(series.high, high)
+                series.low = min(series.low, low)
+                series.close = close
+                series.volume += volume
+            # The bar's last minute closes it right away
+            if start + MINUTE_MS >= bucket + span:
+                self._close(symbol, t, series, events)
+
+    def _sweep(self, clock, events):
+        for symbol, states in self._symbols.items():
+            for t, series in enumerate(states):
+                if series.start is not None and series.start + self.timeframes[t] * MINUTE_MS <= clock:
+                    self._close(symbol, t, series, events)
+
+    def _warm_up(self, warmups):
+        for symbol, t, until in warmups:
+            if self._history_pool:
+                self._history_pool.submit(self._load_history, symbol, t, until)
+            else:
+                self._load_history(symbol, t, until)
+
+    def _load_history(self, symbol, t, until):
+        """Replay a series' history, then the bars it closed while waiting, through the EMAs."""
+        try:
+            closes = list(self.history_fn(symbol, self.timeframes[t], self.history_bars, until))
+        except Exception as e:
+            logger.warning(f'Intraday warm-up failed for {symbol} {self._names[t]}, '
+                           f'starting from the stream: {str(e)}')
+            closes = []
+        with self._lock:
+            series = self._symbols[symbol][t]
+            closes += series.pending
+            series.pending = None
+            series.bars = 0
+            series.emas = [math.nan] * len(self.windows)
+            series.diffs = [[math.nan] * 3 for _ in self.pairs]
+            for close in closes:
+                self._step(series, close)
+
+    def _step(self, series, close):
+        """Advance a series' EMAs and EMA differences by one closed bar."""
+        first = series.bars == 0
+        series.bars += 1
+        emas = series.emas
+        for i, alpha in enumerate(self._alphas):
+            emas[i] = close if first else emas[i] + alpha * (close - emas[i])
+        for p, (fast, slow, window) in enumerate(self._pair_windows):
+            diffs = series.diffs[p]
+            diffs[0], diffs[1] = diffs[1], diffs[2]
+            # Crossovers only count once the slow EMA has seen a full window of bars, and its history
+            diffs[2] = emas[fast] - emas[slow] if series.bars >= window and series.pending is None else math.nan
+
+    def _close(self, symbol, t, series, events):
+        close = series.close
+        series.last = (series.start, series.open, series.high, series.low, close, series.volume)
+        series.start = None
+        if series.pending is not None:
+            series.pending.append(close)
+        self._step(series, close)
+        for p in range(len(self.pairs)):
+            day_before, yesterday, today = series.diffs[p]
+            flags = 0
+            if today > 0 and yesterday <= 0:
+                flags |= FLAG_BITS['today_up']
+            if today < 0 and yesterday >= 0:
+                flags |= FLAG_BITS['today_down']
+            if yesterday > 0 and day_before <= 0:
+                flags |= FLAG_BITS['yesterday_up']
+            if yesterday < 0 and day_before >= 0:
+                flags |= FLAG_BITS['yesterday_down']
+            if flags and series.volume > self.min_volume:
+                flags |= FLAG_BITS['matched']
+            series.flags[p] = flags
+            if flags & (FLAG_BITS['today_up'] | FLAG_BITS['today_down']):
+                events.append(self._record(symbol, t, series, p))
+        INTRADAY_BARS.inc(timeframe=self._names[t])
+
+    def _publish(self, events):
+        for record in events:
+            INTRADAY_CROSSOVERS.inc(timeframe=record['timeframe'])
+            if self.feed:
+                self.feed.publish('crossover', record)
+
+    def _record(self, symbol, t, series, p):
+        start, open, high, low, close, volume = series.last
+        fast, slow = self.pairs[p]
+        flags = series.flags[p]
+        return {
+            'symbol': symbol,
+            'timeframe': self._names[t],
+            'start': _iso(start),
+            'end': _iso(start + self.timeframes[t] * MINUTE_MS),
+            'open': round(open, 2),
+            'high': round(high, 2),
+            'low': round(low, 2),
+            'price': round(close, 2),
+            'volume': int(volume),
+            f'ema{fast}': round(series.emas[self.windows.index(fast)], 2),
+            f'ema{slow}': round(series.emas[self.windows.index(slow)], 2),
+            'direction': 'up' if flags & (FLAG_BITS['today_up'] | FLAG_BITS['yesterday_up']) else
+                         'down' if flags & (FLAG_BITS['today_down'] | FLAG_BITS['yesterday_down']) else None,
+            'pair': pair_name(self.pairs[p]),
+            'matched': bool(flags & FLAG_BITS['matched']),
+            'crossover_points': {name: bool(flags & FLAG_BITS[name]) for name in CROSSOVER_FLAGS},
+        }
+
+    def latest(self, timeframe, pair=0, symbols=None, matched=None):
+        """Records of the last closed bar of each symbol in a timeframe (minutes), optionally filtered."""
+        t = self.timeframes.index(timeframe)
+        with self._lock:
+            names = symbols if symbols is not None else sorted(self._symbols)
+            records = []
+            for symbol in names:
+                states = self._symbols.get(symbol)
+                if states is None or states[t].last is None:
+                    continue
+                if matched is not None and bool(states[t].flags[pair] & FLAG_BITS['matched']) != matched:
+                    continue
+                records.append(self._record(symbol, t, states[t], pair))
+        return records
+
+
+class IntradayFeed:
+    """Recent intraday events for clients to follow, with sequence numbers so they can resume.
+
+    Only the last maxlen events are kept; a client that falls further
+    behind gets a 'gap' event and continues from the oldest one kept.
+    """
+
+    def __init__(self, maxlen=1000):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=maxlen)
+        self._next = 0
+
+    @property
+    def next_id(self):
+        return self._next
+
+    def publish(self, event, data):
+        with self._cond:
+            self._events.append((self._next, event, data))
+            self._next += 1
+            self._cond.notify_all()
+
+    def follow(self, since=None, heartbeat=HEARTBEAT_SECONDS):
+        """Yield (id, event, data) from event id since (default: new events only), forever.
+
+        Yields None after `heartbeat` seconds without an event so callers can
+        keep the connection alive.
+        """
+        position = self._next if since is None else since
+        while True:
+            with self._cond:
+                if position >= self._next:
+                    position = self._next
+                    self._cond.wait(heartbeat)
+                first = self._next - len(self._events)
+                missed = first - position
+                pending = list(islice(self._events, max(0, position - first), None))
+                position = self._next
+            if missed > 0:
+                yield None, 'gap', {'missed': missed}
+            if not pending:
+                yield None
+            for item in pending:
+                yield item
+
+
+class IntradayStream:
+    """Keep a Polygon websocket subscribed to minute aggregates and feed them to an engine.
+
+    feed is the websocket host (socket.polygon.io for real time,
+    delayed.polygon.io) or a ws:// URL such as a local fake server.
+    Reconnects with exponential backoff until stopped.
+    """
+
+    def __init__(self, engine, api_key, symbols=('*',), feed='socket.polygon.io', max_backoff=60):
+        self.engine = engine
+        self.api_key = api_key
+        self.subscriptions = [f'AM.{symbol}' for symbol in symbols]
+        self.secure = not feed.startswith('ws://')
+        self.host = feed.removeprefix('ws://').removeprefix('wss://').rstrip('/')
+        self.max_backoff = max_backoff
+        self._stopped = threading.Event()
+        self._client = None
+        self._loop = None
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='intraday-stream', daemon=True)
+        self._thread.start()
+        logger.info(f'Intraday stream started ({self.host}, {len(self.subscriptions)} subscriptions)')
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        client, loop = self._client, self._loop
+        if client is not None and loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.close(), loop)
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        from polygon import WebSocketClient
+        backoff = 1
+        while not self._stopped.is_set():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._client = WebSocketClient(api_key=self.api_key, feed=self.host, market='stocks', raw=True,
+                                           subscriptions=self.subscriptions, max_reconnects=None,
+                                           secure=self.secure)
+            try:
+                self._loop.run_until_complete(self._client.connect(self._process))
+                backoff = 1
+            except Exception as e:
+                logger.error(f'Intraday stream disconnected: {str(e)}')
+            finally:
+                INTRADAY_CONNECTED.set(0)
+                self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+                self._loop.close()
+            if self._stopped.wait(backoff):
+                break
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _process(self, raw):
+        INTRADAY_CONNECTED.set(1)
+        self.engine.handle(json.loads(raw))
@@ -0,0 +1,267 @@
+"""Durable copies of scan snapshots and a history of detected crossovers.
+
+ScanPersistence runs off the request and scan paths: the scheduler hands
+it each published snapshot and a background thread writes it with batched
+writes. Only the latest pending snapshot is kept if writes fall behind,
+since every snapshot covers the whole display window anyway.
+
+Backends store the prepared data: FirestoreBackend for Cloud Firestore (or
+its local emulator) and MemoryBackend, an in-memory stand-in with the same
+methods for local runs and benchmarks.
+"""
+import logging
+import threading
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+import metrics
+from metrics import SCAN_STAGE_SECONDS
+from result_table import CROSSOVER_FLAGS, FLAG_BITS, ResultTable, pair_name
+
+logger = logging.getLogger(__name__)
+
+# Firestore allows 500 writes per batch and 1 MiB per document
+BATCH_SIZE = 500
+CHUNK_BYTES = 900 * 1024
+
+CROSSOVER_MASK = sum(FLAG_BITS[name] for name in CROSSOVER_FLAGS)
+
+PERSIST_RUNS = metrics.counter('persist_runs_total', 'Snapshot persistence runs by outcome', ('outcome',))
+PERSIST_SIGNALS = metrics.counter('persist_signals_total', 'Crossover records written to the signal history')
+
+
+class MemoryBackend:
+    """In-memory backend with the FirestoreBackend interface; counts batches like Firestore would."""
+
+    def __init__(self, keep=3):
+        self.keep = keep
+        self.snapshots = {}
+        self.signal_docs = {}
+        self.batches = 0
+        self._lock = threading.Lock()
+
+    def _count_batches(self, writes):
+        self.batches += (writes + BATCH_SIZE - 1) // BATCH_SIZE
+
+    def save_snapshot(self, snapshot_id, meta, chunks):
+        with self._lock:
+            self._count_batches(len(chunks) + 1)
+            self.snapshots[snapshot_id] = (dict(meta), list(chunks))
+            for old in sorted(self.snapshots)[:-self.keep]:
+                del self.snapshots[old]
+
+    def load_latest_snapshot(self):
+        with self._lock:
+            if not self.snapshots:
+                return None
+            return self.snapshots[max(self.snapshots)]
+
+    def save_signals(self, docs):
+        with self._lock:
+            self._count_batches(len(docs))
+            for doc in docs:
+                self.signal_docs[(doc['symbol'], doc['date'], doc['pair'])] = dict(doc)
+
+    def query_signals(self, symbol, start=None, end=None, pair=None):
+        with self._lock:
+            docs = [doc for (s, d, p), doc in self.signal_docs.items()
+                    if s == symbol and (start is None or d >= start) and (end is None or d <= end)
+                    and (pair is None or p == pair)]
+        return sorted(docs, key=lambda doc: (doc['date'], doc['pair']))
+
+
+class FirestoreBackend:
+    """Snapshots and signal history in Cloud Firestore.
+
+    Layout, with collection names prefixed by prefix:
+      <prefix>_snapshots/<id>               started_at, completed_at, pairs, chunk count
+      <prefix>_snapshots/<id>/chunks/<n>    compressed ResultTable bytes
+      <prefix>_signals/<SYMBOL>/crossovers/<date>_<fast>-<slow>
+    Snapshot ids sort by completion time and only the newest keep are
+    retained. Signals live under their symbol so a date range query needs
+    only Firestore's automatic single-field index.
+    """
+
+    def __init__(self, db, prefix='crossover', keep=3):
+        self.db = db
+        self.keep = keep
+        self.snapshots = db.collection(f'{prefix}_snapshots')
+        self.signals = db.collection(f'{prefix}_signals')
+
+    def _commit(self, writes, delete=False):
+        for start in range(0, len(writes), BATCH_SIZE):
+            batch = self.db.batch()
+            for ref, data in writes[start:start + BATCH_SIZE]:
+                if delete:
+                    batch.delete(ref)
+                else:
+                    batch.set(ref, data)
+            batch.commit()
+
+    def save_snapshot(self, snapshot_id, meta, chunks):
+        doc = self.snapshots.document(snapshot_id)
+        # Chunks first and the parent last, so a reader never finds a parent with missing chunks
+        writes = [(doc.collection('chunks').document(f'{n:04d}'), {'data': chunk}) for n, chunk in enumerate(chunks)]
+        writes.append((doc, dict(meta, chunks=len(chunks))))
+        self._commit(writes)
+        stale = list(self.snapshots.order_by('completed_at', direction='DESCENDING').offset(self.keep).stream())
+        deletes = [(chunk.reference, None) for old in stale for chunk in old.reference.collection('chunks').stream()]
+        self._commit(deletes + [(old.reference, None) for old in stale], delete=True)
+
+    def load_latest_snapshot(self):
+        latest = list(self.snapshots.order_by('completed_at', direction='DESCENDING').limit(1).stream())
+        if not latest:
+            return None
+        meta = latest[0].to_dict()
+        chunk_docs = latest[0].reference.collection('chunks').order_by('__name__').stream()
+        chunks = [chunk.to_dict()['data'] for chunk in chunk_docs]
+        if len(chunks) != meta.get('chunks'):
+            logger.warning(f'Stored snapshot {latest[0].id} is incomplete, ignoring it')
+            return None
+        return meta, chunks
+
+    def save_signals(self, docs):
+        self._commit([(self.signals.document(doc['symbol']).collection('crossovers')
+                       .document(f"{doc['date']}_{doc['pair'].replace('/', '-')}"), doc) for doc in docs])
+
+    def query_signals(self, symbol, start=None, end=None, pair=None):
+        from google.cloud.firestore_v1.base_query import FieldFilter
+        query = self.signals.document(symbol).collection('crossovers')
+        if start:
+            query = query.where(filter=FieldFilter('date', '>=', start))
+        if end:
+            query = query.where(filter=FieldFilter('date', '<=', end))
+        docs = [doc.to_dict() for doc in query.stream()]
+        if pair:
+            docs = [doc for doc in docs if doc['pair'] == pair]
+        return sorted(docs, key=lambda doc: (doc['date'], doc['pair']))
+
+
+def open_backend(name, prefix='crossover', keep=3):
+    """Backend from a PERSISTENCE_BACKEND value: 'firestore', 'memory' or 'none' (None)."""
+    if not name or name == 'none':
+        return None
+    if name == 'memory':
+        return MemoryBackend(keep)
+    if name == 'firestore':
+        from firebase_config import get_db
+        return FirestoreBackend(get_db(), prefix, keep)
+    raise ValueError(f"Unknown persistence backend {name!r}; use 'firestore', 'memory' or 'none'")
+
+
+class ScanPersistence:
+    """Write published snapshots and new crossovers to a backend from a background thread."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._pending = None
+        self._written = {}  # (symbol, date, pair) -> flags last written
+        self._cond = threading.Condition()
+        self._busy = False
+        self._thread = None
+
+    def submit(self, snapshot):
+        """Queue snapshot for writing without blocking; replaces one still waiting."""
+        with self._cond:
+            self._pending = snapshot
+            self._cond.notify_all()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='scan-persistence', daemon=True)
+                self._thread.start()
+
+    def flush(self, timeout=None):
+        """Wait until queued snapshots are written. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending is None and not self._busy, timeout)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None)
+                snapshot, self._pending = self._pending, None
+                self._busy = True
+            try:
+                self.persist(snapshot)
+            except Exception as e:
+                PERSIST_RUNS.inc(outcome='failed')
+                logger.error(f'Could not persist snapshot v{snapshot.version}: {str(e)}')
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def persist(self, snapshot):
+        """Write snapshot and the crossovers not written before, synchronously."""
+        with SCAN_STAGE_SECONDS.time(stage='persist'):
+            results = snapshot.results
+            payload = zlib.compress(results.to_bytes(), 6)
+            chunks = [payload[i:i + CHUNK_BYTES] for i in range(0, len(payload), CHUNK_BYTES)] or [b'']
+            meta = {
+                'version': snapshot.version,
+                'started_at': snapshot.started_at,
+                'completed_at': snapshot.completed_at,
+                'pairs': [pair_name(pair) for pair in results.pairs],
+                'rows': len(results),
+            }
+            self.backend.save_snapshot(snapshot.completed_at.strftime('%Y%m%dT%H%M%S.%fZ'), meta, chunks)
+            docs, written = self._new_signals(results, snapshot.completed_at)
+            if docs:
+                self.backend.save_signals(docs)
+            # Only keys still in the display window can come back, so older ones are dropped
+            self._written = written
+        PERSIST_RUNS.inc(outcome='ok')
+        PERSIST_SIGNALS.inc(len(docs))
+        logger.info(f'Persisted snapshot v{snapshot.version} ({len(payload) / 1024:.0f} KiB) '
+                    f'and {len(docs)} new crossovers')
+
+    def _crossovers(self, results):
+        """(pair position, rows, keys, flags) for the rows with a crossover, per pair."""
+        if not len(results):
+            return
+        symbols = results.column('symbol')
+        dates = np.datetime_as_string(results.column('date'))
+        for p, pair in enumerate(results.pairs):
+            flags = results.row_flags[p]
+            rows = np.flatnonzero(flags & CROSSOVER_MASK)
+            name = pair_name(pair)
+            keys = [(symbols[r], dates[r], name) for r in rows.tolist()]
+            yield p, rows, keys, flags[rows].tolist()
+
+    def _new_signals(self, results, detected_at):
+        """Records for crossovers that are new or whose flags changed since they were written,
+        and the flags of every crossover in results."""
+        docs, written = [], {}
+        for p, rows, row_keys, row_flags in self._crossovers(results):
+            written.update(zip(row_keys, row_flags))
+            changed = [i for i, key in enumerate(row_keys) if self._written.get(key) != row_flags[i]]
+            if not changed:
+                continue
+            for record in results.records(rows[changed], pair=p):
+                record.pop('timestamp')
+                record['detected_at'] = detected_at
+                docs.append(record)
+        return docs, written
+
+    def mark_written(self, results):
+        """Treat the crossovers in results as already stored, e.g. after restoring them."""
+        self._written = {key: flag for _, _, keys, flags in self._crossovers(results)
+                         for key, flag in zip(keys, flags)}
+
+    def load_latest(self):
+        """(results, started_at, completed_at) of the newest stored snapshot, or None."""
+        stored = self.backend.load_latest_snapshot()
+        if stored is None:
+            return None
+        meta, chunks = stored
+        results = ResultTable.from_bytes(zlib.decompress(b''.join(bytes(chunk) for chunk in chunks)))
+        return results, _as_datetime(meta['started_at']), _as_datetime(meta['completed_at'])
+
+    def signal_history(self, symbol, start=None, end=None, pair=None):
+        return self.backend.query_signals(symbol, start, end, pair)
+
+
+def _as_datetime(value):
+    # Firestore returns its own datetime subclass; the memory backend keeps the original
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
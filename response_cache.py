@@ -0,0 +1,101 @@
+"""Encoded /scan responses, built once per snapshot and query.
+
+A snapshot never changes once published, so the JSON of a given page of
+it is serialized and gzip-compressed once, then served as bytes with a
+strong ETag until it falls out of the LRU. Brotli is used when the optional
+brotli package is installed and the client accepts it.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+import metrics
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+RESPONSE_CACHE = metrics.counter('scan_response_cache_total', 'Encoded /scan responses by cache outcome',
+                                 ('outcome',))
+
+# Smaller bodies gain nothing from compression
+MIN_COMPRESS_BYTES = 512
+
+
+class EncodedResponse:
+    """One response body with its ETag and lazily compressed variants."""
+
+    __slots__ = ('body', 'etag', '_encoded', '_lock')
+
+    def __init__(self, body, version):
+        self.body = body
+        self.etag = f'v{version}-{hashlib.blake2b(body, digest_size=8).hexdigest()}'
+        self._encoded = {}
+        self._lock = threading.Lock()
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.encoded('gzip')
+
+    def encoded(self, encoding):
+        with self._lock:
+            data = self._encoded.get(encoding)
+            if data is None:
+                if encoding == 'br':
+                    data = brotli.compress(self.body, quality=5)
+                else:
+                    data = gzip.compress(self.body, compresslevel=6, mtime=0)
+                self._encoded[encoding] = data
+            return data
+
+    def negotiate(self, accept_encoding):
+        """Content-Encoding to serve for an Accept-Encoding header, or None for the plain body."""
+        if len(self.body) < MIN_COMPRESS_BYTES:
+            return None
+        accepted = {part.split(';')[0].strip() for part in accept_encoding.lower().split(',')}
+        if 'br' in accepted and brotli is not None:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return None
+
+    def tag(self, encoding):
+        # Strong ETags must differ between encodings of the same body
+        return f'"{self.etag}-{encoding}"' if encoding else f'"{self.etag}"'
+
+    def matches(self, if_none_match):
+        """Whether an If-None-Match header names any variant of this body (weak comparison)."""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return any(self.tag(encoding) in tags for encoding in (None, 'gzip', 'br'))
+
+
+class ResponseCache:
+    """Thread-safe LRU of EncodedResponse keyed by (snapshot version, query)."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        RESPONSE_CACHE.inc(outcome='hit' if entry is not None else 'miss')
+        return entry
+
+    def put(self, key, body, version):
+        entry = EncodedResponse(body, version)
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
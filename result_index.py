@@ -0,0 +1,164 @@
+import base64
+import hashlib
+import json
+
+import numpy as np
+
+from timeframes import TIMEFRAMES
+
+EMPTY = np.empty(0, dtype=np.int64)
+DIRECTIONS = ('up', 'down')
+WHENS = ('today', 'yesterday')
+
+
+class ResultIndex:
+    """Indexes over one snapshot's ResultTable, built once when it is published.
+
+    Row positions refer to the snapshot's result order (newest date first),
+    so any selection can be paginated by slicing.
+    """
+
+    def __init__(self, results):
+        self.size = len(results)
+        dates = results.column('date')
+        codes = results.bar_symbol[results.row_bar]
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(results.symbols) + 1))
+        self.by_symbol = {symbol: order[bounds[i]:bounds[i + 1]]
+                          for i, symbol in enumerate(results.symbols) if bounds[i + 1] > bounds[i]}
+
+        # Distinct trading dates newest first; session_rank 0 is the latest
+        self.sessions = np.unique(dates)[::-1]
+        self.session_rank = np.searchsorted(-self.sessions.astype(np.int64), -dates.astype(np.int64))
+        order = np.argsort(self.session_rank, kind='stable')
+        bounds = np.searchsorted(self.session_rank[order], np.arange(len(self.sessions) + 1))
+        self.by_date = {session: order[bounds[i]:bounds[i + 1]]
+                        for i, session in enumerate(self.sessions)}
+
+        # One set of bitmaps per EMA pair
+        self.pairs = results.pairs
+        self.flags = [{(when, direction): results.flag(f'{when}_{direction}', pair=p)
+                       for when in WHENS for direction in DIRECTIONS} for p in range(len(self.pairs))]
+        self.matched = [results.flag('matched', pair=p) for p in range(len(self.pairs))]
+        # Trend of each higher timeframe as of every row, per pair
+        self.trends = [{tf: results.trend(tf, pair=p) for tf in results.timeframes} for p in range(len(self.pairs))]
+        self.volume = results.column('volume')
+
+    def select(self, symbols=None, date=None, matched=None, direction=None, crossover=None,
+               sessions=None, min_volume=None, confirm=None, pair=0):
+        """Row positions matching every given filter, in result order.
+
+        symbols: iterable of tickers; date: datetime64[D] or 'latest';
+        matched: bool; direction: 'up'/'down'; crossover: 'today'/'yesterday'/'any';
+        sessions: only the latest N trading dates; min_volume: today's volume above it;
+        confirm: higher timeframes whose trend must agree with the row's daily crossover;
+        pair: position of the EMA pair the matched/crossover filters apply to.
+        """
+        if self.size == 0:
+            return EMPTY
+
+        # Hash indexes narrow the candidates first; bitmaps then filter them
+        rows = None
+        if symbols:
+            rows = np.sort(np.concatenate([self.by_symbol.get(s, EMPTY) for s in symbols]))
+        if date is not None:
+            if isinstance(date, str) and date == 'latest':
+                date = self.sessions[0]
+            date_rows = self.by_date.get(np.datetime64(date, 'D'), EMPTY)
+            rows = date_rows if rows is None else np.intersect1d(rows, date_rows, assume_unique=True)
+
+        masks = []
+        if matched is not None:
+            masks.append(self.matched[pair] if matched else ~self.matched[pair])
+        if direction or crossover:
+            directions = (direction,) if direction else DIRECTIONS
+            whens = WHENS if crossover in (None, 'any') else (crossover,)
+            cross = np.zeros(self.size, dtype=bool)
+            for when in whens:
+                for d in directions:
+                    cross |= self.flags[pair][(when, d)]
+            masks.append(cross)
+        if sessions:
+            masks.append(self.session_rank < sessions)
+        if min_volume is not None:
+            masks.append(self.volume > min_volume)
+        if confirm:
+            flags = self.flags[pair]
+            up = flags[('today', 'up')] | flags[('yesterday', 'up')]
+            down = flags[('today', 'down')] | flags[('yesterday', 'down')]
+            for timeframe in confirm:
+                up = up & (self.trends[pair][timeframe] > 0)
+                down = down & (self.trends[pair][timeframe] < 0)
+            masks.append(up | down)
+
+        if rows is None:
+            if not masks:
+                return np.arange(self.size)
+            mask = masks[0].copy()
+            for m in masks[1:]:
+                mask &= m
+            return np.flatnonzero(mask)
+        for m in masks:
+            rows = rows[m[rows]]
+        return rows
+
+
+def parse_filters(args):
+    """Read /scan filter query parameters; raises ValueError on bad input."""
+    filters = {}
+    if args.get('symbol'):
+        filters['symbols'] = sorted({s.strip().upper() for s in args['symbol'].split(',') if s.strip()})
+    if args.get('date'):
+        date = args['date'].strip().lower()
+        filters['date'] = date if date == 'latest' else str(np.datetime64(date, 'D'))
+    if args.get('matched'):
+        filters['matched'] = args['matched'].lower() in ('1', 'true', 'yes')
+    if args.get('direction'):
+        if args['direction'] not in DIRECTIONS:
+            raise ValueError("direction must be 'up' or 'down'")
+        filters['direction'] = args['direction']
+    if args.get('crossover'):
+        if args['crossover'] not in WHENS + ('any',):
+            raise ValueError("crossover must be 'today', 'yesterday' or 'any'")
+        filters['crossover'] = args['crossover']
+    if args.get('sessions'):
+        filters['sessions'] = int(args['sessions'])
+        if filters['sessions'] < 1:
+            raise ValueError('sessions must be positive')
+    if args.get('min_volume'):
+        filters['min_volume'] = float(args['min_volume'])
+    if args.get('confirm'):
+        names = {tf.strip().lower() for tf in args['confirm'].split(',') if tf.strip()}
+        if not names or names - set(TIMEFRAMES):
+            raise ValueError(f"confirm must list timeframes from {', '.join(TIMEFRAMES)}")
+        filters['confirm'] = [tf for tf in TIMEFRAMES if tf in names]
+    if args.get('pair'):
+        try:
+            fast, slow = (int(w) for w in args['pair'].split('/'))
+        except ValueError:
+            raise ValueError("pair must be fast/slow EMA windows, e.g. '8/21'")
+        filters['pair'] = f'{fast}/{slow}'
+    return filters
+
+
+def _filters_key(filters):
+    return hashlib.sha1(json.dumps(filters, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def encode_cursor(version, offset, filters):
+    payload = json.dumps({'v': version, 'o': offset, 'q': _filters_key(filters)}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor, filters):
+    """Return (version, offset) for a cursor issued for the same filters; raises ValueError otherwise."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        version, offset, key = int(payload['v']), int(payload['o']), payload['q']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Invalid cursor')
+    if offset < 0:
+        raise ValueError('Invalid cursor')
+    if key != _filters_key(filters):
+        raise ValueError('Cursor was issued for different filters')
+    return version, offset
@@ -0,0 +1,336 @@
+import io
+import json
+from itertools import repeat
+
+import numpy as np
+
+# Bit positions in ResultTable.row_flags
+FLAG_BITS = {
+    'today_up': 1,
+    'today_down': 2,
+    'yesterday_up': 4,
+    'yesterday_down': 8,
+    'matched': 16,
+}
+CROSSOVER_FLAGS = ('today_up', 'today_down', 'yesterday_up', 'yesterday_down')
+OFFSETS = {'': 0, 'yesterday_': 1, 'day_before_': 2}
+CROSSOVER_MASK = sum(FLAG_BITS[flag] for flag in CROSSOVER_FLAGS)
+
+
+def _frozen(array):
+    array = np.ascontiguousarray(array)
+    array.flags.writeable = False
+    return array
+
+
+def pair_name(pair):
+    return f'{pair[0]}/{pair[1]}'
+
+
+class ResultTable:
+    """Columnar crossover results.
+
+    Every bar is stored once, in newest-first blocks per ticker, with one
+    EMA row per distinct window (emas is windows x bars). A result row is
+    just the position of its "today" bar plus a byte of flags per EMA pair
+    (row_flags is pairs x rows); the yesterday and day-before values are
+    read from the next two bars of the same block instead of being copied.
+    Higher timeframes resampled from the daily bars (see timeframes.py) add
+    their EMAs as of each bar (tf_emas is timeframes x windows x bars) and
+    flags per row (tf_flags is timeframes x pairs x rows).
+    Arrays are read-only so a published table can be shared between threads.
+    """
+
+    __slots__ = ('symbols', 'bar_symbol', 'date', 'price', 'volume', 'windows', 'emas', 'pairs',
+                 'row_bar', 'row_flags', 'timeframes', 'tf_emas', 'tf_flags')
+
+    def __init__(self, symbols, bar_symbol, date, price, volume, windows, emas, pairs, row_bar, row_flags,
+                 timeframes=(), tf_emas=None, tf_flags=None):
+        self.symbols = _frozen(np.asarray(symbols, dtype=object))
+        self.bar_symbol = _frozen(np.asarray(bar_symbol, dtype=np.int32))
+        self.date = _frozen(np.asarray(date, dtype='datetime64[D]'))
+        self.price = _frozen(np.asarray(price, dtype=float))
+        self.volume = _frozen(np.asarray(volume, dtype=float))
+        self.windows = tuple(int(w) for w in windows)
+        self.emas = _frozen(np.asarray(emas, dtype=float).reshape(len(self.windows), -1))
+        self.pairs = tuple((int(fast), int(slow)) for fast, slow in pairs)
+        self.row_bar = _frozen(np.asarray(row_bar, dtype=np.int32))
+        self.row_flags = _frozen(np.asarray(row_flags, dtype=np.uint8).reshape(len(self.pairs), -1))
+        self.timeframes = tuple(str(tf) for tf in timeframes)
+        shape = (len(self.timeframes), len(self.windows), len(self.price))
+        self.tf_emas = _frozen(np.asarray(tf_emas if tf_emas is not None else np.empty(shape), dtype=float)
+                               .reshape(shape))
+        shape = (len(self.timeframes), len(self.pairs), len(self.row_bar))
+        self.tf_flags = _frozen(np.asarray(tf_flags if tf_flags is not None else np.zeros(shape), dtype=np.uint8)
+                                .reshape(shape))
+
+    @classmethod
+    def empty(cls, pairs=((8, 21),), timeframes=()):
+        windows = sorted({w for pair in pairs for w in pair})
+        return cls([], [], [], [], [], windows, [], pairs, [], [], timeframes)
+
+    def __len__(self):
+        return len(self.row_bar)
+
+    def __iter__(self):
+        return (ResultRow(self, i) for i in range(len(self)))
+
+    def __getitem__(self, i):
+        return ResultRow(self, i)
+
+    @property
+    def nbytes(self):
+        return sum(value.nbytes for value in (getattr(self, name) for name in self.__slots__)
+                   if isinstance(value, np.ndarray))
+
+    def to_bytes(self):
+        """Serialize to an .npz payload that from_bytes() reads back without pickling."""
+        buffer = io.BytesIO()
+        np.savez(buffer, symbols=self.symbols.astype(str), bar_symbol=self.bar_symbol, date=self.date,
+                 price=self.price, volume=self.volume, windows=np.asarray(self.windows, dtype=np.int64),
+                 emas=self.emas, pairs=np.asarray(self.pairs, dtype=np.int64).reshape(-1, 2),
+                 row_bar=self.row_bar, row_flags=self.row_flags, timeframes=np.asarray(self.timeframes, dtype=str),
+                 tf_emas=self.tf_emas, tf_flags=self.tf_flags)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            # Payloads written before timeframes were added have none
+            timeframes = arrays['timeframes'].tolist() if 'timeframes' in arrays.files else ()
+            return cls(arrays['symbols'].astype(object), arrays['bar_symbol'], arrays['date'], arrays['price'],
+                       arrays['volume'], arrays['windows'].tolist(), arrays['emas'],
+                       [tuple(pair) for pair in arrays['pairs'].tolist()], arrays['row_bar'], arrays['row_flags'],
+                       timeframes, arrays['tf_emas'] if timeframes else None,
+                       arrays['tf_flags'] if timeframes else None)
+
+    def pair_index(self, pair=None):
+        """Position of a pair given as (fast, slow) or 'fast/slow'; None is the first pair."""
+        if pair is None:
+            return 0
+        if isinstance(pair, str):
+            try:
+                pair = tuple(int(w) for w in pair.split('/'))
+            except ValueError:
+                raise ValueError(f'Invalid EMA pair {pair!r}')
+        if tuple(pair) not in self.pairs:
+            raise ValueError(f"EMA pair {pair_name(pair)} is not scanned "
+                             f"(available: {', '.join(pair_name(p) for p in self.pairs)})")
+        return self.pairs.index(tuple(pair))
+
+    def timeframe_index(self, timeframe):
+        """Position of a higher timeframe such as 'week'; raises ValueError if it was not scanned."""
+        if timeframe not in self.timeframes:
+            raise ValueError(f"Timeframe {timeframe} is not scanned "
+                             f"(available: {', '.join(self.timeframes) or 'none'})")
+        return self.timeframes.index(timeframe)
+
+    def trend(self, timeframe, rows=None, pair=0):
+        """Per row, 1 where the pair's fast EMA is above the slow one in timeframe, -1 below, 0 unknown."""
+        t = self.timeframe_index(timeframe)
+        fast, slow = self.pairs[pair]
+        bars = self.row_bar if rows is None else self.row_bar[rows]
+        diff = self.tf_emas[t, self.windows.index(fast), bars] - self.tf_emas[t, self.windows.index(slow), bars]
+        return np.sign(np.nan_to_num(diff)).astype(np.int8)
+
+    def _replace_rows(self, row_bar, row_flags, tf_flags):
+        table = object.__new__(ResultTable)
+        for name in self.__slots__:
+            setattr(table, name, getattr(self, name))
+        table.row_bar = _frozen(row_bar)
+        table.row_flags = _frozen(row_flags)
+        table.tf_flags = _frozen(tf_flags)
+        return table
+
+    def take(self, rows):
+        """A table with only the given rows, in that order; bars are shared."""
+        rows = np.asarray(rows, dtype=np.int64)
+        return self._replace_rows(self.row_bar[rows], self.row_flags[:, rows], self.tf_flags[:, :, rows])
+
+    def sorted_by_date(self):
+        """Rows ordered newest date first, keeping the existing order within a date."""
+        order = np.argsort(-self.date[self.row_bar].astype(np.int64), kind='stable')
+        return self.take(order)
+
+    def flag(self, name, rows=None, pair=0):
+        flags = self.row_flags[pair] if rows is None else self.row_flags[pair, rows]
+        return (flags & FLAG_BITS[name]) != 0
+
+    def ema(self, window):
+        """EMA values of every bar for one window."""
+        return self.emas[self.windows.index(int(window))]
+
+    def column(self, name, rows=None, pair=0):
+        """Per-row values of a /scan field such as 'symbol', 'yesterday_price', 'ema21' or 'matched'."""
+        if name in FLAG_BITS:
+            return self.flag(name, rows, pair)
+        bars = self.row_bar if rows is None else self.row_bar[rows]
+        if name == 'symbol':
+            return self.symbols[self.bar_symbol[bars]]
+        offset = 0
+        for prefix in ('yesterday_', 'day_before_'):
+            if name.startswith(prefix):
+                name, offset = name[len(prefix):], OFFSETS[prefix]
+        if name.startswith('ema') and name[3:].isdigit():
+            if int(name[3:]) not in self.windows:
+                raise AttributeError(name)
+            return self.ema(name[3:])[bars + offset]
+        return getattr(self, name)[bars + offset]
+
+    def _bar_fields(self, rows, pair):
+        """Per-row bars, and the /scan bar fields of every bar some row shows with where each row finds them.
+
+        Rows share bars through the offsets, so each needed bar is formatted once.
+        Returns (bars, fields, lookups): fields maps field to values of the needed
+        bars and lookups maps each OFFSETS prefix to positions into them.
+        """
+        bars = self.row_bar[rows]
+        fast, slow = self.pairs[pair]
+        positions = {prefix: bars + offset for prefix, offset in OFFSETS.items()}
+        needed = np.unique(np.concatenate(list(positions.values())))
+        fields = {
+            'date': np.datetime_as_string(self.date[needed]),
+            'price': round_cents(self.price[needed]),
+            'volume': np.nan_to_num(self.volume[needed]).astype(np.int64),
+            f'ema{fast}': round_cents(self.ema(fast)[needed]),
+            f'ema{slow}': round_cents(self.ema(slow)[needed]),
+        }
+        lookups = {prefix: np.searchsorted(needed, bar_positions) for prefix, bar_positions in positions.items()}
+        return bars, fields, lookups
+
+    def records(self, rows=None, timestamp=None, pair=0):
+        """Serialize rows into the JSON records served by /scan.
+
+        Each record carries the EMAs and crossover flags of one pair, keyed
+        ema<fast>/ema<slow> as for the original 8/21 scan.
+        """
+        rows = slice(None) if rows is None else np.asarray(rows, dtype=np.int64)
+        bars, fields, lookups = self._bar_fields(rows, pair)
+        flags = self.row_flags[pair, rows]
+        columns = {'symbol': self.symbols[self.bar_symbol[bars]].tolist()}
+        for prefix, lookup in lookups.items():
+            for field, values in fields.items():
+                columns[prefix + field] = values[lookup].tolist()
+        columns['pair'] = repeat(pair_name(self.pairs[pair]))
+        columns['matched'] = ((flags & FLAG_BITS['matched']) != 0).tolist()
+        # Rows only differ in which crossover bits are set, so each combination's dict is built once
+        crossover_bits = flags & CROSSOVER_MASK
+        points = {int(bits): {flag: bool(bits & FLAG_BITS[flag]) for flag in CROSSOVER_FLAGS}
+                  for bits in np.unique(crossover_bits)}
+        columns['crossover_points'] = [points[bits].copy() for bits in crossover_bits.tolist()]
+        if self.timeframes:
+            timeframes = self._timeframe_columns(rows, bars, pair)
+            columns['timeframes'] = [{timeframe: {field: values[i] for field, values in fields.items()}
+                                      for timeframe, fields in timeframes.items()} for i in range(len(bars))]
+        columns['timestamp'] = repeat(timestamp)
+        names = list(columns)
+        return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+    def records_json(self, rows=None, timestamp=None, pair=0, default=None):
+        """records() encoded as a JSON array, byte for byte as json.dumps(records, sort_keys=True,
+        separators=(',', ':'), default=default) would.
+
+        Each needed bar's fields are encoded once and rows are assembled as
+        text, skipping the per-row dicts.
+        """
+        rows = slice(None) if rows is None else np.asarray(rows, dtype=np.int64)
+        bars, fields, lookups = self._bar_fields(rows, pair)
+        flags = self.row_flags[pair, rows]
+        codes, symbol_rows = np.unique(self.bar_symbol[bars], return_inverse=True)
+        columns = {'symbol': _texts([json.dumps(symbol) for symbol in self.symbols[codes].tolist()])[symbol_rows]}
+        encoded = {field: _encoded(values) for field, values in fields.items()}
+        for prefix, lookup in lookups.items():
+            for field, values in encoded.items():
+                columns[prefix + field] = values[lookup]
+        columns['pair'] = repeat(json.dumps(pair_name(self.pairs[pair])))
+        columns['matched'] = _texts(['false', 'true'])[((flags & FLAG_BITS['matched']) != 0).astype(np.intp)]
+        crossover_bits = flags & CROSSOVER_MASK
+        points = np.full(CROSSOVER_MASK + 1, None, dtype=object)
+        for bits in np.unique(crossover_bits).tolist():
+            points[bits] = json.dumps({flag: bool(bits & FLAG_BITS[flag]) for flag in CROSSOVER_FLAGS},
+                                      sort_keys=True, separators=(',', ':'))
+        columns['crossover_points'] = points[crossover_bits]
+        if self.timeframes:
+            timeframes = {timeframe: _json_objects({field: _encoded(np.asarray(values))
+                                                    for field, values in tf_fields.items()})
+                          for timeframe, tf_fields in self._timeframe_columns(rows, bars, pair).items()}
+            columns['timeframes'] = _json_objects(timeframes)
+        columns['timestamp'] = repeat(json.dumps(timestamp, default=default))
+        return '[' + ','.join(_json_objects(columns)) + ']'
+
+    def _timeframe_columns(self, rows, bars, pair):
+        """{timeframe: {field: per-row values}} with the pair's EMAs, trend and crossovers in each higher timeframe."""
+        fast, slow = self.pairs[pair]
+        f, s = self.windows.index(fast), self.windows.index(slow)
+        columns = {}
+        for t, timeframe in enumerate(self.timeframes):
+            diff = self.tf_emas[t, f, bars] - self.tf_emas[t, s, bars]
+            flags = self.tf_flags[t, pair, rows]
+            columns[timeframe] = {
+                f'ema{fast}': round_cents(self.tf_emas[t, f, bars]).tolist(),
+                f'ema{slow}': round_cents(self.tf_emas[t, s, bars]).tolist(),
+                'trend': np.where(diff > 0, 'up', np.where(diff < 0, 'down', None)).tolist(),
+                # Crossovers within the row's own period and within the period before it
+                'crossover': _directions(flags, 'today_up', 'today_down'),
+                'previous_crossover': _directions(flags, 'yesterday_up', 'yesterday_down'),
+            }
+        return columns
+
+
+def _texts(values):
+    return np.array(values, dtype=object)
+
+
+def _encoded(values):
+    """JSON text of each value: floats and ints as json.dumps writes them, date strings quoted."""
+    if values.dtype.kind == 'U':
+        return _texts(['"' + value + '"' for value in values.tolist()])
+    if values.dtype.kind in 'fi':
+        return _texts(list(map(repr, values.tolist())))
+    return _texts([json.dumps(value) for value in values.tolist()])
+
+
+def _json_objects(columns):
+    """One JSON object per row from {key: per-row JSON text (array or repeat())}, keys sorted."""
+    keys = sorted(columns)
+    template = '{' + ','.join(f'{json.dumps(key)}:%s' for key in keys) + '}'
+    return [template % values for values in zip(*(columns[key] for key in keys))]
+
+
+def _directions(flags, up, down):
+    return np.where(flags & FLAG_BITS[up], 'up', np.where(flags & FLAG_BITS[down], 'down', None)).tolist()
+
+
+def round_cents(values):
+    """Values rounded to cents, NaN as 0.0.
+
+    Python's round() is correctly rounded on the decimal value, unlike
+    np.round, but the two only disagree within a few ulps of a half cent,
+    so round() is only called for those.
+    """
+    values = np.nan_to_num(np.asarray(values, dtype=float), nan=0.0)
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    ties = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) <= 4 * np.abs(np.spacing(scaled)))
+    for i in ties.tolist():
+        rounded[i] = round(float(values[i]), 2)
+    return rounded
+
+
+class ResultRow:
+    """Lightweight view of one row of a ResultTable."""
+
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getattr__(self, name):
+        try:
+            return self.table.column(name, [self.index])[0]
+        except (AttributeError, KeyError):
+            raise AttributeError(name)
+
+    def to_dict(self, timestamp=None, pair=0):
+        return self.table.records([self.index], timestamp, pair)[0]
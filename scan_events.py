@@ -0,0 +1,89 @@
+import json
+import threading
+
+# Seconds between keep-alive messages while a stream waits for the next event
+HEARTBEAT_SECONDS = 15
+
+
+class ScanEvents:
+    """Progress events of the scan currently running, for streaming to clients.
+
+    The scheduler opens a run with begin() and closes it with finish(); the
+    scan function publishes progress and per-ticker rows in between. Every
+    event of the current run is kept so a client that connects mid-scan
+    first catches up and then follows live. Only one run is kept at a time.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._run = 0
+        self._events = []
+        self._running = False
+
+    @property
+    def running(self):
+        return self._running
+
+    def begin(self):
+        with self._cond:
+            self._run += 1
+            self._events = []
+            self._running = True
+            self._cond.notify_all()
+
+    def publish(self, event, data):
+        with self._cond:
+            if not self._running:
+                return  # scans run outside the scheduler have no listeners
+            self._events.append((event, data))
+            self._cond.notify_all()
+
+    def finish(self, data):
+        with self._cond:
+            if not self._running:
+                return
+            self._events.append(('done', data))
+            self._running = False
+            self._cond.notify_all()
+
+    def follow(self, heartbeat=HEARTBEAT_SECONDS):
+        """Yield (event, data) for the current run from its start until it finishes.
+
+        Yields None after `heartbeat` seconds without an event so callers can
+        keep the connection alive. Returns immediately when no run is active.
+        """
+        with self._cond:
+            if not self._running:
+                return
+            run = self._run
+        position = 0
+        while True:
+            with self._cond:
+                if self._run != run:
+                    return
+                if position == len(self._events):
+                    if not self._running:
+                        return
+                    self._cond.wait(heartbeat)
+                pending = self._events[position:]
+                position += len(pending)
+            if not pending:
+                yield None
+            for item in pending:
+                yield item
+
+
+def format_sse(event, data, event_id=None):
+    if event is None:
+        return ': keep-alive\n\n'
+    if event_id is not None:
+        return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n'
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def format_ndjson(event, data, event_id=None):
+    if event is None:
+        return '\n'
+    if event_id is not None:
+        return json.dumps({'event': event, 'id': event_id, **data}) + '\n'
+    return json.dumps({'event': event, **data}) + '\n'
@@ -0,0 +1,306 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import metrics
+from snapshot_store import MemorySnapshotStore
+from trading_calendar import is_market_open
+
+logger = logging.getLogger(__name__)
+
+SCAN_RUNS = metrics.counter('scan_runs_total', 'Completed scan runs by outcome', ('outcome',))
+SCAN_DURATION_SECONDS = metrics.histogram('scan_duration_seconds', 'Wall time of whole scan runs, index included')
+SCAN_RESULTS = metrics.gauge('scan_results', 'Result rows in the latest published snapshot')
+SNAPSHOT_VERSION = metrics.gauge('scan_snapshot_version', 'Version of the latest published snapshot')
+SNAPSHOTS_ADOPTED = metrics.counter('scan_snapshots_adopted_total', 'Snapshots loaded from another worker\'s scan')
+
+# A scheduled scan is skipped while the shared snapshot is younger than this
+# fraction of the interval, so workers whose timers fire at different times
+# still scan about once per interval between them, and a restart does not
+# rescan right after restoring a recent snapshot
+FRESH_FRACTION = 0.9
+
+
+class ScanLeaseLost(Exception):
+    """Raised when another worker took the scan lease while this one was still scanning."""
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Immutable result of one completed scan run (results is the ResultTable from scan_stocks)."""
+    version: int
+    results: object
+    started_at: datetime
+    completed_at: datetime
+    index: object = None
+
+    @property
+    def duration_seconds(self):
+        return (self.completed_at - self.started_at).total_seconds()
+
+    def age_seconds(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        return max(0.0, (now - self.completed_at).total_seconds())
+
+
+class ScanScheduler:
+    """Run a scan function in the background and publish each run as a Snapshot.
+
+    Readers only ever see a fully built snapshot: the reference is swapped
+    atomically once a run completes, and a failed run keeps the previous one.
+    Only one scan runs at a time per process, and with a shared store only
+    the holder of the store's scan lease scans; other workers adopt the
+    snapshots it publishes (checked at most every poll_interval seconds).
+    on_publish(snapshot), if given, is called after each scan this process
+    publishes, e.g. to persist it; on_snapshot(snapshot) whenever a newer
+    snapshot becomes current, whether scanned, adopted or restored.
+    """
+
+    def __init__(self, scan_fn, interval=300, off_hours_interval=3600, index_fn=None, history=5, events=None,
+                 store=None, lease_seconds=900, poll_interval=5, on_publish=None,
+                 on_snapshot=None):
+        self.scan_fn = scan_fn
+        self.interval = interval
+        self.off_hours_interval = off_hours_interval
+        self.index_fn = index_fn
+        self.history = history
+        self.events = events
+        self.store = store or MemorySnapshotStore(history)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.on_publish = on_publish
+        self.on_snapshot = on_snapshot
+        self.owner = f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._snapshot = None
+        self._snapshots = OrderedDict()
+        self._scanning = False
+        self._refresh_requested = False
+        self._run_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._synced_at = 0.0
+        self._lease_renewed_at = 0.0
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def snapshot(self):
+        self.sync()
+        return self._snapshot
+
+    def get(self, version):
+        """A recently published snapshot by version, or None once it has been evicted."""
+        snapshot = self._snapshots.get(version)
+        if snapshot is None and self.store.shared:
+            stored = self.store.load(version)
+            if stored is not None:
+                snapshot = self._remember(self._build(version, *stored))
+        return snapshot
+
+    @property
+    def scanning(self):
+        return self._scanning
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._loop, name='scan-scheduler', daemon=True)
+        self._thread.start()
+        logger.info(f'Scan scheduler started (interval={self.interval}s, off-hours={self.off_hours_interval}s)')
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def refresh(self):
+        """Request a new run without waiting for it. Returns False if one is already running."""
+        if self._scanning:
+            return False
+        self._refresh_requested = True
+        self._wakeup.set()
+        return True
+
+    def next_delay(self, now=None):
+        return self.interval if is_market_open(now) else self.off_hours_interval
+
+    def sync(self, force=False):
+        """Adopt a newer snapshot published to a shared store by another worker.
+
+        Readers call this through .snapshot; it queries the store at most
+        every poll_interval seconds and never blocks on a load in progress.
+        """
+        if not self.store.shared:
+            return
+        now = time.monotonic()
+        if not force and now - self._synced_at < self.poll_interval:
+            return
+        if not self._sync_lock.acquire(blocking=force):
+            return
+        try:
+            self._synced_at = now
+            latest = self.store.latest_version()
+            if latest and (self._snapshot is None or latest > self._snapshot.version):
+                stored = self.store.load(latest)
+                if stored is not None:
+                    self._set_current(self._remember(self._build(latest, *stored)))
+                    SNAPSHOTS_ADOPTED.inc()
+                    logger.info(f'Loaded snapshot v{latest} published by another worker')
+        except Exception as e:
+            logger.error(f'Could not load the latest shared snapshot: {str(e)}')
+        finally:
+            self._sync_lock.release()
+
+    def run_once(self):
+        """Run one scan synchronously and publish it. Returns the new snapshot or None.
+
+        Returns None without scanning when this process is already scanning
+        or another worker holds the scan lease.
+        """
+        if not self._run_lock.acquire(blocking=False):
+            logger.info('A scan is already running in this process')
+            return None
+        try:
+            if not self.store.acquire_lease(self.owner, self.lease_seconds):
+                logger.info('Another worker holds the scan lease, using its snapshots')
+                SCAN_RUNS.inc(outcome='skipped')
+                self.sync(force=True)
+                return None
+            self._lease_renewed_at = time.monotonic()
+            try:
+                return self._run()
+            finally:
+                self.store.release_lease(self.owner)
+        finally:
+            self._run_lock.release()
+
+    def keep_lease(self):
+        """Extend the scan lease from a running scan's progress path, at most every third of lease_seconds.
+
+        A scan that outlives lease_seconds would otherwise let another worker
+        start a duplicate one. Raises ScanLeaseLost if another worker holds
+        the lease by now; does nothing when no scan is running.
+        """
+        if not self._scanning or time.monotonic() - self._lease_renewed_at < self.lease_seconds / 3:
+            return
+        if not self.store.acquire_lease(self.owner, self.lease_seconds):
+            raise ScanLeaseLost('Another worker took the scan lease during the scan')
+        self._lease_renewed_at = time.monotonic()
+
+    def _run(self):
+        self._scanning = True
+        started_at = datetime.now(timezone.utc)
+        if self.events:
+            self.events.begin()
+        try:
+            results = self.scan_fn()
+            if self.index_fn:
+                with metrics.SCAN_STAGE_SECONDS.time(stage='index'):
+                    index = self.index_fn(results)
+            else:
+                index = None
+            completed_at = datetime.now(timezone.utc)
+            # Only the lease holder publishes, so a scan that lost it mid-run is discarded
+            if not self.store.acquire_lease(self.owner, self.lease_seconds):
+                raise ScanLeaseLost('Another worker took the scan lease during the scan')
+            version = self.store.publish(results, started_at, completed_at)
+        except ScanLeaseLost as e:
+            logger.warning(f'{str(e)}, discarding this run and using its snapshots')
+            SCAN_RUNS.inc(outcome='lease_lost')
+            if self.events:
+                self.events.finish({'ok': False, 'error': str(e), 'snapshot_version': None})
+            self.sync(force=True)
+            return None
+        except Exception as e:
+            current = self._snapshot.version if self._snapshot else 0
+            logger.error(f'Scan run failed, keeping snapshot v{current}: {str(e)}')
+            SCAN_RUNS.inc(outcome='failed')
+            if self.events:
+                self.events.finish({'ok': False, 'error': str(e), 'snapshot_version': current or None})
+            return None
+        finally:
+            self._scanning = False
+
+        snapshot = self._remember(Snapshot(
+            version=version,
+            results=results,
+            started_at=started_at,
+            completed_at=completed_at,
+            index=index
+        ))
+        self._set_current(snapshot)
+        SCAN_RUNS.inc(outcome='ok')
+        SCAN_DURATION_SECONDS.observe(snapshot.duration_seconds)
+        if self.on_publish:
+            try:
+                self.on_publish(snapshot)
+            except Exception as e:
+                logger.error(f'Publish hook failed for snapshot v{snapshot.version}: {str(e)}')
+        if self.events:
+            self.events.finish({'ok': True, 'snapshot_version': snapshot.version, 'total': len(results)})
+        logger.info(f'Published snapshot v{snapshot.version} with {len(snapshot.results)} results '
+                    f'in {snapshot.duration_seconds:.1f}s')
+        return snapshot
+
+    def restore(self, results, started_at, completed_at):
+        """Publish results recovered from elsewhere (e.g. persisted before a restart) if newer than ours.
+
+        Returns the snapshot, or None when the current one is at least as recent.
+        """
+        self.sync(force=True)
+        if self._snapshot and self._snapshot.completed_at >= completed_at:
+            return None
+        version = self.store.publish(results, started_at, completed_at)
+        snapshot = self._remember(self._build(version, results, started_at, completed_at))
+        self._set_current(snapshot)
+        logger.info(f'Restored snapshot from {completed_at.isoformat()} as v{version}')
+        return snapshot
+
+    def _build(self, version, results, started_at, completed_at):
+        index = self.index_fn(results) if self.index_fn else None
+        return Snapshot(version=version, results=results, started_at=started_at, completed_at=completed_at,
+                        index=index)
+
+    def _remember(self, snapshot):
+        self._snapshots[snapshot.version] = snapshot
+        while len(self._snapshots) > self.history:
+            del self._snapshots[min(self._snapshots)]
+        return snapshot
+
+    def _set_current(self, snapshot):
+        if self._snapshot is None or snapshot.version > self._snapshot.version:
+            self._snapshot = snapshot
+            SCAN_RESULTS.set(len(snapshot.results))
+            SNAPSHOT_VERSION.set(snapshot.version)
+            if self.on_snapshot:
+                try:
+                    self.on_snapshot(snapshot)
+                except Exception as e:
+                    logger.error(f'Snapshot hook failed for snapshot v{snapshot.version}: {str(e)}')
+
+    def _due(self):
+        """Whether a scheduled run should scan, rather than keep a snapshot another worker just published
+        or one restored at startup."""
+        if self._refresh_requested:
+            return True
+        self.sync(force=True)
+        snapshot = self._snapshot
+        return snapshot is None or snapshot.age_seconds() >= FRESH_FRACTION * self.next_delay()
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            if self._due():
+                self._refresh_requested = False
+                self.run_once()
+            delay = self.next_delay()
+            logger.info(f'Next scan in {delay}s')
+            self._wakeup.wait(delay)
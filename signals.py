@@ -0,0 +1,124 @@
+import numpy as np
+
+from result_table import FLAG_BITS, ResultTable
+
+# A bar only counts as a signal when it trades more than this many shares
+MIN_VOLUME = 1000000
+
+# EMA (fast, slow) window pairs scanned when none are configured
+DEFAULT_PAIRS = ((8, 21),)
+
+
+def parse_pairs(spec):
+    """Parse 'fast/slow,fast/slow' into ((fast, slow), ...); raises ValueError on bad input."""
+    pairs = []
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        fast, slow = (int(w) for w in item.split('/'))
+        if not 0 < fast < slow:
+            raise ValueError(f'EMA pair {item.strip()!r} must be fast/slow with 0 < fast < slow')
+        if (fast, slow) not in pairs:
+            pairs.append((fast, slow))
+    if not pairs:
+        raise ValueError('At least one EMA pair is required')
+    return tuple(pairs)
+
+
+def pair_windows(pairs):
+    """Distinct EMA windows needed by pairs, ascending."""
+    return tuple(sorted({w for pair in pairs for w in pair}))
+
+
+def compute_signals(frames, pairs=DEFAULT_PAIRS, min_volume=MIN_VOLUME, timeframes=()):
+    """Evaluate the crossover rule for every bar of every ticker at once.
+
+    frames is an iterable of (ticker, df) pairs where df is newest-first with
+    Date, Price, Volume and an EMA<window> column per window of pairs, as
+    returned by fetch_stock_data, plus the timeframe columns described in
+    signals_from_long for each of timeframes. Each output row is a bar together with the
+    two bars preceding it; bars without two predecessors are dropped, as in
+    the original scan loop.
+    """
+    import pandas as pd
+    parts = [df.assign(symbol=ticker) for ticker, df in frames if len(df) >= 3]
+    if not parts:
+        return ResultTable.empty(pairs, timeframes)
+    return signals_from_long(pd.concat(parts, ignore_index=True), pairs, min_volume, timeframes)
+
+
+def _as_days(column):
+    values = column.to_numpy()
+    if values.dtype == object:
+        values = np.array(values.tolist(), dtype='datetime64[D]')
+    return values.astype('datetime64[D]')
+
+
+def signals_from_long(data, pairs=DEFAULT_PAIRS, min_volume=MIN_VOLUME, timeframes=()):
+    """Vectorized crossover rule over a long frame of contiguous, newest-first ticker blocks.
+
+    data has symbol, Date, Price, Volume and an EMA<window> column per
+    window of pairs. EMAs are stacked into one windows x bars matrix and the
+    flags of every pair come out of a single pairs x rows comparison, so the
+    cost grows with the number of distinct windows rather than pairs.
+    Each higher timeframe tf (see timeframes.py) also has EMA<window>@<tf>
+    and FLAGS<fast>/<slow>@<tf> columns, carried over as they are.
+    Returns a ResultTable in input order.
+    """
+    import pandas as pd
+    windows = pair_windows(pairs)
+    if data.empty:
+        return ResultTable.empty(pairs, timeframes)
+
+    # Row i's yesterday is i + 1 and day before is i + 2, within the same ticker
+    symbols = data['symbol'].to_numpy()
+    valid = np.zeros(len(data), dtype=bool)
+    valid[:-2] = symbols[:-2] == symbols[2:]
+    today = np.flatnonzero(valid)
+    yesterday = today + 1
+    day_before = today + 2
+
+    emas = np.stack([data[f'EMA{w}'].to_numpy(dtype=float) for w in windows])
+    fast = [windows.index(f) for f, _ in pairs]
+    slow = [windows.index(s) for _, s in pairs]
+    # Sign of fast - slow is the sign of the comparison; NaN compares false either way
+    diff = emas[fast] - emas[slow]
+    above = diff > 0
+    below = diff < 0
+    at_or_below = diff <= 0
+    at_or_above = diff >= 0
+
+    flags = {
+        'today_up': above[:, today] & at_or_below[:, yesterday],
+        'today_down': below[:, today] & at_or_above[:, yesterday],
+        'yesterday_up': above[:, yesterday] & at_or_below[:, day_before],
+        'yesterday_down': below[:, yesterday] & at_or_above[:, day_before],
+    }
+    crossover = flags['today_up'] | flags['today_down'] | flags['yesterday_up'] | flags['yesterday_down']
+    volumes = data['Volume'].to_numpy(dtype=float)
+    flags['matched'] = (volumes[today] > min_volume) & crossover
+
+    row_flags = np.zeros((len(pairs), len(today)), dtype=np.uint8)
+    for name, bit in FLAG_BITS.items():
+        row_flags[flags[name]] |= bit
+
+    tf_emas = np.array([[data[f'EMA{w}@{tf}'].to_numpy(dtype=float) for w in windows] for tf in timeframes])
+    tf_flags = np.array([[data[f'FLAGS{f}/{s}@{tf}'].to_numpy(dtype=np.uint8)[today] for f, s in pairs]
+                         for tf in timeframes])
+
+    codes, names = pd.factorize(symbols)
+    return ResultTable(
+        symbols=names,
+        bar_symbol=codes,
+        date=_as_days(data['Date']),
+        price=data['Price'].to_numpy(dtype=float),
+        volume=volumes,
+        windows=windows,
+        emas=emas,
+        pairs=pairs,
+        row_bar=today,
+        row_flags=row_flags,
+        timeframes=timeframes,
+        tf_emas=tf_emas if timeframes else None,
+        tf_flags=tf_flags if timeframes else None
+    )
@@ -0,0 +1,151 @@
+"""Published scan snapshots and the scan lease, shared between workers.
+
+Every gunicorn worker (and every instance) runs a ScanScheduler. Only the
+holder of the scan lease scans; the others load the snapshots it publishes
+here, so Polygon is queried once however many processes serve /scan.
+
+MemorySnapshotStore keeps everything in the current process (the default,
+one worker). SQLiteSnapshotStore shares a SQLite file between processes on
+one host or on a volume mounted by several instances. Another backend only
+needs the same five methods.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from result_table import ResultTable
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = 'scan'
+
+
+class MemorySnapshotStore:
+    """Snapshots and scan lease for a single process."""
+
+    shared = False
+
+    def __init__(self, history=5):
+        self.history = history
+        self._snapshots = {}
+        self._lease = None
+        self._lock = threading.Lock()
+
+    def acquire_lease(self, owner, ttl):
+        """Take (or renew) the scan lease for ttl seconds unless someone else holds it."""
+        now = time.time()
+        with self._lock:
+            if self._lease and self._lease[0] != owner and self._lease[1] > now:
+                return False
+            self._lease = (owner, now + ttl)
+            return True
+
+    def release_lease(self, owner):
+        with self._lock:
+            if self._lease and self._lease[0] == owner:
+                self._lease = None
+
+    def publish(self, results, started_at, completed_at):
+        """Store a completed scan and return its version."""
+        with self._lock:
+            version = max(self._snapshots, default=0) + 1
+            self._snapshots[version] = (results, started_at, completed_at)
+            for old in [v for v in self._snapshots if v <= version - self.history]:
+                del self._snapshots[old]
+            return version
+
+    def latest_version(self):
+        with self._lock:
+            return max(self._snapshots, default=None)
+
+    def load(self, version):
+        """(results, started_at, completed_at) of a stored version, or None once evicted."""
+        with self._lock:
+            return self._snapshots.get(version)
+
+
+class SQLiteSnapshotStore:
+    """Snapshots and scan lease in a SQLite file shared by several processes.
+
+    Results are stored as ResultTable.to_bytes() payloads; the newest
+    `history` versions are kept. Each thread uses its own connection.
+    """
+
+    shared = True
+
+    def __init__(self, path, history=5):
+        self.path = path
+        self.history = history
+        self._local = threading.local()
+        with self._transaction() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS snapshots (version INTEGER PRIMARY KEY, started_at TEXT, '
+                       'completed_at TEXT, results BLOB)')
+            db.execute('CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT, expires_at REAL)')
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connect()
+        # IMMEDIATE takes the write lock up front so read-then-write steps cannot interleave
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def acquire_lease(self, owner, ttl):
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute('SELECT owner, expires_at FROM leases WHERE name = ?', (LEASE_NAME,)).fetchone()
+            if row and row[0] != owner and row[1] > now:
+                return False
+            db.execute('INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)',
+                       (LEASE_NAME, owner, now + ttl))
+            return True
+
+    def release_lease(self, owner):
+        with self._transaction() as db:
+            db.execute('DELETE FROM leases WHERE name = ? AND owner = ?', (LEASE_NAME, owner))
+
+    def publish(self, results, started_at, completed_at):
+        payload = results.to_bytes()
+        with self._transaction() as db:
+            version = db.execute('SELECT COALESCE(MAX(version), 0) + 1 FROM snapshots').fetchone()[0]
+            db.execute('INSERT INTO snapshots (version, started_at, completed_at, results) VALUES (?, ?, ?, ?)',
+                       (version, started_at.isoformat(), completed_at.isoformat(), payload))
+            db.execute('DELETE FROM snapshots WHERE version <= ?', (version - self.history,))
+        return version
+
+    def latest_version(self):
+        return self._connect().execute('SELECT MAX(version) FROM snapshots').fetchone()[0]
+
+    def load(self, version):
+        row = self._connect().execute('SELECT started_at, completed_at, results FROM snapshots WHERE version = ?',
+                                      (version,)).fetchone()
+        if row is None:
+            return None
+        return ResultTable.from_bytes(row[2]), datetime.fromisoformat(row[0]), datetime.fromisoformat(row[1])
+
+
+def open_snapshot_store(spec, history=5):
+    """Store from a SNAPSHOT_STORE value: 'memory' or 'sqlite:///path/to/file.db'."""
+    if not spec or spec == 'memory':
+        return MemorySnapshotStore(history)
+    if spec.startswith('sqlite:'):
+        path = spec[len('sqlite:'):]
+        if path.startswith('//'):
+            path = path[2:]
+        logger.info(f'Sharing scan snapshots through {path}')
+        return SQLiteSnapshotStore(path, history)
+    raise ValueError(f"Unknown snapshot store {spec!r}; use 'memory' or 'sqlite:///path'")
@@ -0,0 +1,59 @@
+"""Record Polygon EMA parity fixtures for tests/test_indicators.py.
+
+Saves the daily closes from get_aggs (covering the warm-up) and Polygon's
+own get_ema values for the same tickers and days, ending at the session
+before today unless --end is given:
+
+    POLYGON_API_KEY=... python tests/record_polygon_ema.py SPY NVDA
+    POLYGON_API_KEY=... python tests/record_polygon_ema.py SPY --end 2024-06-28
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+from polygon import RESTClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indicators import warmup_calendar_days
+from trading_calendar import previous_trading_day
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'polygon_ema')
+WINDOWS = (8, 21)
+# Sessions of Polygon EMA values recorded per window
+COMPARED = 120
+
+
+def record(ticker, end):
+    client = RESTClient(os.environ['POLYGON_API_KEY'])
+    # The compared sessions, preceded by the warm-up the scanner fetches
+    start = end - timedelta(days=int(COMPARED * 365 / 252) + 10 + warmup_calendar_days(max(WINDOWS)))
+    aggs = client.get_aggs(ticker=ticker, multiplier=1, timespan='day', from_=start.isoformat(), to=end.isoformat(),
+                           adjusted=True, limit=50000)
+    emas = {}
+    for window in WINDOWS:
+        result = client.get_ema(ticker=ticker, timespan='day', adjusted=True, window=window, series_type='close',
+                                order='desc', limit=COMPARED, timestamp_lte=end.isoformat())
+        emas[str(window)] = [{'timestamp': v.timestamp, 'value': v.value} for v in result.values]
+    fixture = {
+        'ticker': ticker,
+        'end': end.isoformat(),
+        'aggs': [{'timestamp': a.timestamp, 'close': a.close} for a in aggs],
+        'ema': emas,
+    }
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    path = os.path.join(FIXTURE_DIR, f'{ticker}-{end.isoformat()}.json')
+    with open(path, 'w') as f:
+        json.dump(fixture, f, indent=1)
+    print(f'Wrote {path}: {len(fixture["aggs"])} bars')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record Polygon EMA parity fixtures')
+    parser.add_argument('tickers', nargs='*', default=['SPY', 'NVDA'])
+    parser.add_argument('--end', type=date.fromisoformat, help='last session recorded (default: the one before today)')
+    args = parser.parse_args()
+    for ticker in args.tickers:
+        record(ticker.upper(), args.end or previous_trading_day(date.today()))
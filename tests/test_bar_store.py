@@ -0,0 +1,61 @@
+from datetime import date, datetime
+
+import numpy as np
+
+from bar_store import BAR_DTYPE, BarStore
+from trading_calendar import EASTERN, trading_days
+
+
+class FakeSource:
+    """Daily bars where one session's close can change while it is trading."""
+
+    def __init__(self):
+        self.closes = {}
+        self.calls = []
+
+    def fetch(self, from_, to):
+        self.calls.append((from_, to))
+        days = trading_days(from_, to)
+        bars = np.zeros(len(days), dtype=BAR_DTYPE)
+        bars['date'] = np.array(days, dtype='datetime64[D]')
+        bars['close'] = [self.closes.get(d, 50.0) for d in days]
+        return bars
+
+
+def at(*args):
+    return EASTERN.localize(datetime(*args))
+
+
+def test_session_in_progress_is_refetched_until_it_closes(tmp_path):
+    store, source = BarStore(str(tmp_path)), FakeSource()
+    start, today = date(2026, 1, 2), date(2026, 10, 16)
+
+    source.closes[today] = 100.0
+    assert store.sync('X', source.fetch, start, today, now=at(2026, 10, 16, 10))['close'][-1] == 100.0
+    source.closes[today] = 105.0
+    assert store.sync('X', source.fetch, start, today, now=at(2026, 10, 16, 11))['close'][-1] == 105.0
+    # Refetched from the last final bar, not the whole history
+    assert source.calls[-1] == (date(2026, 10, 15), today)
+
+    source.closes[today] = 106.0
+    store.sync('X', source.fetch, start, today, now=at(2026, 10, 16, 16, 30))
+    fetches = len(source.calls)
+    assert store.sync('X', source.fetch, start, today, now=at(2026, 10, 16, 17))['close'][-1] == 106.0
+    assert len(source.calls) == fetches
+
+    # The next session appends without mistaking the earlier partial bar for a restatement
+    store.sync('X', source.fetch, start, date(2026, 10, 19), now=at(2026, 10, 19, 10))
+    assert source.calls[-1] == (today, date(2026, 10, 19))
+    assert len(source.calls) == fetches + 1
+
+
+def test_history_trimmed_to_max_bars_is_not_refetched(tmp_path):
+    store, source = BarStore(str(tmp_path), max_bars=60), FakeSource()
+    start = date(2025, 1, 2)
+
+    store.sync('X', source.fetch, start, date(2026, 10, 14), now=at(2026, 10, 14, 17))
+    assert store.read('X').size == 60
+    # Coverage starts at the first kept bar, after `start`, yet later sessions only fetch what is new
+    store.sync('X', source.fetch, start, date(2026, 10, 15), now=at(2026, 10, 15, 17))
+    store.sync('X', source.fetch, start, date(2026, 10, 16), now=at(2026, 10, 16, 17))
+    assert source.calls[1:] == [(date(2026, 10, 14), date(2026, 10, 15)), (date(2026, 10, 15), date(2026, 10, 16))]
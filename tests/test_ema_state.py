@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from ema_state import EmaStateStore
+from indicators import ema
+
+
+def test_session_in_progress_does_not_force_a_recompute(tmp_path):
+    store = EmaStateStore(str(tmp_path))
+    dates = np.arange(np.datetime64('2026-01-02'), np.datetime64('2026-10-17'))
+    closes = 100 + np.cumsum(np.random.default_rng(0).normal(0, 1, dates.size))
+    today = dates[-1]
+
+    _, recomputed = store.update('X', dates, closes, (8, 21), tail=20, pairs=((8, 21),), provisional=today)
+    assert recomputed
+    # The next scan in the same session sees a different close for today
+    closes[-1] += 2.5
+    values, recomputed = store.update('X', dates, closes, (8, 21), tail=20, pairs=((8, 21),), provisional=today)
+    assert recomputed is False
+    for window in (8, 21):
+        np.testing.assert_allclose(values[window], ema(closes, window)[-20:], rtol=1e-9)
+
+    # Once the session closes the bar is final and extends the stored state
+    values, recomputed = store.update('X', dates, closes, (8, 21), tail=20, pairs=((8, 21),))
+    assert recomputed is False
+    assert store.get('X')['last_close'] == pytest.approx(closes[-1])
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+from polygon.exceptions import BadResponse
+
+from fetcher import CircuitBreaker, CircuitOpenError, RateLimitedClient, RetryPolicy, TokenBucket, error_status
+
+
+class FlakyClient:
+    """Raises the queued errors in order, then returns 'ok'."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def get_aggs(self, ticker):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+def rate_limited(retry_after):
+    error = BadResponse('{"status":"ERROR","error":"You\'ve exceeded the maximum requests per minute."}')
+    error.retry_after = retry_after
+    return error
+
+
+def proxy(client, breaker=None):
+    return RateLimitedClient(client, TokenBucket(0), RetryPolicy(3, base=0.0, cap=5, rng=random.Random(0)), breaker)
+
+
+def test_429_is_retried_after_retry_after(monkeypatch):
+    waits = []
+    monkeypatch.setattr('fetcher.time.sleep', waits.append)
+    client = FlakyClient(rate_limited(2))
+    assert proxy(client).get_aggs('X') == 'ok'
+    assert client.calls == 2
+    assert waits == [2.0]
+
+
+@pytest.mark.parametrize('body', ['{"status":"NOT_FOUND","request_id":"a","message":"Ticker not found."}',
+                                  '{"status":"NOT_AUTHORIZED","request_id":"b","message":"Not entitled."}'])
+def test_client_errors_are_not_retried_or_counted_by_the_breaker(monkeypatch, body):
+    monkeypatch.setattr('fetcher.time.sleep', lambda seconds: pytest.fail('client errors must not be retried'))
+    assert error_status(BadResponse(body)) == 'client_error'
+    breaker = CircuitBreaker(failure_threshold=2)
+    for _ in range(3):
+        client = FlakyClient(BadResponse(body))
+        with pytest.raises(BadResponse):
+            proxy(client, breaker).get_aggs('DELISTED')
+        assert client.calls == 1
+    assert breaker.state == 'closed'
+
+
+def test_server_errors_still_open_the_breaker(monkeypatch):
+    monkeypatch.setattr('fetcher.time.sleep', lambda seconds: None)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    client = FlakyClient(*[BadResponse('{"status":"ERROR","error":"Internal server error"}')] * 3)
+    # The third attempt is refused once two failures have opened the circuit
+    with pytest.raises(CircuitOpenError):
+        proxy(client, breaker).get_aggs('X')
+    assert client.calls == 2
+    assert breaker.state == 'open'
@@ -0,0 +1,42 @@
+import glob
+import json
+import os
+
+import numpy as np
+import pytest
+
+from indicators import ema, warmup_bars
+
+FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), 'fixtures', 'polygon_ema', '*.json')))
+
+
+@pytest.mark.parametrize('path', FIXTURES or [None], ids=lambda p: os.path.basename(p) if p else 'none')
+def test_ema_matches_recorded_polygon_values(path):
+    if path is None:
+        pytest.skip('no Polygon EMA fixtures recorded; run tests/record_polygon_ema.py with POLYGON_API_KEY')
+    with open(path) as f:
+        fixture = json.load(f)
+    timestamps = np.array([bar['timestamp'] for bar in fixture['aggs']])
+    closes = np.array([bar['close'] for bar in fixture['aggs']])
+    for window, values in fixture['ema'].items():
+        local = ema(closes, int(window))
+        compared = 0
+        for value in values:
+            position = np.searchsorted(timestamps, value['timestamp'])
+            assert timestamps[position] == value['timestamp']
+            if position < warmup_bars(int(window)):
+                continue  # not converged yet; the scanner never reports these bars
+            assert local[position] == pytest.approx(value['value'], abs=0.005)
+            compared += 1
+        assert compared > 0
+
+
+def test_warmup_converges_to_full_history():
+    rng = np.random.default_rng(0)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 3000)))
+    for window in (8, 21, 50):
+        full = ema(closes, window)
+        # Seeded warmup_bars before the last 30 bars, as fetch_stock_data does
+        start = len(closes) - 30 - warmup_bars(window)
+        warmed = ema(closes[start:], window)
+        np.testing.assert_allclose(warmed[-30:], full[-30:], rtol=1e-6)
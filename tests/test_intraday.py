@@ -0,0 +1,140 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from indicators import ema
+from intraday import MINUTE_MS, IntradayEngine, IntradayFeed, IntradayStream, parse_timeframes
+
+SYMBOLS = [f'SYN{i:03d}' for i in range(30)]
+MINUTES = 130
+PAIRS = ((3, 5),)
+
+
+def replay(server):
+    """Crossover records of the session fed straight into an engine, as the fake server sends it."""
+    engine = IntradayEngine(parse_timeframes('5m,15m'), PAIRS, min_volume=100000)
+    events = []
+    for start, opens, highs, lows, closes, volumes in server.bars(SYMBOLS):
+        for minute in zip(SYMBOLS, opens.tolist(), highs.tolist(), lows.tolist(), closes.tolist(),
+                          volumes.tolist()):
+            symbol, o, h, l, c, v = minute
+            events += engine.add_minute(symbol, start, round(o, 4), round(h, 4), round(l, 4), round(c, 4), int(v))
+    return engine, events
+
+
+def test_stream_closes_bars_and_pushes_crossovers():
+    pytest.importorskip('websockets')
+    from fake_polygon_ws import FakePolygonWebSocket
+    server = FakePolygonWebSocket(SYMBOLS, minutes=MINUTES, minute_interval=0.002)
+    expected_engine, expected = replay(server)
+    assert expected, 'the replayed session should have crossovers'
+
+    url = server.start()
+    feed = IntradayFeed(maxlen=10000)
+    engine = IntradayEngine(parse_timeframes('5m,15m'), PAIRS, min_volume=100000, feed=feed)
+    stream = IntradayStream(engine, 'fake-key', ['*'], feed=url)
+    stream.start()
+    try:
+        assert server.done.wait(30)
+        deadline = time.monotonic() + 10
+        while feed.next_id < len(expected) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        stream.stop(5)
+        server.stop()
+
+    received = []
+    for item in feed.follow(since=0, heartbeat=0.01):
+        if item is None:
+            break
+        received.append(item[2])
+    assert [(e['symbol'], e['timeframe'], e['start']) for e in received] == \
+           [(e['symbol'], e['timeframe'], e['start']) for e in expected]
+    assert received == expected
+
+    # Every symbol's last 5 minute bar closed, with EMAs matching ones computed over all its closes
+    closes = {symbol: [] for symbol in SYMBOLS}
+    for start, _, _, _, minute_closes, _ in server.bars(SYMBOLS):
+        if (start // 60000) % 5 == 4:
+            for symbol, close in zip(SYMBOLS, minute_closes.tolist()):
+                closes[symbol].append(round(close, 4))
+    latest = engine.latest(5)
+    assert [record['symbol'] for record in latest] == SYMBOLS
+    for record in latest:
+        assert record['ema3'] == pytest.approx(ema(np.array(closes[record['symbol']]), 3)[-1], abs=0.006)
+        assert record['ema5'] == pytest.approx(ema(np.array(closes[record['symbol']]), 5)[-1], abs=0.006)
+    assert latest == expected_engine.latest(5)
+
+
+# A 5 minute bar boundary, in epoch ms
+SESSION_MS = 1_760_016_600_000
+WARMUP_CLOSES = 100 + np.cumsum(np.random.default_rng(3).normal(0, 0.4, 300)).round(2)
+
+
+def stream_bars(engine, closes, first=0):
+    """Stream each close as a 5 minute bar of five flat minutes; returns the crossover records."""
+    events = []
+    for i, close in enumerate(closes, first):
+        for minute in range(5):
+            events += engine.add_minute('X', SESSION_MS + (i * 5 + minute) * MINUTE_MS, close, close, close, close,
+                                        1000)
+    return events
+
+
+def expected_crossovers(closes, first):
+    """(bar start, direction) of the 8/21 crossovers at or after position first of the full series."""
+    diff = ema(closes, 8) - ema(closes, 21)
+    crosses = []
+    for k in range(max(first, 1), len(closes)):
+        if (diff[k] > 0 >= diff[k - 1]) or (diff[k] < 0 <= diff[k - 1]):
+            start = datetime.fromtimestamp((SESSION_MS + (k - first) * 5 * MINUTE_MS) / 1000, timezone.utc)
+            crosses.append((start.isoformat(), 'up' if diff[k] > 0 else 'down'))
+    return crosses
+
+
+def test_emas_warm_up_from_history():
+    history, streamed = WARMUP_CLOSES[:210], WARMUP_CLOSES[210:]
+    calls = []
+
+    def history_fn(symbol, minutes, count, until):
+        calls.append((symbol, minutes, count, until))
+        return history[-count:].tolist()
+
+    engine = IntradayEngine((5,), ((8, 21),), min_volume=0, history_fn=history_fn, history_workers=0)
+    events = stream_bars(engine, streamed)
+    assert calls == [('X', 5, 210, SESSION_MS)]
+    # Crossovers from the first streamed bars on, at the bars the full history puts them
+    expected = expected_crossovers(WARMUP_CLOSES, len(history))
+    assert expected, 'the streamed bars should cross'
+    assert [(e['start'], e['direction']) for e in events] == expected
+    record = engine.latest(5)[0]
+    assert record['ema8'] == pytest.approx(ema(WARMUP_CLOSES, 8)[-1], abs=0.006)
+    assert record['ema21'] == pytest.approx(ema(WARMUP_CLOSES, 21)[-1], abs=0.006)
+
+
+def test_bars_closed_during_the_warm_up_fetch_are_replayed():
+    history, streamed = WARMUP_CLOSES[:210], WARMUP_CLOSES[210:]
+    release = threading.Event()
+
+    def history_fn(symbol, minutes, count, until):
+        release.wait(10)
+        return history[-count:].tolist()
+
+    engine = IntradayEngine((5,), ((8, 21),), min_volume=0, history_fn=history_fn, history_workers=1)
+    # No crossovers are reported from EMAs that have not seen the history yet
+    assert stream_bars(engine, streamed[:30]) == []
+    release.set()
+    deadline = time.monotonic() + 10
+    while engine._symbols['X'][0].pending is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    events = stream_bars(engine, streamed[30:], first=30)
+    resumed = datetime.fromtimestamp((SESSION_MS + 30 * 5 * MINUTE_MS) / 1000, timezone.utc).isoformat()
+    expected = [c for c in expected_crossovers(WARMUP_CLOSES, len(history)) if c[0] >= resumed]
+    assert expected, 'the bars after the warm-up should cross'
+    assert [(e['start'], e['direction']) for e in events] == expected
+    record = engine.latest(5)[0]
+    assert record['ema8'] == pytest.approx(ema(WARMUP_CLOSES, 8)[-1], abs=0.006)
+    assert record['ema21'] == pytest.approx(ema(WARMUP_CLOSES, 21)[-1], abs=0.006)
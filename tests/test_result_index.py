@@ -0,0 +1,31 @@
+import base64
+import json
+
+import pytest
+
+from result_index import decode_cursor, encode_cursor
+
+
+def _forge(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def test_cursor_round_trips_for_the_same_filters():
+    filters = {'matched': True}
+    assert decode_cursor(encode_cursor(7, 100, filters), filters) == (7, 100)
+    with pytest.raises(ValueError, match='different filters'):
+        decode_cursor(encode_cursor(7, 100, filters), {'matched': False})
+
+
+@pytest.mark.parametrize('cursor', ['not-base64!', _forge({'v': 7}), _forge([1, 2])])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(cursor, {})
+
+
+def test_negative_offset_is_rejected():
+    # Python slicing would page from the end of the results
+    cursor = json.loads(base64.urlsafe_b64decode(encode_cursor(7, 0, {}) + '=='))
+    cursor['o'] = -50
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(_forge(cursor), {})
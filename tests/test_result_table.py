@@ -0,0 +1,39 @@
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from signals import compute_signals
+
+
+def make_table():
+    rng = np.random.default_rng(0)
+    frames = []
+    for t in range(5):
+        dates = pd.bdate_range('2024-01-02', periods=40)[::-1]
+        price = np.round(rng.uniform(1, 500, 40), 3)  # many exact half cents
+        price[3] = np.nan
+        frames.append((f'T{t}', pd.DataFrame({
+            'Date': dates.date, 'Price': price, 'Volume': rng.integers(0, 5_000_000, 40).astype(float),
+            'EMA8': price + rng.normal(0, 1, 40), 'EMA21': price + rng.normal(0, 1, 40),
+            'EMA8@week': price + rng.normal(0, 1, 40), 'EMA21@week': price + rng.normal(0, 1, 40),
+            'FLAGS8/21@week': rng.integers(0, 16, 40).astype(np.uint8),
+        })))
+    return compute_signals(frames, [(8, 21)], timeframes=('week',))
+
+
+def test_records_json_matches_encoded_records():
+    table = make_table()
+    timestamp = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    for rows in (None, np.arange(0, len(table), 3), np.array([], dtype=np.int64)):
+        expected = json.dumps(table.records(rows, timestamp), sort_keys=True, separators=(',', ':'), default=str)
+        assert table.records_json(rows, timestamp, default=str) == expected
+
+
+def test_records_round_half_cents_like_python():
+    table = make_table()
+    records = table.records()
+    prices = table.price[table.row_bar]
+    for record, price in zip(records, np.nan_to_num(prices).tolist()):
+        assert record['price'] == round(price, 2)
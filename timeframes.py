@@ -0,0 +1,100 @@
+"""Weekly and monthly EMA signals resampled locally from daily bars.
+
+Daily bars are grouped into calendar weeks (starting Monday) or months. For
+each daily bar the higher timeframe is evaluated as of that session: the
+period's bar so far closes at that day's close, so the weekly EMA on a
+Wednesday is the previous week's EMA advanced by Wednesday's close. Values
+never look ahead, and on a period's last session they equal the completed
+bar's. Completed periods do not change, so their EMAs are kept in the
+EmaStateStore under '<ticker>@<timeframe>' and advance by one bar when a
+period completes instead of being recomputed every scan.
+"""
+import numpy as np
+
+from indicators import WARMUP_FACTOR
+from result_table import FLAG_BITS
+
+TIMEFRAMES = ('week', 'month')
+
+# Periods of history consumed per window before higher-timeframe EMAs are reported.
+# Fewer than the daily WARMUP_FACTOR: the seed's weight is already below 1e-3 after
+# 4 windows, and 10 monthly windows would need decades of daily bars.
+PERIOD_WARMUP_FACTOR = min(WARMUP_FACTOR, 4)
+
+# Calendar days per period, rounded up
+PERIOD_DAYS = {'week': 7, 'month': 31}
+
+
+def parse_timeframe_names(spec):
+    """Parse 'week,month' into known timeframe names in canonical order; '' is none."""
+    names = {item.strip().lower() for item in spec.split(',') if item.strip()}
+    unknown = names - set(TIMEFRAMES)
+    if unknown:
+        raise ValueError(f"Unknown timeframe {sorted(unknown)[0]!r}; use {', '.join(TIMEFRAMES)}")
+    return tuple(tf for tf in TIMEFRAMES if tf in names)
+
+
+def timeframe_warmup_days(window, timeframe):
+    """Calendar days of daily history covering the warm-up of a window in this timeframe."""
+    return (PERIOD_WARMUP_FACTOR * window + 1) * PERIOD_DAYS[timeframe]
+
+
+def period_ids(dates, timeframe):
+    """Period number of each datetime64[D] date; consecutive periods differ by one."""
+    if timeframe == 'week':
+        # 1970-01-01 was a Thursday, so shifting by 3 days makes weeks start on Monday
+        return (dates.astype('datetime64[D]').astype(np.int64) + 3) // 7
+    return dates.astype('datetime64[M]').astype(np.int64)
+
+
+def timeframe_signals(ticker, dates, closes, windows, pairs, timeframe, tail, states):
+    """EMAs and crossover flags of a higher timeframe as of each of the last `tail` daily bars.
+
+    dates (datetime64[D]) and closes are the ticker's oldest-first daily
+    history and states the EmaStateStore holding completed periods. Returns
+    (emas, flags): emas is windows x tail, flags is pairs x tail with the
+    FLAG_BITS crossover bits, today_* meaning a cross in the bar's own
+    period and yesterday_* one in the period before.
+    """
+    windows = list(windows)
+    tail = min(int(tail), len(dates))
+    ids = period_ids(dates, timeframe)
+    # The last session of every period but the latest, which is still open
+    ends = np.flatnonzero(ids[1:] != ids[:-1])
+    emas = np.full((len(windows), tail), np.nan)
+    flags = np.zeros((len(pairs), tail), dtype=np.uint8)
+    if tail == 0:
+        return emas, flags
+
+    shown = ids[-tail:]
+    # Bars in the first shown period need the two completed periods before it
+    needed = min(len(ends), int(np.count_nonzero(ids[ends] >= shown[0])) + 2)
+    completed = np.full((len(windows), needed), np.nan)
+    if needed:
+        values, _ = states.update(f'{ticker}@{timeframe}', dates[ends], closes[ends], windows, tail=needed,
+                                  pairs=pairs)
+        completed = np.stack([values[w] for w in windows])
+    # Position in `completed` of the last period before each bar's own, and of the one before that
+    previous = np.searchsorted(ids[ends[len(ends) - needed:]], shown) - 1
+    before = previous - 1
+
+    def at(positions):
+        out = np.full((len(windows), tail), np.nan)
+        valid = positions >= 0
+        out[:, valid] = completed[:, positions[valid]]
+        return out
+
+    last, second_last = at(previous), at(before)
+    alphas = np.array([2.0 / (w + 1) for w in windows])[:, None]
+    today = closes[-tail:][None, :]
+    # A ticker's first period has no EMA to advance yet, so it is seeded with the close
+    emas = np.where(np.isnan(last), today, last + alphas * (today - last))
+
+    for p, (fast, slow) in enumerate(pairs):
+        f, s = windows.index(fast), windows.index(slow)
+        now, prior, prior2 = emas[f] - emas[s], last[f] - last[s], second_last[f] - second_last[s]
+        flags[p][(now > 0) & (prior <= 0)] |= FLAG_BITS['today_up']
+        flags[p][(now < 0) & (prior >= 0)] |= FLAG_BITS['today_down']
+        flags[p][(prior > 0) & (prior2 <= 0)] |= FLAG_BITS['yesterday_up']
+        flags[p][(prior < 0) & (prior2 >= 0)] |= FLAG_BITS['yesterday_down']
+    return emas, flags
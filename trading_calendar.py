@@ -0,0 +1,190 @@
+import logging
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+EASTERN = pytz.timezone('US/Eastern')
+MARKET_OPEN = time(9, 30)
+MARKET_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+
+# One-off NYSE closures that do not follow the regular holiday rules
+SPECIAL_CLOSURES = {
+    date(2012, 10, 29), date(2012, 10, 30),  # Hurricane Sandy
+    date(2018, 12, 5),  # National day of mourning, George H.W. Bush
+    date(2025, 1, 9),  # National day of mourning, Jimmy Carter
+}
+
+
+def _easter(year):
+    """Gregorian Easter Sunday (anonymous algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _nth_weekday(year, month, weekday, n):
+    """The n-th given weekday of a month (n=-1 for the last one)."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(d):
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday."""
+    if d.weekday() == 5:
+        return d - timedelta(days=1)
+    if d.weekday() == 6:
+        return d + timedelta(days=1)
+    return d
+
+
+@lru_cache(maxsize=None)
+def nyse_holidays(year):
+    """Full-day NYSE closures for a calendar year."""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        _easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed(date(year, 7, 4)),  # Independence Day
+        _nth_weekday(year, 9, 0, 1),  # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _observed(date(year, 12, 25)),  # Christmas
+    }
+    # NYSE does not observe New Year's Day on the prior Friday when it falls on a Saturday
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    holidays.update(d for d in SPECIAL_CLOSURES if d.year == year)
+    return frozenset(holidays)
+
+
+@lru_cache(maxsize=None)
+def nyse_early_closes(year):
+    """Half-day sessions (13:00 ET close) for a calendar year."""
+    early = {_nth_weekday(year, 11, 3, 4) + timedelta(days=1)}  # Day after Thanksgiving
+    for d in (date(year, 7, 3), date(year, 12, 24)):
+        # Only when the following day is a weekday holiday rather than this one being observed
+        if d.weekday() <= 3:
+            early.add(d)
+    return frozenset(early - nyse_holidays(year))
+
+
+def is_trading_day(d):
+    return d.weekday() < 5 and d not in nyse_holidays(d.year)
+
+
+def previous_trading_day(d):
+    """The last trading day strictly before d."""
+    d -= timedelta(days=1)
+    while not is_trading_day(d):
+        d -= timedelta(days=1)
+    return d
+
+
+def next_trading_day(d):
+    """The first trading day strictly after d."""
+    d += timedelta(days=1)
+    while not is_trading_day(d):
+        d += timedelta(days=1)
+    return d
+
+
+def trading_days(start, end):
+    """All trading days in [start, end], oldest first."""
+    days = []
+    d = start
+    while d <= end:
+        if is_trading_day(d):
+            days.append(d)
+        d += timedelta(days=1)
+    return days
+
+
+def session_bounds(d):
+    """Open and close of the session on d as timezone-aware Eastern datetimes."""
+    close = EARLY_CLOSE if d in nyse_early_closes(d.year) else MARKET_CLOSE
+    return (EASTERN.localize(datetime.combine(d, MARKET_OPEN)),
+            EASTERN.localize(datetime.combine(d, close)))
+
+
+def is_market_open(now=None):
+    """Return True during a regular NYSE session, honouring holidays and half days."""
+    now = (now or datetime.now(timezone.utc)).astimezone(EASTERN)
+    if not is_trading_day(now.date()):
+        return False
+    open_, close = session_bounds(now.date())
+    return open_ <= now < close
+
+
+def last_session(now=None):
+    """The most recent session that has started: today once the bell rings, otherwise the prior one."""
+    now = (now or datetime.now(timezone.utc)).astimezone(EASTERN)
+    today = now.date()
+    if is_trading_day(today) and now >= session_bounds(today)[0]:
+        return today
+    return previous_trading_day(today)
+
+
+class SessionResolver:
+    """Resolve the most recent trading session once and reuse it.
+
+    The calendar answer can optionally be confirmed with a single
+    ``verify_fn(session_date) -> bool`` call (e.g. checking that Polygon has a
+    bar for that day); a False answer falls back to the previous session.
+    A confirmed answer is cached until the calendar answer changes. A False
+    one is checked again after ``retry_seconds`` and once the session has
+    closed, since end-of-day data only has the bar after the close.
+    """
+
+    def __init__(self, verify_fn=None, retry_seconds=900):
+        self.verify_fn = verify_fn
+        self.retry_seconds = retry_seconds
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        candidate = last_session(now)
+        with self._lock:
+            if candidate in self._cache:
+                session, recheck_at = self._cache[candidate]
+                if recheck_at is None or now < recheck_at:
+                    return session
+            if self.verify_fn is None:
+                session, recheck_at = candidate, None
+            else:
+                try:
+                    verified = self.verify_fn(candidate)
+                except Exception as e:
+                    # Do not cache: retry the verification on the next scan
+                    logger.warning(f'Could not verify trading day {candidate}: {str(e)}')
+                    return candidate
+                if verified:
+                    session, recheck_at = candidate, None
+                else:
+                    session = previous_trading_day(candidate)
+                    recheck_at = now + timedelta(seconds=self.retry_seconds)
+                    close = session_bounds(candidate)[1]
+                    if now < close:
+                        recheck_at = min(recheck_at, close)
+            self._cache = {candidate: (session, recheck_at)}
+            logger.info(f'Most recent trading day resolved: {session}')
+            return session
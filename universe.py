@@ -0,0 +1,116 @@
+import logging
+import threading
+
+import numpy as np
+
+from fetcher import fetch_concurrently
+from signals import MIN_VOLUME
+
+logger = logging.getLogger(__name__)
+
+
+class IncompleteHistoryError(Exception):
+    """Raised when grouped daily bars are missing for some sessions of the scan window."""
+
+
+class GroupedDailyCache:
+    """Whole-market daily bars from Polygon's grouped-daily endpoint, one call per session.
+
+    Past sessions do not change between scans, so each date is fetched once
+    and kept until it falls out of the requested window. The newest session
+    may still be trading or not yet published, so it is fetched again on
+    every load, and empty responses are never kept.
+    """
+
+    def __init__(self, client, max_workers=8):
+        self.client = client
+        self.max_workers = max_workers
+        self._bars = {}
+        self._lock = threading.Lock()
+
+    def _fetch_day(self, session):
+        import pandas as pd
+        aggs = self.client.get_grouped_daily_aggs(session.strftime('%Y-%m-%d'), adjusted=True)
+        return pd.DataFrame(
+            [(agg.ticker, agg.close, agg.volume) for agg in aggs if agg.ticker],
+            columns=['ticker', 'close', 'volume']
+        )
+
+    def load(self, sessions, progress=None):
+        """Return {session: DataFrame(ticker, close, volume)} for every session, fetching only new ones.
+
+        Sessions that failed or came back empty are left out.
+        progress(done, total) is called after each missing session is fetched.
+        """
+        with self._lock:
+            missing = [s for s in sessions if s not in self._bars or s == sessions[-1]]
+        if missing:
+            logger.info(f'Fetching grouped daily bars for {len(missing)} of {len(sessions)} sessions')
+            fetched = enumerate(fetch_concurrently(missing, self._fetch_day, max_workers=self.max_workers), 1)
+            for done, (session, bars) in fetched:
+                with self._lock:
+                    if bars is not None and not bars.empty:
+                        self._bars[session] = bars
+                    else:
+                        self._bars.pop(session, None)
+                if progress:
+                    progress(done, len(missing))
+        with self._lock:
+            keep = set(sessions)
+            self._bars = {s: bars for s, bars in self._bars.items() if s in keep}
+            return {s: self._bars[s] for s in sessions if s in self._bars}
+
+
+def pivot_grouped(grouped):
+    """Pivot per-session bars into oldest-first date x ticker close and volume matrices."""
+    import pandas as pd
+    sessions = [session for session in sorted(grouped) if not grouped[session].empty]
+    if not sessions:
+        return pd.DataFrame(), pd.DataFrame()
+    # Hash-based union of tickers; sorting millions of strings with np.unique is far slower
+    tickers = pd.Index(pd.unique(np.concatenate([grouped[s]['ticker'].to_numpy() for s in sessions])))
+    close = np.full((len(sessions), len(tickers)), np.nan)
+    volume = np.full((len(sessions), len(tickers)), np.nan)
+    for row, session in enumerate(sessions):
+        bars = grouped[session]
+        columns = tickers.get_indexer(bars['ticker'])
+        close[row, columns] = bars['close'].to_numpy(dtype=float)
+        volume[row, columns] = bars['volume'].to_numpy(dtype=float)
+    index = pd.Index(sessions, name='Date')
+    return (pd.DataFrame(close, index=index, columns=tickers),
+            pd.DataFrame(volume, index=index, columns=tickers))
+
+
+def universe_long_frame(close, volume, windows, display_start, min_volume=MIN_VOLUME):
+    """EMAs for every column at once, reshaped to the long newest-first layout signals expects.
+
+    Tickers that never trade more than min_volume shares in the display
+    window cannot match and are dropped before any EMA work.
+    """
+    import pandas as pd
+    display = close.index >= display_start
+    active = (volume.loc[display] > min_volume).any(axis=0)
+    close = close.loc[:, active]
+    volume = volume.loc[:, active]
+    logger.info(f'Universe pre-filter kept {close.shape[1]} tickers above {min_volume:,} shares')
+    if close.empty:
+        return pd.DataFrame()
+
+    emas = {w: close.ewm(span=w, adjust=False).mean().loc[display] for w in windows}
+    close = close.loc[display]
+    volume = volume.loc[display]
+
+    # Tickers x time, newest first, flattened so each ticker is one contiguous block
+    dates = np.array(close.index.tolist(), dtype='datetime64[D]')[::-1]
+    tickers = close.columns.to_numpy()
+    prices = close.to_numpy().T[:, ::-1]
+    traded = ~np.isnan(prices)
+    data = {
+        'symbol': np.repeat(tickers, len(dates)).reshape(prices.shape)[traded],
+        'Date': np.tile(dates, len(tickers)).reshape(prices.shape)[traded],
+        'Price': prices[traded],
+        'Volume': volume.to_numpy().T[:, ::-1][traded],
+    }
+    for w, values in emas.items():
+        data[f'EMA{w}'] = values.to_numpy().T[:, ::-1][traded]
+    return pd.DataFrame(data)